@@ -0,0 +1,19 @@
+import os
+import django
+import pytest
+
+# Lets `python -m pytest` run the Django test suite (network_traffic/tests.py, benchmark smoke
+# tests included) without pytest-django: the test databases are created once per session.
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smarthome_network_ids.settings')
+django.setup()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def django_test_databases():
+    from django.test.runner import DiscoverRunner
+    runner = DiscoverRunner(verbosity=0)
+    runner.setup_test_environment()
+    old_config = runner.setup_databases()
+    yield
+    runner.teardown_databases(old_config)
+    runner.teardown_test_environment()
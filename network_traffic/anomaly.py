@@ -0,0 +1,196 @@
+import numpy as np
+from django.db import transaction
+from .models import NetworkTraffic, TrafficBaseline
+
+# Numeric features every record is scored on.
+FEATURES = (
+    'duration', 'src_bytes', 'dst_bytes', 'wrong_fragment', 'urgent', 'hot', 'num_compromised',
+    'count', 'srv_count', 'serror_rate', 'rerror_rate', 'same_srv_rate', 'diff_srv_rate',
+    'srv_diff_host_rate', 'dst_host_count', 'dst_host_srv_count', 'dst_host_same_srv_rate',
+    'dst_host_diff_srv_rate',
+)
+
+# Heavy-tailed features are compared on a log scale, so one large transfer on a bulk service
+# such as ftp_data is not automatically an outlier.
+LOG_FEATURES = ('duration', 'src_bytes', 'dst_bytes')
+_LOG_COLUMNS = [FEATURES.index(name) for name in LOG_FEATURES]
+
+# Groups with fewer samples than this are scored against their protocol's baseline instead.
+MIN_SAMPLES = 30
+
+# Lower bound on a baseline's standard deviation, so constant features do not produce infinite scores.
+MIN_STD = 0.05
+
+# Default score (in standard deviations) above which a record is reported as anomalous.
+DEFAULT_MIN_SCORE = 3.0
+
+# Columns read for scoring: the primary key and group first, then the features.
+SCORING_COLUMNS = ('id', 'service', 'protocol_type') + FEATURES
+
+
+def feature_matrix(rows, offset=0):
+    """
+    Build the (rows x features) float matrix from tuples whose features start at `offset`.
+    """
+    matrix = np.array([row[offset:] for row in rows], dtype=np.float64).reshape(len(rows), len(FEATURES))
+    matrix[:, _LOG_COLUMNS] = np.log1p(matrix[:, _LOG_COLUMNS])
+    return matrix
+
+
+def group_moments(keys, matrix):
+    """
+    Return `(groups, counts, means, m2)` for the rows of `matrix` grouped by `keys`.
+    """
+    groups, inverse = np.unique(np.asarray(keys), return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(groups)).astype(np.float64)
+    sums = np.stack([np.bincount(inverse, weights=matrix[:, j], minlength=len(groups)) for j in range(matrix.shape[1])], axis=1)
+    means = sums / counts[:, None]
+    deviations = (matrix - means[inverse]) ** 2
+    m2 = np.stack([np.bincount(inverse, weights=deviations[:, j], minlength=len(groups)) for j in range(matrix.shape[1])], axis=1)
+    return groups, counts, means, m2
+
+
+def merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b, sign=1):
+    """
+    Combine two sets of running moments (Chan et al.), or remove `b` from `a` when `sign=-1`.
+    """
+    if sign > 0:
+        n = n_a + n_b
+        if n <= 0:
+            return 0, np.zeros_like(mean_a), np.zeros_like(m2_a)
+        delta = mean_b - mean_a
+        return n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n
+
+    n = n_a - n_b
+    if n <= 0:
+        return 0, np.zeros_like(mean_a), np.zeros_like(m2_a)
+    mean = (n_a * mean_a - n_b * mean_b) / n
+    delta = mean_b - mean
+    m2 = m2_a - m2_b - delta ** 2 * n * n_b / n_a
+    return n, mean, np.maximum(m2, 0.0)
+
+
+def _group_key(service, protocol_type):
+    return f'{service}\t{protocol_type}'
+
+
+def apply(records, sign=1):
+    """
+    Merge NetworkTraffic instances into (`sign=1`) or out of (`sign=-1`) the baselines.
+    """
+    records = list(records)
+    if not records:
+        return
+    keys = [_group_key(record.service, record.protocol_type) for record in records]
+    matrix = feature_matrix([tuple(getattr(record, name) for name in FEATURES) for record in records])
+    _save(*group_moments(keys, matrix), sign=sign)
+
+
+def _save(groups, counts, means, m2, sign=1):
+    with transaction.atomic():
+        pairs = [key.split('\t') for key in groups]
+        existing = {
+            _group_key(row.service, row.protocol_type): row
+            for row in TrafficBaseline.objects.select_for_update().filter(service__in={service for service, _ in pairs})
+        }
+        created, updated, emptied = [], [], []
+        for index, key in enumerate(groups):
+            row = existing.get(key)
+            if row is None:
+                if sign < 0:
+                    continue
+                service, protocol_type = key.split('\t')
+                row = TrafficBaseline(service=service, protocol_type=protocol_type)
+                created.append(row)
+                current = (0, np.zeros(len(FEATURES)), np.zeros(len(FEATURES)))
+            else:
+                updated.append(row)
+                current = (row.samples, np.array(row.mean, dtype=np.float64), np.array(row.m2, dtype=np.float64))
+            samples, mean, row_m2 = merge_moments(*current, counts[index], means[index], m2[index], sign=sign)
+            row.samples, row.mean, row.m2 = int(round(samples)), mean.tolist(), row_m2.tolist()
+            if row.samples <= 0:
+                emptied.append(row)
+
+        TrafficBaseline.objects.bulk_create([row for row in created if row.samples > 0])
+        TrafficBaseline.objects.bulk_update([row for row in updated if row.samples > 0], ['samples', 'mean', 'm2'])
+        TrafficBaseline.objects.filter(pk__in=[row.pk for row in emptied if row.pk]).delete()
+
+
+def rebuild(chunk_size=5000):
+    """
+    Recompute every baseline from NetworkTraffic. Returns the number of groups written.
+    """
+    rows = NetworkTraffic.objects.values_list('service', 'protocol_type', *FEATURES).iterator(chunk_size=chunk_size)
+    with transaction.atomic():
+        TrafficBaseline.objects.all().delete()
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                _save(*group_moments([_group_key(r[0], r[1]) for r in batch], feature_matrix(batch, offset=2)))
+                batch = []
+        if batch:
+            _save(*group_moments([_group_key(r[0], r[1]) for r in batch], feature_matrix(batch, offset=2)))
+    return TrafficBaseline.objects.count()
+
+
+class AnomalyScorer:
+    """
+    Scores records by their largest absolute z-score against the baseline of their
+    (service, protocol_type) group, falling back to the protocol's and then to the global
+    baseline for groups with fewer than MIN_SAMPLES samples.
+    """
+    def __init__(self, baselines=None):
+        baselines = list(TrafficBaseline.objects.all() if baselines is None else baselines)
+        width = len(FEATURES)
+        moments = {}
+        for row in baselines:
+            current = (row.samples, np.array(row.mean, dtype=np.float64), np.array(row.m2, dtype=np.float64))
+            moments[_group_key(row.service, row.protocol_type)] = current
+            for key in (_group_key('*', row.protocol_type), _group_key('*', '*')):
+                base = moments.get(key, (0, np.zeros(width), np.zeros(width)))
+                moments[key] = merge_moments(*base, *current)
+
+        self.index = {}
+        means, stds = [np.zeros(width)], [np.ones(width)]  # Row 0: no baseline at all, scores 0
+        for key, (samples, mean, m2) in moments.items():
+            if samples < MIN_SAMPLES and key != _group_key('*', '*'):
+                continue
+            self.index[key] = len(means)
+            means.append(mean)
+            stds.append(np.maximum(np.sqrt(m2 / samples) if samples else np.ones(width), MIN_STD))
+        self.means = np.array(means)
+        self.stds = np.array(stds)
+
+    def _lookup(self, service, protocol_type):
+        for key in (_group_key(service, protocol_type), _group_key('*', protocol_type), _group_key('*', '*')):
+            if key in self.index:
+                return self.index[key]
+        return 0
+
+    def score(self, keys, matrix):
+        """
+        Return one anomaly score per row of the feature matrix; `keys` are (service, protocol_type) pairs.
+        """
+        if not len(keys):
+            return np.zeros(0)
+        groups, inverse = np.unique(np.array([_group_key(*key) for key in keys]), return_inverse=True)
+        group_rows = np.array([self._lookup(*group.split('\t')) for group in groups])[inverse]
+        scores = (np.abs(matrix - self.means[group_rows]) / self.stds[group_rows]).max(axis=1)
+        scores[group_rows == 0] = 0.0
+        return scores
+
+    def score_rows(self, rows):
+        """
+        Score `SCORING_COLUMNS` tuples; returns an array aligned with `rows`.
+        """
+        return self.score([(row[1], row[2]) for row in rows], feature_matrix(rows, offset=3))
+
+    def keep_anomalies(self, min_score):
+        """
+        Return a filter that maps a chunk of `SCORING_COLUMNS` tuples to `(id, score)` pairs at or above `min_score`.
+        """
+        def keep(rows):
+            scores = self.score_rows(rows)
+            return [(rows[i][0], round(float(scores[i]), 4)) for i in np.flatnonzero(scores >= min_score)]
+        return keep
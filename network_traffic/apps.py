@@ -1,6 +1,99 @@
+import platform
+import time
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def package_version(name):
+    """
+    Return the installed version of a distribution, or 'unknown'.
+    """
+    from importlib import metadata  # Reads only this distribution's metadata, unlike pkg_resources
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def read_requirements():
+    """
+    Return the lines of requirements.txt, or an empty list if there is none.
+    """
+    try:
+        with open(settings.BASE_DIR / 'requirements.txt') as file:
+            return file.readlines()
+    except FileNotFoundError:
+        return []
+
+
+# Endpoints listed on the index page: (name, URL name, URL kwargs, description)
+INDEX_ENDPOINTS = (
+    ("Traffic List", 'traffic-list', None, "List all network traffic data."),
+    ("Traffic Detail", 'traffic-detail', {"pk": 1}, "View detailed information of a single traffic record."),
+    ("Traffic Create", 'traffic-create', None, "Create a new traffic record."),
+    ("Anomalous Traffic", 'anomalous-traffic', None, "Identify anomalous traffic patterns."),
+    ("Traffic Filter by Service", 'traffic-filter-service', {"service": "http"}, "Filter traffic by service type e.g. http."),
+    ("Traffic Filter by Attack", 'traffic-filter-attack', None, "Filter traffic by attack type."),
+    ("Traffic Statistics", 'traffic-stats', None, "Attack ratios and byte statistics per service, protocol or flag."),
+    # Update and delete are left off the page but were tested via cURL on the CLI
+)
+
+# Seconds the first superuser's name is reused for. Users saved or deleted in this process clear
+# it at once; this bounds how long a change made by another process (e.g. `createsuperuser`) takes.
+ADMIN_USER_TTL = 60
 
 
 class NetworkTrafficConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'network_traffic'
+
+    environment = None
+    _endpoints = None
+    _admin_user = None  # (username or None, time it was looked up)
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from rest_framework import __version__ as drf_version
+        from .sqlite import configure_connection
+
+        # Versions and requirements cannot change while the process runs: read them once here,
+        # so the index page is served from memory
+        self.environment = {
+            'python_version': platform.python_version(),
+            'django_version': package_version('Django'),
+            'drf_version': drf_version,
+            'requirements': read_requirements(),
+        }
+        # The index and credentials pages cache the first superuser; forget it when a user changes
+        post_save.connect(self.forget_admin_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='network_traffic.admin_user')
+        post_delete.connect(self.forget_admin_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='network_traffic.admin_user')
+        # SQLite pragmas of IDS_SQLITE_PROFILE on every new connection (see sqlite.py)
+        connection_created.connect(configure_connection, dispatch_uid='network_traffic.sqlite')
+
+    def api_endpoints(self):
+        """
+        Return the endpoints shown on the index page, resolved on first use: URLs cannot be
+        reversed while apps are still loading.
+        """
+        if self._endpoints is None:
+            from django.urls import reverse
+            self._endpoints = [
+                {"name": name, "url": reverse(url_name, kwargs=kwargs), "description": description}
+                for name, url_name, kwargs, description in INDEX_ENDPOINTS
+            ]
+        return self._endpoints
+
+    def admin_username(self):
+        """
+        Return the username of the first superuser, or None. Looked up at most every ADMIN_USER_TTL seconds.
+        """
+        cached = self._admin_user
+        if cached is None or time.monotonic() - cached[1] > ADMIN_USER_TTL:
+            from django.contrib.auth import get_user_model
+            username = get_user_model().objects.filter(is_superuser=True).values_list('username', flat=True).first()
+            self._admin_user = cached = (username, time.monotonic())
+        return cached[0]
+
+    def forget_admin_user(self, **kwargs):
+        self._admin_user = None
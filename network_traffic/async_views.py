@@ -0,0 +1,138 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .cache import cache_response
+from .models import NetworkTraffic
+from .streaming import STREAM_FORMATS, astream_response
+from .views import (
+    AnomalousTrafficView, NetworkTrafficComplexFiltersView, NetworkTrafficFilterByAttackView,
+    bounded_range, fast_serializer, query_flag, time_window,
+)
+
+# Async versions of the read endpoints, served under /api/async/.
+# They return the same JSON as the views in views.py but never hold a thread while waiting on the
+# database: queries use Django's async ORM and encoding runs in a worker thread.
+
+_renderer = JSONRenderer()
+
+
+def json_response(data, status=200):
+    return HttpResponse(_renderer.render(data), status=status, content_type='application/json')
+
+
+# Encode a page of rows into the paginated JSON body (runs in a worker thread)
+def _render_page(paginator, serializer, page):
+    return json_response(paginator.get_paginated_data(serializer.encode_many(page)))
+
+
+render_page = sync_to_async(_render_page, thread_sensitive=False)
+
+
+# Base class for async list-style endpoints: one keyset page, or a streamed dump with `?stream=`
+class AsyncTrafficListView(View):
+    http_method_names = ['get', 'head', 'options']
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+
+    async def list(self, request, queryset):
+        try:
+            window = time_window(request.GET)  # `?since=` / `?until=` / `?last=`, as on the sync views
+        except ValueError as exc:
+            return json_response({"error": str(exc)}, status=400)
+        if window is not None:
+            queryset = queryset.filter(bounded_range('observed_at', *window))
+        if query_flag(request.GET, 'count'):
+            return json_response({"count": await queryset.acount()})
+        try:
+            serializer = fast_serializer(request.GET)  # `?fields=`
+        except ValueError as exc:
+            return json_response({"error": str(exc)}, status=400)
+
+        stream = request.GET.get('stream')
+        if stream is not None:
+            if stream not in STREAM_FORMATS:
+                return json_response({"error": f"Invalid stream format. Use one of: {', '.join(STREAM_FORMATS)}."}, status=400)
+            return astream_response(queryset, stream, serializer=serializer)  # Encode and write records as they are read
+
+        paginator = self.pagination_class()
+        try:
+            page = await paginator.apaginate_queryset(serializer.rows(queryset), Request(request), view=self)  # Fetch one page of tuples
+        except NotFound as exc:
+            return json_response({"detail": str(exc.detail)}, status=404)
+        return await render_page(paginator, serializer, page)
+
+
+# 1. Retrieve the list of all network traffic records
+class AsyncNetworkTrafficListView(AsyncTrafficListView):
+    @cache_response
+    async def get(self, request):
+        return await self.list(request, NetworkTraffic.objects.all())
+
+
+# 2. Retrieve details of a single record by its primary key (ID)
+class AsyncNetworkTrafficDetailView(View):
+    http_method_names = ['get', 'head', 'options']
+
+    @cache_response
+    async def get(self, request, pk):
+        try:
+            serializer = fast_serializer(request.GET)
+        except ValueError as exc:
+            return json_response({"error": str(exc)}, status=400)
+        row = await serializer.rows(NetworkTraffic.objects.filter(pk=pk)).afirst()  # Fetch the record by ID as a tuple
+        if row is None:
+            return json_response({"error": "Record not found"}, status=404)
+        return json_response(serializer.encode(row))
+
+
+# 6. Identify anomalous traffic records based on byte thresholds or z-scores
+class AsyncAnomalousTrafficView(AsyncTrafficListView):
+    # Scoring is CPU-bound and reads the table in chunks, so method=zscore runs the sync view in a thread
+    scored_view = staticmethod(sync_to_async(AnomalousTrafficView.as_view()))
+
+    @cache_response
+    async def get(self, request):
+        method = request.GET.get('method', 'threshold')
+        if method not in AnomalousTrafficView.methods:
+            return json_response({"error": f"Invalid method. Use one of: {', '.join(AnomalousTrafficView.methods)}."}, status=400)
+        if method == 'zscore':
+            response = await self.scored_view(request)
+            return await sync_to_async(response.render, thread_sensitive=False)()
+        threshold = AnomalousTrafficView.get_threshold(request.GET)
+        if threshold is None:
+            return json_response({"error": "threshold must be an integer"}, status=400)
+        return await self.list(request, AnomalousTrafficView.threshold_queryset(threshold))
+
+
+# 7. Filter traffic records based on the service type
+class AsyncNetworkTrafficFilterByServiceView(AsyncTrafficListView):
+    @cache_response
+    async def get(self, request, service):
+        return await self.list(request, NetworkTraffic.objects.filter(service=service))
+
+
+# 8. Filter traffic records based on attack type
+class AsyncNetworkTrafficFilterByAttackView(AsyncTrafficListView):
+    @cache_response
+    async def get(self, request):
+        attack_value = NetworkTrafficFilterByAttackView.attack_value(request.GET)
+        if attack_value is None:
+            return json_response({"error": "Invalid attack type. Use 'yes' or 'no'."}, status=400)
+        traffic_data = NetworkTraffic.objects.filter(attack=attack_value)
+        if await traffic_data.aexists():
+            return await self.list(request, traffic_data)
+        return json_response({"error": "No records match the provided attack type."}, status=404)
+
+
+class AsyncNetworkTrafficComplexFiltersView(AsyncTrafficListView):
+    @cache_response
+    async def get(self, request):
+        try:
+            conditions = NetworkTrafficComplexFiltersView.filter_conditions(request.GET)
+        except ValueError as exc:
+            return json_response({"error": str(exc)}, status=400)
+        query = NetworkTrafficComplexFiltersView.filter_query(conditions)
+        return await self.list(request, NetworkTraffic.objects.filter(query))
@@ -0,0 +1,123 @@
+from copy import copy
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from .ingest import chunked, records_deleted, records_updated, write_chunk
+from .models import NetworkTraffic
+from .serializers import NetworkTrafficSerializer
+
+# Primary keys per `IN (...)` clause when fetching or deleting by id list.
+ID_CHUNK_SIZE = 900
+
+
+def max_batch_size():
+    return getattr(settings, 'IDS_BATCH_MAX_RECORDS', 10000)
+
+
+def validate_batch(items, partial=False):
+    """
+    Validate a list of incoming records with one NetworkTrafficSerializer.
+
+    Returns `(valid, errors)`: `valid` is a list of `(index, validated_data)` pairs and `errors` a
+    list of `{"index": ..., "errors": ...}` entries. The serializer's `to_internal_value` handles
+    the `yes` / `no` / boolean forms of `attack` exactly as the single-record endpoints do.
+    """
+    serializer = NetworkTrafficSerializer(partial=partial)
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'errors': {'non_field_errors': ['Expected an object.']}})
+            continue
+        try:
+            valid.append((index, serializer.run_validation(dict(item))))
+        except serializers.ValidationError as exc:
+            errors.append({'index': index, 'errors': exc.detail})
+    return valid, errors
+
+
+def create_batch(items, classifier=None):
+    """
+    Validate and insert a list of records in one transaction. Invalid items are reported, not saved.
+
+    With a `classifier`, each record's `attack_score` is predicted before the insert and the
+    inference time is reported as `inference_ms`.
+    """
+    valid, errors = validate_batch(items)
+    records = [NetworkTraffic(**data) for _, data in valid]
+    result = {}
+    if classifier is not None:
+        result['inference_ms'] = round(classifier.score_records(records) * 1000, 3)
+    created = write_chunk(records) if records else []
+    return {'created': len(created), 'ids': [record.pk for record in created], 'errors': errors, **result}
+
+
+def fetch_by_ids(ids):
+    """
+    Return `{pk: instance}` for the given ids, querying in chunks that fit the backend's parameter limit.
+    """
+    found = {}
+    for chunk in chunked(ids, ID_CHUNK_SIZE):
+        found.update(NetworkTraffic.objects.in_bulk(chunk))
+    return found
+
+
+def update_batch(items, partial=False):
+    """
+    Validate and apply a list of `{"id": ..., <fields>}` updates in one transaction.
+    """
+    ids, errors = [], []
+    for index, item in enumerate(items):
+        pk = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(pk, int) or isinstance(pk, bool):
+            errors.append({'index': index, 'errors': {'id': ['A valid integer is required.']}})
+        ids.append(pk)
+
+    existing = fetch_by_ids([pk for pk in ids if isinstance(pk, int)])
+    failed = {error['index'] for error in errors}
+    candidates, seen = [], set()
+    for index, (pk, item) in enumerate(zip(ids, items)):
+        if index in failed:
+            continue
+        if pk not in existing:
+            errors.append({'index': index, 'errors': {'id': ['Record not found.']}})
+            continue
+        # Each record once per batch: the before/after pairs of the summary and rules need one change per record
+        if pk in seen:
+            errors.append({'index': index, 'errors': {'id': ['Duplicate id in batch.']}})
+            continue
+        seen.add(pk)
+        candidates.append((index, pk, {key: value for key, value in item.items() if key != 'id'}))
+
+    valid, validation_errors = validate_batch([fields for _, _, fields in candidates], partial=partial)
+    for error in validation_errors:
+        error['index'] = candidates[error['index']][0]
+    errors.extend(validation_errors)
+
+    before, after, changed_fields = [], [], set()
+    for position, data in valid:
+        instance = existing[candidates[position][1]]
+        before.append(copy(instance))
+        for field, value in data.items():
+            setattr(instance, field, value)
+        changed_fields.update(data)
+        after.append(instance)
+
+    if after:
+        with transaction.atomic():
+            NetworkTraffic.objects.bulk_update(after, sorted(changed_fields))
+            records_updated(before, after)
+    errors.sort(key=lambda error: error['index'])
+    return {'updated': len(after), 'ids': [record.pk for record in after], 'errors': errors}
+
+
+def delete_batch(ids):
+    """
+    Delete records by id in one transaction. Returns the deleted count and the ids that did not exist.
+    """
+    existing = fetch_by_ids(ids)
+    if existing:
+        with transaction.atomic():
+            records_deleted(list(existing.values()))
+            for chunk in chunked(list(existing), ID_CHUNK_SIZE):
+                NetworkTraffic.objects.filter(pk__in=chunk).delete()
+    return {'deleted': len(existing), 'missing': [pk for pk in ids if pk not in existing]}
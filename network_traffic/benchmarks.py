@@ -0,0 +1,831 @@
+import asyncio
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+import msgpack
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.models import Count
+from django.test import Client, modify_settings, override_settings
+from django.utils import timezone
+from . import compression, features, jobs, sketches, synthetic
+from .anomaly import DEFAULT_MIN_SCORE, SCORING_COLUMNS, AnomalyScorer
+from .classifier import COLUMNS as CLASSIFIER_COLUMNS, train
+from .colfile import ColumnFile, export as export_columns
+from .columnar import ColumnarSnapshot
+from .ingest import bulk_ingest, read_csv
+from .live import INGEST_PATH, counters as live_counters, websocket_application
+from .models import DetectionRule, NetworkTraffic
+from .retention import older_than, purge
+from .rules import RULE_FIELDS, compile_rule, match
+from .serializers import NetworkTrafficFastSerializer, NetworkTrafficSerializer
+from .sqlite import PROFILES
+from .views import NetworkTrafficComplexFiltersView, bounded_range
+
+# Registry of benchmark scenarios, filled by the `@scenario` decorator.
+SCENARIOS = {}
+
+
+def scenario(name):
+    """
+    Register a benchmark function under `name` so the `benchmark` command can run it.
+    """
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def sample_records(count):
+    """
+    Yield `count` unsaved NetworkTraffic instances drawn from the bundled dataset's distributions.
+    """
+    return synthetic.records(count)
+
+
+@contextmanager
+def temporary_rows(count):
+    """
+    Insert `count` sample rows for the duration of the block, then roll them back.
+    """
+    with transaction.atomic():
+        bulk_ingest(sample_records(count))
+        yield
+        transaction.set_rollback(True)
+
+
+def best_of(func, repeat):
+    """
+    Run `func` `repeat` times and return the fastest wall-clock time in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+@scenario('serializer')
+def serializer_benchmark(rows=10000, repeat=3):
+    """
+    Compare NetworkTrafficSerializer against NetworkTrafficFastSerializer, query included.
+    """
+    fast = NetworkTrafficFastSerializer()
+    with temporary_rows(rows):
+        queryset = NetworkTraffic.objects.order_by('pk')
+        model_seconds = best_of(lambda: NetworkTrafficSerializer(queryset.all(), many=True).data, repeat)
+        fast_seconds = best_of(lambda: fast.encode_many(fast.rows(queryset.all())), repeat)
+    return {
+        'rows': rows,
+        'model_serializer_ms': round(model_seconds * 1000, 2),
+        'fast_serializer_ms': round(fast_seconds * 1000, 2),
+        'model_serializer_us_per_row': round(model_seconds * 1e6 / max(rows, 1), 2),
+        'fast_serializer_us_per_row': round(fast_seconds * 1e6 / max(rows, 1), 2),
+        'speedup': round(model_seconds / fast_seconds, 1),
+    }
+
+
+@scenario('ingest')
+def ingest_benchmark(rows=10000, repeat=3):
+    """
+    Time `load_csv` on a synthetic CSV of `rows` records, derived data maintenance included.
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'traffic.csv')
+    try:
+        synthetic.write_csv(path, rows)
+
+        def load():
+            with transaction.atomic():
+                call_command('load_csv', path, stdout=StringIO())
+                transaction.set_rollback(True)
+        seconds = best_of(load, repeat)
+        size = os.path.getsize(path)
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'rows': rows,
+        'csv_bytes': size,
+        'load_ms': round(seconds * 1000, 2),
+        'rows_per_sec': round(rows / seconds),
+    }
+
+
+# Endpoints timed by the `endpoints` scenario, by URL name. `{pk}` is the first stored record.
+ENDPOINTS = {
+    'traffic-list': '/api/traffic?page_size=100',
+    'traffic-detail': '/api/traffic/{pk}/',
+    'anomalous-traffic': '/api/traffic/anomalous/?threshold=1000',
+    'anomalous-traffic-zscore': '/api/traffic/anomalous/?method=zscore',
+    'traffic-filter-service': '/api/traffic/filter/service/http/',
+    'traffic-filter-attack': '/api/traffic/filter/attack/?attack=yes',
+    'traffic-complex-filters': '/traffic/complex-filters/?protocol_type=tcp&src_bytes_min=1000',
+    'traffic-complex-filters-columnar': '/traffic/complex-filters/?protocol_type=tcp&src_bytes_min=1000&engine=columnar',
+    'traffic-stats': '/api/traffic/stats/?group_by=service,flag',
+}
+
+
+@scenario('endpoints')
+def endpoints_benchmark(rows=10000, repeat=3):
+    """
+    Time each read endpoint (ENDPOINTS) with `rows` stored records, with the response cache off.
+
+    Latency is the fastest of `repeat` requests; peak memory is traced on one extra request.
+    """
+    client = Client(HTTP_ACCEPT='application/json', HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    result = {'rows': rows}
+    with temporary_rows(rows), override_settings(IDS_RESPONSE_CACHE_ENABLED=False):
+        first = NetworkTraffic.objects.order_by('pk').values_list('pk', flat=True).first() or 0
+        for name, url in ENDPOINTS.items():
+            url = url.format(pk=first)
+            warm_up = client.get(url)  # URL resolution, the columnar snapshot, the scorer's baselines
+            if warm_up.status_code != 200:
+                raise RuntimeError(f'{name} answered {warm_up.status_code}')
+            seconds = best_of(lambda: client.get(url), repeat)
+            tracemalloc.start()
+            response = client.get(url)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result[f'{name}_ms'] = round(seconds * 1000, 2)
+            result[f'{name}_peak_kb'] = round(peak / 1024, 1)
+            result[f'{name}_bytes'] = len(response.content)
+    return result
+
+
+@scenario('metrics')
+def metrics_benchmark(rows=10000, repeat=3, requests=200):
+    """
+    Measure the overhead of MetricsMiddleware on a small and a large list page.
+
+    Both middleware chains are timed in alternation, so drift between runs affects both alike.
+    """
+    result = {'rows': rows}
+    pages = {'small_page': '/api/traffic?page_size=10', 'large_page': '/api/traffic?page_size=1000'}
+    with temporary_rows(rows), override_settings(IDS_RESPONSE_CACHE_ENABLED=False):
+        for label, url in pages.items():
+            clients = {}
+            for variant, removed in (('without', ['network_traffic.metrics.MetricsMiddleware']), ('with', [])):
+                with modify_settings(MIDDLEWARE={'remove': removed}):
+                    clients[variant] = Client(HTTP_ACCEPT='application/json', HTTP_HOST=settings.ALLOWED_HOSTS[0])
+                    clients[variant].get(url)  # Builds the client's middleware chain under these settings
+            timings = {variant: [] for variant in clients}
+            for _ in range(repeat):
+                for variant, client in clients.items():
+                    started = time.perf_counter()
+                    for _ in range(requests):
+                        client.get(url)
+                    timings[variant].append((time.perf_counter() - started) / requests)
+            without, with_metrics = min(timings['without']), min(timings['with'])
+            result[f'{label}_without_us'] = round(without * 1e6, 1)
+            result[f'{label}_with_us'] = round(with_metrics * 1e6, 1)
+            result[f'{label}_overhead_us'] = round((with_metrics - without) * 1e6, 1)
+    return result
+
+
+# Field lists compared by the `projection` scenario; None is every field.
+PROJECTIONS = {'all_fields': None, 'three_fields': 'service,src_bytes,attack'}
+
+
+@scenario('projection')
+def projection_benchmark(rows=10000, repeat=3):
+    """
+    Compare full records with `?fields=` projections on a 1000-record page and a streamed dump of
+    every record, and `?count=true` with reading the matching records.
+    """
+    client = Client(HTTP_ACCEPT='application/json', HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    result = {'rows': rows}
+    with temporary_rows(rows), override_settings(IDS_RESPONSE_CACHE_ENABLED=False):
+        for name, fields in PROJECTIONS.items():
+            suffix = f'&fields={fields}' if fields else ''
+            page_url, stream_url = f'/api/traffic?page_size=1000{suffix}', f'/api/traffic?stream=ndjson{suffix}'
+            result[f'{name}_page_ms'] = round(best_of(lambda: client.get(page_url), repeat) * 1000, 2)
+            result[f'{name}_page_bytes'] = len(client.get(page_url).content)
+            result[f'{name}_stream_ms'] = round(best_of(lambda: b''.join(client.get(stream_url).streaming_content), repeat) * 1000, 2)
+            result[f'{name}_stream_bytes'] = len(b''.join(client.get(stream_url).streaming_content))
+        count_url, matching_url = (f'/traffic/complex-filters/?protocol_type=tcp&{param}' for param in ('count=true', 'stream=ndjson'))
+        result['count_ms'] = round(best_of(lambda: client.get(count_url), repeat) * 1000, 2)
+        result['matching_stream_ms'] = round(best_of(lambda: b''.join(client.get(matching_url).streaming_content), repeat) * 1000, 2)
+    return result
+
+
+@scenario('sketches')
+def sketches_benchmark(rows=10000, repeat=3):
+    """
+    Compare the sketch endpoint with the exact GROUP BY queries it replaces, measure how far its
+    estimates are off, and time updating the sketches from records in memory.
+    """
+    client = Client(HTTP_ACCEPT='application/json', HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    records = list(sample_records(min(rows, 50000)))
+    pending = sketches.empty_sketches()
+
+    def update():
+        for chunk in (records[start:start + 5000] for start in range(0, len(records), 5000)):
+            for name, keys in sketches._counts(chunk, 1).items():
+                pending[name].update(keys)
+
+    result = {'rows': rows}
+    result['update_rows_per_sec'] = round(len(records) / best_of(update, repeat))
+    with temporary_rows(rows):
+        started = time.perf_counter()
+        sketches.rebuild()  # The on_commit hooks never fire in a transaction that is rolled back
+        result['rebuild_rows_per_sec'] = round(rows / (time.perf_counter() - started)) if rows else 0
+        attacks = NetworkTraffic.objects.filter(attack=True)
+
+        def exact():
+            services = list(attacks.values('service').annotate(n=Count('id')).order_by('-n', 'service')[:10])
+            distinct = NetworkTraffic.objects.values('protocol_type', 'service', 'flag').distinct().count()
+            return {row['service']: row['n'] for row in services}, distinct
+
+        result['group_by_ms'] = round(best_of(exact, repeat) * 1000, 2)
+        result['endpoint_ms'] = round(best_of(lambda: client.get('/api/traffic/sketches/'), repeat) * 1000, 2)
+        services, distinct = exact()
+        data = client.get('/api/traffic/sketches/').json()
+        hitters = data['heavy_hitters']['attack_services']
+        counts = dict(attacks.values_list('service').annotate(n=Count('id')))
+        result['max_overestimate'] = max((entry['estimate'] - counts[entry['value']] for entry in hitters['top']), default=0)
+        result['overestimate_bound'] = hitters['max_overestimate']
+        result['top10_matches'] = [entry['value'] for entry in hitters['top']] == list(services)
+        estimate = data['cardinality']['protocol_service_flag']['estimate']
+        result['distinct_exact'] = distinct
+        result['distinct_estimate'] = estimate
+    return result
+
+
+# Windows timed by the `time_window` scenario: list requests over the most recent records.
+TIME_WINDOWS = {'last_5m': '5m', 'last_1h': '1h'}
+
+
+@scenario('time_window')
+def time_window_benchmark(rows=10000, repeat=3):
+    """
+    Time recent-window list requests over `rows` records of history, one observed per second, and
+    purge the oldest tenth. Window queries are also timed with SQLite told not to use an index.
+    """
+    now = timezone.now()
+
+    def stamped():
+        for age, record in zip(range(rows - 1, -1, -1), sample_records(rows)):
+            record.observed_at = now - timedelta(seconds=age)
+            yield record
+
+    client = Client(HTTP_ACCEPT='application/json', HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    table = NetworkTraffic._meta.db_table
+    result = {'rows': rows}
+    with transaction.atomic(), override_settings(IDS_RESPONSE_CACHE_ENABLED=False):
+        # Records already stored are moved before the synthetic history (rolled back with it)
+        NetworkTraffic.objects.update(observed_at=now - timedelta(seconds=rows + 1))
+        bulk_ingest(stamped())
+        for name, duration in TIME_WINDOWS.items():
+            url = f'/api/traffic?page_size=100&last={duration}'
+            if client.get(url).status_code != 200:
+                raise RuntimeError(f'{url} failed')
+            result[f'{name}_ms'] = round(best_of(lambda: client.get(url), repeat) * 1000, 2)
+            if connection.vendor == 'sqlite':
+                window = (now - (timedelta(minutes=5) if name == 'last_5m' else timedelta(hours=1)), None)
+                queryset = NetworkTraffic.objects.filter(bounded_range('observed_at', *window)).order_by('pk')[:101]
+                sql, params = queryset.query.sql_with_params()
+                unindexed = sql.replace(f'FROM "{table}"', f'FROM "{table}" NOT INDEXED', 1)
+
+                def run(statement):
+                    with connection.cursor() as cursor:
+                        cursor.execute(statement, params)
+                        cursor.fetchall()
+                result[f'{name}_query_ms'] = round(best_of(lambda: run(sql), repeat) * 1000, 2)
+                result[f'{name}_unindexed_query_ms'] = round(best_of(lambda: run(unindexed), repeat) * 1000, 2)
+
+        cutoff = now - timedelta(seconds=rows - rows // 10)  # The oldest tenth
+        started = time.perf_counter()
+        purged = purge(older_than(cutoff))
+        seconds = time.perf_counter() - started
+        result['purged'] = purged
+        result['purge_rows_per_sec'] = round(purged / seconds) if seconds else 0
+        transaction.set_rollback(True)
+    return result
+
+
+@scenario('anomaly')
+def anomaly_benchmark(rows=10000, repeat=3):
+    """
+    Time scoring every row against the per-group baselines, query included.
+    """
+    with temporary_rows(rows):
+        scorer = AnomalyScorer()
+        queryset = NetworkTraffic.objects.values_list(*SCORING_COLUMNS).order_by('pk')
+        seconds = best_of(lambda: scorer.score_rows(list(queryset.all())), repeat)
+        flagged = int((scorer.score_rows(list(queryset.all())) >= DEFAULT_MIN_SCORE).sum())
+    return {
+        'rows': rows,
+        'score_ms': round(seconds * 1000, 2),
+        'rows_per_sec': round(rows / seconds),
+        'flagged': flagged,
+    }
+
+
+@scenario('classifier')
+def classifier_benchmark(rows=10000, repeat=3):
+    """
+    Time training the attack classifier and scoring every row with it, query included.
+    """
+    with temporary_rows(rows):
+        started = time.perf_counter()
+        model = train(epochs=1)
+        training_seconds = time.perf_counter() - started
+        queryset = NetworkTraffic.objects.values_list(*CLASSIFIER_COLUMNS).order_by('pk')
+        seconds = best_of(lambda: model.predict_rows(list(queryset.all())), repeat)
+    return {
+        'rows': rows,
+        'train_one_epoch_ms': round(training_seconds * 1000, 2),
+        'predict_ms': round(seconds * 1000, 2),
+        'rows_per_sec': round(rows / seconds),
+    }
+
+
+@scenario('columnar')
+def columnar_benchmark(rows=10000, repeat=3):
+    """
+    Compare selecting the matching primary keys in SQL against masks over the columnar snapshot.
+    """
+    filters = {
+        'protocol': {'protocol_type': 'tcp'},
+        'service_flag': {'service': 'http', 'flag': 'SF'},
+        'byte_range': {'src_bytes_min': '100', 'src_bytes_max': '5000', 'attack': 'yes'},
+        'serror_rate': {'serror_rate_min': '0.5', 'dst_bytes_max': '1000'},
+    }
+    with temporary_rows(rows):
+        snapshot = ColumnarSnapshot()
+        started = time.perf_counter()
+        snapshot.refresh()
+        result = {
+            'rows': rows,
+            'load_ms': round((time.perf_counter() - started) * 1000, 2),
+            'snapshot_mb': round(snapshot.nbytes / 2 ** 20, 1),
+        }
+        for name, params in filters.items():
+            conditions = NetworkTrafficComplexFiltersView.filter_conditions(params)
+            query = NetworkTrafficComplexFiltersView.filter_query(conditions)
+            orm_seconds = best_of(lambda: list(NetworkTraffic.objects.filter(query).values_list('pk', flat=True)), repeat)
+            columnar_seconds = best_of(lambda: snapshot.select(snapshot.mask(conditions)), repeat)
+            result[f'{name}_orm_ms'] = round(orm_seconds * 1000, 2)
+            result[f'{name}_columnar_ms'] = round(columnar_seconds * 1000, 2)
+            result[f'{name}_speedup'] = round(orm_seconds / columnar_seconds, 1)
+        result['stats_columnar_ms'] = round(best_of(lambda: snapshot.summarize(('service', 'flag')), repeat) * 1000, 2)
+    return result
+
+
+@scenario('colfile')
+def colfile_benchmark(rows=10000, repeat=3):
+    """
+    Compare the binary column file against the CSV it replaces: size, decoding and full imports.
+    """
+    directory = tempfile.mkdtemp()
+    csv_path, column_path = os.path.join(directory, 'traffic.csv'), os.path.join(directory, 'traffic.ntcol')
+    compressed_path = os.path.join(directory, 'traffic.ntcol.z')
+    try:
+        synthetic.write_csv(csv_path, rows)  # The same rows as `temporary_rows(rows)`
+
+        existing = NetworkTraffic.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        with temporary_rows(rows):
+            exported = NetworkTraffic.objects.filter(pk__gt=existing)
+            export_seconds = best_of(lambda: export_columns(column_path, exported), 1)
+            export_columns(compressed_path, exported, compress=True)
+
+        def csv_records(consume):
+            with open(csv_path) as file:
+                consume(read_csv(file))
+
+        def column_records(consume):
+            consume(ColumnFile(column_path).records())
+
+        def rolled_back_ingest(records):
+            with transaction.atomic():
+                bulk_ingest(records)
+                transaction.set_rollback(True)
+
+        def csv_columns():
+            # CSV text to one list of typed values per column, the input analysis code works on
+            with open(csv_path) as file:
+                reader = csv.reader(file)
+                names = next(reader)
+                return [
+                    list(column) if name in ('protocol_type', 'service', 'flag', 'attack') else list(map(float, column))
+                    for name, column in zip(names, zip(*reader))
+                ]
+
+        def file_columns(path):
+            return list(ColumnFile(path).chunks(rows))
+
+        csv_size, column_size, compressed_size = (os.path.getsize(path) for path in (csv_path, column_path, compressed_path))
+        csv_decode = best_of(lambda: csv_records(lambda records: sum(1 for _ in records)), repeat)
+        column_decode = best_of(lambda: column_records(lambda records: sum(1 for _ in records)), repeat)
+        csv_arrays = best_of(csv_columns, repeat)
+        column_arrays = best_of(lambda: file_columns(column_path), repeat)
+        compressed_arrays = best_of(lambda: file_columns(compressed_path), repeat)
+        csv_import = best_of(lambda: csv_records(rolled_back_ingest), 1)
+        column_import = best_of(lambda: column_records(rolled_back_ingest), 1)
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'rows': rows,
+        'csv_bytes': csv_size,
+        'column_file_bytes': column_size,
+        'size_ratio': round(csv_size / column_size, 1),
+        'compressed_bytes': compressed_size,
+        'compressed_size_ratio': round(csv_size / compressed_size, 1),
+        'export_ms': round(export_seconds * 1000, 2),
+        'csv_columns_ms': round(csv_arrays * 1000, 2),
+        'column_file_columns_ms': round(column_arrays * 1000, 2),
+        'columns_speedup': round(csv_arrays / column_arrays, 1),
+        'compressed_columns_ms': round(compressed_arrays * 1000, 2),
+        'csv_records_ms': round(csv_decode * 1000, 2),
+        'column_file_records_ms': round(column_decode * 1000, 2),
+        'records_speedup': round(csv_decode / column_decode, 1),
+        'csv_import_ms': round(csv_import * 1000, 2),
+        'column_file_import_ms': round(column_import * 1000, 2),
+        'import_speedup': round(csv_import / column_import, 1),
+    }
+
+
+@scenario('features')
+def features_benchmark(rows=10000, repeat=3):
+    """
+    Time the window feature extractor on a synthetic flow log: parsing alone, parsing plus both
+    windows, and the full `extract_features` path into the database (rolled back).
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'flows.csv')
+    try:
+        synthetic.write_flow_log(path, rows)
+
+        def parse():
+            with open(path) as file:
+                for _ in features.read_flows(file):
+                    pass
+
+        def extract():
+            with open(path) as file:
+                for _ in features.extract(features.read_flows(file)):
+                    pass
+
+        def load():
+            with transaction.atomic(), open(path) as file:
+                bulk_ingest(features.records(features.read_flows(file)))
+                transaction.set_rollback(True)
+
+        parse_seconds, extract_seconds = best_of(parse, repeat), best_of(extract, repeat)
+        load_seconds = best_of(load, 1)
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'rows': rows,
+        'parse_rows_per_sec': round(rows / parse_seconds) if rows else 0,
+        'extract_rows_per_sec': round(rows / extract_seconds) if rows else 0,
+        'windows_us_per_row': round((extract_seconds - parse_seconds) / rows * 1e6, 2) if rows else 0,
+        'load_rows_per_sec': round(rows / load_seconds) if rows else 0,
+    }
+
+
+# Response formats compared by the `wire_formats` scenario: Accept header and client-side decoder.
+WIRE_FORMATS = {
+    'json': ('application/json', json.loads),
+    'columns': ('application/vnd.ids.columns+json', json.loads),
+    'msgpack': ('application/msgpack', lambda content: msgpack.unpackb(content, raw=False)),
+}
+
+# Content codings compared by the `wire_formats` scenario, with their decompressors.
+WIRE_ENCODINGS = {'identity': None, 'gzip': gzip.decompress, 'br': compression.brotli and compression.brotli.decompress}
+
+
+@scenario('wire_formats')
+def wire_formats_benchmark(rows=10000, repeat=3, page_size=1000):
+    """
+    Compare the response formats of a `page_size` page of /api/traffic, uncompressed, gzipped and
+    (when Brotli is installed) Brotli-compressed: bytes on the wire, server time per request and
+    the client's decompress plus decode time.
+    """
+    client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    url = f'/api/traffic?page_size={page_size}'
+    result = {'rows': rows}
+    with temporary_rows(rows), override_settings(IDS_RESPONSE_CACHE_ENABLED=False):
+        for name, (media_type, decode) in WIRE_FORMATS.items():
+            for encoding, decompress in WIRE_ENCODINGS.items():
+                if encoding != 'identity' and decompress is None:
+                    continue  # Brotli is not installed
+                headers = {'HTTP_ACCEPT': media_type, 'HTTP_ACCEPT_ENCODING': encoding}
+                response = client.get(url, **headers)
+                if response.status_code != 200 or response.get('Content-Encoding', 'identity') != encoding:
+                    raise RuntimeError(f'{name} / {encoding} answered {response.status_code}')
+                content = response.content
+                server_seconds = best_of(lambda: client.get(url, **headers), repeat)
+                client_seconds = best_of(lambda: decode(decompress(content) if decompress else content), repeat)
+                result[f'{name}_{encoding}_bytes'] = len(content)
+                result[f'{name}_{encoding}_server_ms'] = round(server_seconds * 1000, 2)
+                result[f'{name}_{encoding}_decode_ms'] = round(client_seconds * 1000, 3)
+    return result
+
+
+@scenario('jobs')
+def jobs_benchmark(rows=10000, repeat=3):
+    """
+    Compare loading a synthetic CSV of `rows` records in the request (as `load_csv` does) with
+    submitting it as a background job: the submit request's latency, and the time the worker
+    takes for the same load, progress reports included. Everything is rolled back.
+    """
+    client = Client(HTTP_ACCEPT='application/json', HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    directory = tempfile.mkdtemp()
+    try:
+        synthetic.write_csv(os.path.join(directory, 'traffic.csv'), rows)
+        payload = {'kind': 'ingest', 'parameters': {'path': 'traffic.csv'}}
+
+        def load():
+            with transaction.atomic(), open(os.path.join(directory, 'traffic.csv')) as file:
+                bulk_ingest(read_csv(file))
+                transaction.set_rollback(True)
+
+        def submit():
+            with transaction.atomic():
+                response = client.post('/api/jobs/', payload, content_type='application/json')
+                if response.status_code != 202:
+                    raise RuntimeError(f'job-list answered {response.status_code}')
+                transaction.set_rollback(True)
+
+        def run_job():
+            with transaction.atomic():
+                jobs.submit(payload['kind'], payload['parameters'])
+                jobs.Worker(poll=0.01).run(burst=True)
+                transaction.set_rollback(True)
+
+        with override_settings(IDS_JOB_DIR=directory):
+            load_seconds = best_of(load, repeat)
+            submit_seconds = best_of(submit, repeat)
+            job_seconds = best_of(run_job, repeat)
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'rows': rows,
+        'inline_load_ms': round(load_seconds * 1000, 2),
+        'submit_request_ms': round(submit_seconds * 1000, 2),
+        'job_run_ms': round(job_seconds * 1000, 2),
+        'job_overhead_pct': round((job_seconds / load_seconds - 1) * 100, 1),
+    }
+
+
+# Rules timed by the `rules` scenario, cycled (with a varying threshold) up to each rule count.
+BENCHMARK_RULES = (
+    "flag == 'S0' and count > 250 + {n}",
+    "service in ('telnet', 'ftp') and not logged_in or src_bytes >= 100000 + {n}",
+    "1.5 < serror_rate + rerror_rate <= 2 and protocol_type != 'udp' and dst_host_count > 200 + {n}",
+    "src_bytes / (dst_bytes + 1) > 5000 + {n} and duration >= 0",
+)
+RULE_COUNTS = (1, 10, 50)
+
+# Records evaluated one at a time by the `rules` scenario's Python baseline.
+ROW_LOOP_LIMIT = 20000
+
+
+@scenario('rules')
+def rules_benchmark(rows=10000, repeat=3):
+    """
+    Time the compiled rules against evaluating each rule on each record in Python, for growing
+    numbers of rules, and the cost of 20 rules on the ingest path.
+    """
+    records = list(sample_records(rows))
+    for pk, record in enumerate(records, start=1):
+        record.pk = pk  # Matches are reported by id; nothing is saved here
+    expressions = [BENCHMARK_RULES[index % len(BENCHMARK_RULES)].format(n=index) for index in range(max(RULE_COUNTS))]
+    result = {'rows': rows}
+    for count in RULE_COUNTS:
+        compiled = {index: compile_rule(expression) for index, expression in enumerate(expressions[:count])}
+        seconds = best_of(lambda: match(compiled, records), repeat)
+        result[f'{count}_rules_us_per_row'] = round(seconds / rows * 1e6, 3) if rows else 0
+
+        # Baseline: the same expressions run by eval() once per rule and record
+        codes = [compile(expression, '<rule>', 'eval') for expression in expressions[:count]]
+        sample = records[:ROW_LOOP_LIMIT]
+
+        def row_loop():
+            for record in sample:
+                namespace = {name: getattr(record, name) for name in RULE_FIELDS}
+                for code in codes:
+                    eval(code, {'__builtins__': {}}, namespace)
+
+        loop_seconds = best_of(row_loop, 1)
+        result[f'{count}_rules_row_loop_us_per_row'] = round(loop_seconds / len(sample) * 1e6, 3) if sample else 0
+
+    def ingest(rule_count):
+        with transaction.atomic():
+            DetectionRule.objects.bulk_create(
+                DetectionRule(name=f'benchmark {index}', expression=expression)
+                for index, expression in enumerate(expressions[:rule_count])
+            )
+            started = time.perf_counter()
+            bulk_ingest(sample_records(rows))
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return elapsed
+
+    compiled = {index: compile_rule(expression) for index, expression in enumerate(expressions[:20])}
+    matched, _ = match(compiled, records)
+    result['20_rules_matches_per_row'] = round(sum(len(ids) for ids in matched.values()) / rows, 4) if rows else 0
+    if rows:
+        without, with_rules = ingest(0), ingest(20)
+        result['ingest_rows_per_sec'] = round(rows / without)
+        result['ingest_20_rules_rows_per_sec'] = round(rows / with_rules)
+    return result
+
+
+@scenario('live_ingest')
+def live_ingest_benchmark(rows=10000, repeat=3, gateways=8, per_message=50):
+    """
+    Push `rows` records through the WebSocket ingest channel from several simulated gateways.
+    """
+    payload = [
+        {key: value for key, value in NetworkTrafficSerializer(record).data.items() if key != 'id'}
+        for record in sample_records(per_message)
+    ]
+    message = {'type': 'websocket.receive', 'text': json.dumps(payload)}
+    messages = max(rows // (gateways * per_message), 1)
+
+    async def gateway():
+        communicator = ApplicationCommunicator(websocket_application, {'type': 'websocket', 'path': INGEST_PATH})
+        await communicator.send_input({'type': 'websocket.connect'})
+        await communicator.receive_output(timeout=5)
+        for _ in range(messages):
+            await communicator.send_input(message)
+        for _ in range(messages):
+            await communicator.receive_output(timeout=60)  # Wait for every acknowledgement
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(timeout=5)
+
+    async def run():
+        await asyncio.gather(*(gateway() for _ in range(gateways)))
+
+    sent = messages * gateways * per_message
+    with temporary_rows(0):
+        live_counters.reset()
+        seconds = best_of(async_to_sync(run), repeat)
+        batches = live_counters.snapshot()
+    return {
+        'rows': sent,
+        'gateways': gateways,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(sent / seconds),
+        'mean_batch_ms': batches['mean_batch_ms'],
+        'dropped': batches['dropped'],
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+@scenario('concurrency')
+def concurrency_benchmark(rows=10000, repeat=3, clients=100, requests_per_client=5):
+    """
+    Compare the sync and async list endpoints under `clients` concurrent ASGI clients.
+
+    The requests go through the full ASGI handler, so they have to read committed data: this
+    scenario uses the records already stored (load them with `load_csv` first) and ignores `rows`.
+    """
+    application = get_asgi_application()
+    services = list(NetworkTraffic.objects.values_list('service', flat=True).distinct()[:10]) or ['http']
+
+    async def fetch(path, query):
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'query_string': query.encode('ascii'),
+            'headers': [(b'host', settings.ALLOWED_HOSTS[0].encode('ascii')), (b'accept', b'application/json')],
+        })
+        started = time.perf_counter()
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        response = await communicator.receive_output(timeout=120)
+        while (await communicator.receive_output(timeout=120)).get('more_body'):
+            pass
+        return time.perf_counter() - started, response['status']
+
+    async def client(number, prefix, latencies):
+        for request in range(requests_per_client):
+            service = services[(number + request) % len(services)]
+            latency, status_code = await fetch(f'{prefix}/complex-filters/', f'service={service}&page_size=100')
+            if status_code != 200:
+                raise RuntimeError(f'{prefix} answered {status_code}')
+            latencies.append(latency)
+
+    def run(prefix):
+        latencies = []
+
+        async def clients_at_once():
+            await asyncio.gather(*(client(number, prefix, latencies) for number in range(clients)))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            async_to_sync(clients_at_once)()
+        return latencies, time.perf_counter() - started
+
+    result = {'stored_rows': NetworkTraffic.objects.count(), 'clients': clients}
+    with override_settings(IDS_RESPONSE_CACHE_ENABLED=False):
+        for name, prefix in (('sync', '/traffic'), ('async', '/api/async/traffic')):
+            latencies, seconds = run(prefix)
+            result[f'{name}_p50_ms'] = round(percentile(latencies, 50) * 1000, 2)
+            result[f'{name}_p99_ms'] = round(percentile(latencies, 99) * 1000, 2)
+            result[f'{name}_requests_per_sec'] = round(len(latencies) / seconds)
+    return result
+
+
+# SQLite setups compared by the `mixed_workload` scenario: SQLite's own defaults, and the
+# production profile of sqlite.py.
+# Database engine and pragmas of each setup compared by the mixed_workload scenario
+SQLITE_SETUPS = {
+    'default': ('django.db.backends.sqlite3', {'journal_mode': 'DELETE'}),
+    'production': ('network_traffic.sqlite_backend', PROFILES['production']),
+}
+
+
+@scenario('mixed_workload')
+def mixed_workload_benchmark(rows=10000, repeat=3, readers=8, writers=2, seconds=5.0, batch=500):
+    """
+    Run `readers` threads requesting the complex filters endpoint and `writers` threads ingesting
+    batches of `batch` records for `seconds`, once per SQLITE_SETUPS entry (stock engine with a
+    rollback journal, then the production profile's), after storing `rows` records. Reports reads and written rows per second, read latency and "database is locked" errors.
+
+    The threads need committed data, so the rows are written for real and purged afterwards, and
+    the database's journal mode is restored at the end. `repeat` is not used.
+    """
+    first_new = (NetworkTraffic.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+    original_engine = connections.settings[DEFAULT_DB_ALIAS]['ENGINE']
+    with connection.cursor() as cursor:
+        original_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+    result = {'rows': rows, 'readers': readers, 'writers': writers}
+    try:
+        bulk_ingest(sample_records(rows))
+        for name, (engine, pragmas) in SQLITE_SETUPS.items():
+            connections.close_all()  # The journal mode only changes with no other connection open
+            # Connections opened from here on (one per thread) use this setup's engine
+            connections.settings[DEFAULT_DB_ALIAS]['ENGINE'] = engine
+            with override_settings(IDS_SQLITE_PROFILE='default', IDS_SQLITE_PRAGMAS=pragmas, IDS_RESPONSE_CACHE_ENABLED=False):
+                result.update({f'{name}_{key}': value for key, value in _mixed_workload(readers, writers, seconds, batch).items()})
+    finally:
+        connections.close_all()
+        connections.settings[DEFAULT_DB_ALIAS]['ENGINE'] = original_engine
+        purge(NetworkTraffic.objects.filter(pk__gte=first_new), batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode = {original_mode}')
+        connections.close_all()
+    return result
+
+
+def _mixed_workload(readers, writers, seconds, batch):
+    deadline = time.perf_counter() + seconds
+    latencies, written, errors = [], [], []
+
+    def read():
+        client = Client(HTTP_ACCEPT='application/json', HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    client.get('/traffic/complex-filters/?protocol_type=tcp&src_bytes_min=1000&page_size=100')
+                    latencies.append(time.perf_counter() - started)
+                except OperationalError as exc:
+                    errors.append(str(exc))
+        finally:
+            connections.close_all()
+
+    def write():
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    written.append(bulk_ingest(sample_records(batch), chunk_size=batch))
+                except OperationalError as exc:
+                    errors.append(str(exc))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=read) for _ in range(readers)] + [threading.Thread(target=write) for _ in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'reads_per_sec': round(len(latencies) / elapsed, 1),
+        'read_p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'read_p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        'written_rows_per_sec': round(sum(written) / elapsed),
+        'locked_errors': sum('locked' in error for error in errors),
+        'other_errors': sum('locked' not in error for error in errors),
+    }
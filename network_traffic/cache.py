@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import threading
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.response import Response
+from .models import DatasetVersion
+
+# Status codes whose responses are cached; anything else is always recomputed.
+CACHEABLE_STATUS = (200, 404)
+
+# Query parameters that bypass the cache: streamed dumps, and time windows relative to the
+# current time, whose results change as records age out even when the dataset does not.
+UNCACHED_PARAMS = ('stream', 'last')
+
+
+class _Counters:
+    """
+    Per-process hit/miss counters for the response cache.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+counters = _Counters()
+
+
+def get_backend():
+    """
+    Return the Django cache backing the response cache (`IDS_RESPONSE_CACHE_ALIAS`).
+    """
+    return caches[getattr(settings, 'IDS_RESPONSE_CACHE_ALIAS', 'traffic')]
+
+
+def current_version():
+    """
+    Return the `(version, changed_at)` pair identifying the current state of the dataset.
+    """
+    return DatasetVersion.objects.filter(pk=1).values_list('version', 'changed_at').first() or (0, None)
+
+
+def bump_version(rewrite=False):
+    """
+    Invalidate every cached response by moving the dataset to a new version.
+
+    Called by the `records_created` / `records_updated` / `records_deleted` helpers in ingest.py;
+    any other code that writes NetworkTraffic rows must call it too. `rewrite=True` marks a change
+    to existing rows rather than an insert.
+    """
+    now = timezone.now()
+    changes = {'version': F('version') + 1, 'changed_at': now}
+    if rewrite:
+        changes['rewrites'] = F('rewrites') + 1
+    if not DatasetVersion.objects.filter(pk=1).update(**changes):
+        DatasetVersion.objects.get_or_create(pk=1, defaults={'version': 1, 'changed_at': now, 'rewrites': int(rewrite)})
+
+
+def response_key(view, request, kwargs, version, accept=None):
+    """
+    Build a cache key from the view, the normalized query parameters and the dataset version.
+
+    `accept` is the Accept header, for entries holding a rendered body whose format it chose.
+    """
+    query = getattr(request, 'query_params', request.GET)  # DRF request or plain Django request
+    params = sorted((key, value) for key, values in query.lists() for value in values)
+    raw = repr((type(view).__name__, request.get_host(), sorted(kwargs.items()), params, version, accept))
+    return 'traffic-response:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+async def acurrent_version():
+    return await DatasetVersion.objects.filter(pk=1).values_list('version', 'changed_at').afirst() or (0, None)
+
+
+def cache_response(method):
+    """
+    Cache the data of a GET handler's Response until the dataset version changes.
+
+    Streaming responses (`?stream=`) and relative time windows (`?last=`) bypass the cache.
+    Responses carry an `X-Cache: HIT` or `X-Cache: MISS` header. Async handlers (see
+    async_views.py) cache their rendered content.
+    """
+    if asyncio.iscoroutinefunction(method):
+        return _cache_async_response(method)
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if not getattr(settings, 'IDS_RESPONSE_CACHE_ENABLED', True) or any(param in request.query_params for param in UNCACHED_PARAMS):
+            return method(self, request, *args, **kwargs)
+
+        version = current_version()
+        if version[1] is None:
+            # Nothing has been written through the ingest helpers yet, so there is no version to key on
+            return method(self, request, *args, **kwargs)
+
+        backend = get_backend()
+        key = response_key(self, request, kwargs, version)
+        cached = backend.get(key)
+        if cached is not None:
+            counters.record(hit=True)
+            status_code, data = cached
+            return Response(data, status=status_code, headers={'X-Cache': 'HIT'})
+
+        counters.record(hit=False)
+        response = method(self, request, *args, **kwargs)
+        if response.status_code in CACHEABLE_STATUS and hasattr(response, 'data'):
+            backend.set(key, (response.status_code, response.data), getattr(settings, 'IDS_RESPONSE_CACHE_TIMEOUT', 300))
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+def _cache_async_response(method):
+    @wraps(method)
+    async def wrapper(self, request, *args, **kwargs):
+        if not getattr(settings, 'IDS_RESPONSE_CACHE_ENABLED', True) or any(param in request.GET for param in UNCACHED_PARAMS):
+            return await method(self, request, *args, **kwargs)
+
+        version = await acurrent_version()
+        if version[1] is None:
+            return await method(self, request, *args, **kwargs)
+
+        backend = get_backend()
+        # The content is cached rendered, and views delegating to a sync view (method=zscore)
+        # negotiate its format, so one client's MessagePack body must not be served to another
+        key = response_key(self, request, kwargs, version, accept=request.headers.get('Accept', ''))
+        cached = await backend.aget(key)
+        if cached is not None:
+            counters.record(hit=True)
+            status_code, content, content_type = cached
+            response = HttpResponse(content, status=status_code, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        counters.record(hit=False)
+        response = await method(self, request, *args, **kwargs)
+        if response.status_code in CACHEABLE_STATUS and not response.streaming:
+            entry = (response.status_code, response.content, response['Content-Type'])
+            await backend.aset(key, entry, getattr(settings, 'IDS_RESPONSE_CACHE_TIMEOUT', 300))
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+def cache_stats():
+    """
+    Return the hit/miss counters of this process together with the current dataset version.
+    """
+    hits, misses = counters.hits, counters.misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        'version': current_version()[0],
+    }
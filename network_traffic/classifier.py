@@ -0,0 +1,271 @@
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from .anomaly import FEATURES, LOG_FEATURES, merge_moments
+from .models import NetworkTraffic
+
+# Categorical columns, one-hot encoded against the vocabulary seen at training time.
+CATEGORICAL = ('protocol_type', 'service', 'flag')
+
+# Numeric columns; the anomaly features plus the two boolean flags.
+NUMERIC = FEATURES + ('land', 'logged_in')
+_LOG_COLUMNS = [NUMERIC.index(name) for name in LOG_FEATURES]
+
+# Tuple layout read by training and expected by `Classifier.predict_rows`.
+COLUMNS = CATEGORICAL + NUMERIC
+
+# Probability at or above which a record is predicted to be an attack.
+DECISION_THRESHOLD = 0.5
+
+ARTIFACT_NAME = re.compile(r'^classifier-v(\d+)\.npz$')
+
+
+class Classifier:
+    """
+    Logistic regression over standardized numeric features and one-hot categoricals.
+    """
+    def __init__(self, vocabularies, mean, std, weights, bias, version=None, metadata=None):
+        self.vocabularies = {name: list(values) for name, values in vocabularies.items()}
+        self.lookups = {name: {value: i for i, value in enumerate(values)} for name, values in self.vocabularies.items()}
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.std = np.asarray(std, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.version = version
+        self.metadata = metadata or {}
+
+    @property
+    def width(self):
+        return len(NUMERIC) + sum(len(values) for values in self.vocabularies.values())
+
+    def encode(self, rows):
+        """
+        Turn `COLUMNS` tuples into the model's (rows x width) design matrix.
+        """
+        count = len(rows)
+        matrix = np.zeros((count, self.width))
+        if not count:
+            return matrix
+        numeric = np.array([row[len(CATEGORICAL):] for row in rows], dtype=np.float64)
+        numeric[:, _LOG_COLUMNS] = np.log1p(numeric[:, _LOG_COLUMNS])
+        matrix[:, :len(NUMERIC)] = (numeric - self.mean) / self.std
+
+        offset = len(NUMERIC)
+        for position, name in enumerate(CATEGORICAL):
+            # Map each distinct value once, then scatter the one-hot columns for every row
+            values, inverse = np.unique(np.array([row[position] for row in rows], dtype=object).astype(str), return_inverse=True)
+            lookup = self.lookups[name]
+            codes = np.array([lookup.get(value, -1) for value in values])[inverse]
+            known = codes >= 0
+            matrix[np.flatnonzero(known), offset + codes[known]] = 1.0
+            offset += len(lookup)
+        return matrix
+
+    def predict_rows(self, rows):
+        """
+        Return the attack probability of every `COLUMNS` tuple.
+        """
+        return _sigmoid(self.encode(rows) @ self.weights + self.bias)
+
+    def score_records(self, records):
+        """
+        Set `attack_score` on NetworkTraffic instances. Returns the inference time in seconds.
+        """
+        started = time.perf_counter()
+        scores = self.predict_rows([tuple(getattr(record, name) for name in COLUMNS) for record in records])
+        for record, score in zip(records, scores.tolist()):
+            record.attack_score = round(score, 6)
+        return time.perf_counter() - started
+
+    def save(self, directory):
+        """
+        Write the model as the next version in `directory`: arrays in an .npz, everything else in a .json file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.version = max(artifact_versions(directory), default=0) + 1
+        base = os.path.join(directory, f'classifier-v{self.version}')
+        np.savez(base + '.npz', mean=self.mean, std=self.std, weights=self.weights, bias=np.array([self.bias]))
+        with open(base + '.json', 'w') as file:
+            json.dump({'version': self.version, 'columns': COLUMNS, 'vocabularies': self.vocabularies, **self.metadata}, file, indent=2)
+        return base + '.npz'
+
+    @classmethod
+    def load(cls, directory, version):
+        base = os.path.join(directory, f'classifier-v{version}')
+        with open(base + '.json') as file:
+            metadata = json.load(file)
+        with np.load(base + '.npz') as arrays:
+            return cls(
+                metadata.pop('vocabularies'), arrays['mean'], arrays['std'], arrays['weights'], arrays['bias'][0],
+                version=version, metadata=metadata,
+            )
+
+
+def _sigmoid(values):
+    return 1.0 / (1.0 + np.exp(-np.clip(values, -30, 30)))
+
+
+def artifact_versions(directory):
+    """
+    Return the model versions saved in `directory`.
+    """
+    if not os.path.isdir(directory):
+        return []
+    return [int(match.group(1)) for match in map(ARTIFACT_NAME.match, os.listdir(directory)) if match]
+
+
+_loaded = {'key': None, 'model': None}
+_lock = threading.Lock()
+
+
+def get_classifier():
+    """
+    Return the configured model, loading it only when the selected version changes, or None if none is trained.
+
+    A version pinned with IDS_MODEL_VERSION that is not a number, or has no artifact in IDS_MODEL_DIR,
+    counts as no model.
+    """
+    directory = settings.IDS_MODEL_DIR
+    versions = artifact_versions(directory)
+    version = getattr(settings, 'IDS_MODEL_VERSION', None) or max(versions, default=None)
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        return None
+    if version not in versions:
+        return None
+    key = (directory, version)
+    with _lock:
+        if _loaded['key'] != key:
+            _loaded['model'], _loaded['key'] = Classifier.load(*key), key
+        return _loaded['model']
+
+
+def _training_chunks(queryset, chunk_size):
+    # Yield (rows, labels, holdout mask) chunks in primary key order; every fifth record is held out
+    rows = queryset.order_by('pk').values_list('pk', 'attack', *COLUMNS).iterator(chunk_size=chunk_size)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_size:
+            yield _split(batch)
+            batch = []
+    if batch:
+        yield _split(batch)
+
+
+def _split(batch):
+    keys = np.fromiter((row[0] for row in batch), dtype=np.int64, count=len(batch))
+    labels = np.fromiter((row[1] for row in batch), dtype=np.float64, count=len(batch))
+    return [row[2:] for row in batch], labels, keys % 5 == 0
+
+
+def train(queryset=None, epochs=5, chunk_size=5000, learning_rate=0.1, l2=1e-4, batch_size=256, seed=0):
+    """
+    Train a Classifier on stored records, reading `chunk_size` rows at a time.
+
+    The first pass collects vocabularies and the mean / standard deviation of the numeric
+    features; mini-batch SGD then runs `epochs` passes over the training rows. Records whose
+    primary key is a multiple of five are held out and used for the reported metrics; nothing
+    the model learns, its vocabularies and scaling included, comes from them.
+    """
+    queryset = NetworkTraffic.objects.all() if queryset is None else queryset
+    values = {name: set() for name in CATEGORICAL}
+    moments = (0, np.zeros(len(NUMERIC)), np.zeros(len(NUMERIC)))
+    placeholder = Classifier({name: [] for name in CATEGORICAL}, np.zeros(len(NUMERIC)), np.ones(len(NUMERIC)), [], 0.0)
+    for rows, _, holdout in _training_chunks(queryset, chunk_size):
+        rows = [row for row, held in zip(rows, holdout) if not held]
+        if not rows:
+            continue
+        for position, name in enumerate(CATEGORICAL):
+            values[name].update(str(row[position]) for row in rows)
+        numeric = placeholder.encode(rows)[:, :len(NUMERIC)]
+        moments = merge_moments(*moments, len(rows), numeric.mean(axis=0), ((numeric - numeric.mean(axis=0)) ** 2).sum(axis=0))
+    samples, mean, m2 = moments
+    if not samples:
+        raise ValueError("No records to train on.")
+    std = np.maximum(np.sqrt(m2 / samples), 1e-6)
+
+    vocabularies = {name: sorted(found) for name, found in values.items()}
+    model = Classifier(vocabularies, mean, std, np.zeros(len(NUMERIC) + sum(map(len, vocabularies.values()))), 0.0)
+    random = np.random.default_rng(seed)
+    started = time.perf_counter()
+    for epoch in range(epochs):
+        step = learning_rate / (1 + epoch)
+        for rows, labels, holdout in _training_chunks(queryset, chunk_size):
+            matrix, labels = model.encode(rows)[~holdout], labels[~holdout]
+            order = random.permutation(len(labels))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                error = _sigmoid(matrix[batch] @ model.weights + model.bias) - labels[batch]
+                model.weights -= step * (matrix[batch].T @ error / len(batch) + l2 * model.weights)
+                model.bias -= step * float(error.mean())
+    training_seconds = time.perf_counter() - started
+
+    model.metadata = {
+        'trained_at': timezone.now().isoformat(),
+        'records': int(samples),
+        'epochs': epochs,
+        'training_seconds': round(training_seconds, 3),
+        'holdout': evaluate(model, queryset, chunk_size),
+    }
+    return model
+
+
+def evaluate(model, queryset, chunk_size=5000):
+    """
+    Return accuracy, precision and recall of `model` on the held-out records of `queryset`.
+    """
+    tp = fp = fn = tn = 0
+    for rows, labels, holdout in _training_chunks(queryset, chunk_size):
+        if not holdout.any():
+            continue
+        predicted = model.predict_rows([row for row, held in zip(rows, holdout) if held]) >= DECISION_THRESHOLD
+        actual = labels[holdout] == 1
+        tp += int((predicted & actual).sum())
+        fp += int((predicted & ~actual).sum())
+        fn += int((~predicted & actual).sum())
+        tn += int((~predicted & ~actual).sum())
+    total = tp + fp + fn + tn
+    return {
+        'records': total,
+        'accuracy': round((tp + tn) / total, 4) if total else None,
+        'precision': round(tp / (tp + fp), 4) if tp + fp else None,
+        'recall': round(tp / (tp + fn), 4) if tp + fn else None,
+    }
+
+
+def validate_features(items):
+    """
+    Convert incoming prediction requests into `COLUMNS` tuples.
+
+    Returns `(valid, errors)` in the same shape as `batch.validate_batch`: `valid` is a list of
+    `(index, row)` pairs, `errors` a list of `{"index": ..., "errors": ...}` entries.
+    """
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'errors': {'non_field_errors': ['Expected an object.']}})
+            continue
+        problems, row = {}, []
+        for name in COLUMNS:
+            value = item.get(name)
+            if value is None:
+                problems[name] = ['This field is required.']
+            elif name in CATEGORICAL:
+                row.append(str(value))
+            else:
+                try:
+                    row.append(float(value))
+                except (TypeError, ValueError):
+                    problems[name] = ['A valid number is required.']
+        if problems:
+            errors.append({'index': index, 'errors': problems})
+        else:
+            valid.append((index, tuple(row)))
+    return valid, errors
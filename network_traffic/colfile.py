@@ -0,0 +1,312 @@
+import json
+import os
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from django.db import router, transaction
+from .models import NetworkTraffic
+
+# Binary column file ("NTCOL") for moving NetworkTraffic rows between databases.
+#
+# Layout, all little-endian:
+#   header   magic, format version, row count                       (16 bytes)
+#   columns  one fixed-width array per field, each starting on a 64-byte boundary
+#   footer   JSON schema: row count and, per column, its field, dtype, offset and dictionary
+#   trailer  footer length, magic, format version                   (16 bytes)
+#
+# A column either holds the values themselves, in the narrowest dtype that fits them, or codes
+# into a sorted dictionary of its distinct values stored in the footer. Text columns are always
+# dictionary-encoded; numeric columns are when the codes are narrower than the values. Date and
+# time columns hold int64 microseconds since the Unix epoch, UTC. Primary keys are not exported:
+# importing assigns new ones.
+#
+# Files written with `compress=True` store each column zlib-compressed instead. They are several
+# times smaller, but a column has to be decompressed into memory before it can be read.
+
+MAGIC = b'NTCOL\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<6sHQ')
+TRAILER = struct.Struct('<Q6sH')
+ALIGNMENT = 64
+
+# Columns with more distinct values than this are stored as plain values.
+MAX_DICTIONARY_SIZE = 65536
+
+# Rows read per round trip while exporting, and decoded per chunk while importing.
+DEFAULT_CHUNK_SIZE = 20000
+
+FIELDS = tuple(field.name for field in NetworkTraffic._meta.concrete_fields if not field.primary_key)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _kind(name):
+    internal_type = NetworkTraffic._meta.get_field(name).get_internal_type()
+    if internal_type == 'CharField':
+        return 'text'
+    if internal_type == 'BooleanField':
+        return 'bool'
+    if internal_type == 'FloatField':
+        return 'float'
+    if internal_type == 'DateTimeField':
+        return 'timestamp'
+    return 'int'
+
+
+def _code_dtype(size):
+    return np.dtype('<u1') if size <= 2 ** 8 else np.dtype('<u2') if size <= 2 ** 16 else np.dtype('<u4')
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class _Profile:
+    """
+    Distinct values and range of one column, gathered by the first pass of `export`.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.kind = _kind(name)
+        self.distinct = None if self.kind == 'timestamp' else set()  # None once there are too many to dictionary-encode
+        self.low = self.high = None
+
+    def add(self, values):
+        if self.distinct is not None:
+            self.distinct.update(values)
+            if len(self.distinct) > MAX_DICTIONARY_SIZE and self.kind != 'text':
+                self.distinct = None
+        if self.kind == 'int':
+            low, high = min(values), max(values)
+            self.low = low if self.low is None else min(self.low, low)
+            self.high = high if self.high is None else max(self.high, high)
+
+    def schema(self):
+        """
+        Decide how the column is stored: returns its schema entry (offset still unset).
+        """
+        if self.kind == 'bool':
+            return {'name': self.name, 'dtype': '|b1', 'dictionary': None}
+        if self.kind == 'timestamp':
+            return {'name': self.name, 'dtype': '<i8', 'dictionary': None}
+        if self.kind == 'int':
+            value_dtype = np.result_type(np.min_scalar_type(self.low or 0), np.min_scalar_type(self.high or 0)).newbyteorder('<')
+        else:
+            value_dtype = np.dtype('<f8')
+        if self.distinct is not None and (self.kind == 'text' or _code_dtype(len(self.distinct)).itemsize < value_dtype.itemsize):
+            # Sorted so values can be encoded with a binary search; NULL sorts first
+            dictionary = sorted(self.distinct, key=lambda value: (value is not None, value))
+            return {'name': self.name, 'dtype': _code_dtype(len(dictionary)).str, 'dictionary': dictionary}
+        return {'name': self.name, 'dtype': value_dtype.str, 'dictionary': None}
+
+
+def _encoder(column):
+    # Return a function turning a tuple of column values into the stored array
+    dtype, dictionary = np.dtype(column['dtype']), column['dictionary']
+    if _kind(column['name']) == 'timestamp':
+        return lambda values: np.array([(value - EPOCH) // MICROSECOND for value in values], dtype=dtype)
+    if dictionary is None:
+        if dtype.kind == 'f':
+            return lambda values: np.array([np.nan if value is None else value for value in values], dtype=dtype)
+        return lambda values: np.array(values, dtype=dtype)
+    if dictionary and dictionary[0] is None:
+        # Nullable numbers: NULL is code 0, the other codes are found among the remaining values
+        keys = np.array(dictionary[1:], dtype=np.float64)
+
+        def encode(values):
+            values = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            return np.where(np.isnan(values), 0, 1 + keys.searchsorted(values)).astype(dtype)
+        return encode
+    keys = np.array(dictionary)
+    return lambda values: keys.searchsorted(np.array(values, dtype=keys.dtype)).astype(dtype)
+
+
+def export(path, queryset=None, chunk_size=DEFAULT_CHUNK_SIZE, compress=False):
+    """
+    Write the rows of `queryset` (default: every record, in primary key order) to a column file.
+
+    The rows are read twice, inside one transaction so both passes see the same data: once to
+    choose each column's encoding and once to fill the columns. Returns the number of rows written.
+    """
+    target = f'{path}.partial' if compress else path  # Columns are filled in place before compressing
+    queryset = (NetworkTraffic.objects.all() if queryset is None else queryset).order_by('pk')
+    # On the read alias when there is one (see sqlite.py), so the export never holds the write lock
+    with transaction.atomic(using=router.db_for_read(NetworkTraffic)):
+        # Pass 1: distinct values and ranges
+        profiles = [_Profile(name) for name in FIELDS]
+        rows = 0
+        for chunk in _chunks(queryset, chunk_size):
+            rows += len(chunk[0])
+            for profile, values in zip(profiles, chunk):
+                profile.add(values)
+
+        columns, offset = [], _aligned(HEADER.size)
+        for profile in profiles:
+            column = profile.schema()
+            column['offset'] = offset
+            columns.append(column)
+            offset = _aligned(offset + rows * np.dtype(column['dtype']).itemsize)
+
+        with open(target, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, rows))
+            file.truncate(offset)
+
+        # Pass 2: fill the columns in place through a memory map
+        if rows:
+            mapped = np.memmap(target, dtype=np.uint8, mode='r+')
+            arrays = [np.ndarray((rows,), dtype=column['dtype'], buffer=mapped, offset=column['offset']) for column in columns]
+            encoders = [_encoder(column) for column in columns]
+            start = 0
+            for chunk in _chunks(queryset, chunk_size):
+                stop = start + len(chunk[0])
+                for array, encode, values in zip(arrays, encoders, chunk):
+                    array[start:stop] = encode(values)
+                start = stop
+            mapped.flush()
+            del arrays, mapped
+
+    if compress:
+        _compress_columns(target, path, rows, columns)
+        os.remove(target)
+
+    footer = json.dumps({'rows': rows, 'columns': columns}, separators=(',', ':')).encode('utf-8')
+    with open(path, 'ab') as file:
+        file.write(footer)
+        file.write(TRAILER.pack(len(footer), MAGIC, FORMAT_VERSION))
+    return rows
+
+
+def _compress_columns(source, path, rows, columns):
+    # Rewrite the columns of the uncompressed file `source` into `path`, one at a time
+    mapped = np.memmap(source, dtype=np.uint8, mode='r')
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, rows))
+        offset = _aligned(HEADER.size)
+        for column in columns:
+            end = column['offset'] + rows * np.dtype(column['dtype']).itemsize
+            data = zlib.compress(mapped[column['offset']:end], 6)
+            file.seek(offset)
+            file.write(data)
+            column.update(offset=offset, compression='zlib', length=len(data))
+            offset = _aligned(offset + len(data))
+        file.truncate(offset)
+    del mapped
+
+
+def _chunks(queryset, chunk_size):
+    # Yield the rows of `queryset` as lists of column tuples, `chunk_size` rows at a time
+    chunk = []
+    for row in queryset.values_list(*FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield list(zip(*chunk))
+            chunk = []
+    if chunk:
+        yield list(zip(*chunk))
+
+
+class ColumnFile:
+    """
+    Read-only view of a column file, memory-mapped so columns are only paged in when used.
+
+    `codes(name)` returns the stored array itself, without copying: values, or dictionary codes
+    with the dictionary in `dictionary(name)`. `column(name)` decodes a column to its values
+    (date and time columns as `datetime64[us]` in UTC).
+    Compressed columns are decompressed on first use and kept in memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        if self.size < HEADER.size + TRAILER.size:
+            raise ValueError(f"{path} is not a NetworkTraffic column file.")
+        self.map = np.memmap(path, dtype=np.uint8, mode='r')
+
+        magic, version, self.rows = HEADER.unpack_from(self.map, 0)
+        footer_length, trailer_magic, _ = TRAILER.unpack_from(self.map, self.size - TRAILER.size)
+        if magic != MAGIC or trailer_magic != MAGIC:
+            raise ValueError(f"{path} is not a NetworkTraffic column file.")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{path} uses format version {version}; this reader supports up to {FORMAT_VERSION}.")
+        footer = self.map[self.size - TRAILER.size - footer_length:self.size - TRAILER.size]
+        schema = json.loads(footer.tobytes())
+        self.columns = {column['name']: column for column in schema['columns']}
+
+        unknown = set(self.columns) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown column(s) in {path}: {', '.join(sorted(unknown))}")
+        missing = [
+            name for name in FIELDS
+            if name not in self.columns
+            and not (NetworkTraffic._meta.get_field(name).null or NetworkTraffic._meta.get_field(name).has_default())
+        ]
+        if missing:
+            raise ValueError(f"Missing column(s) in {path}: {', '.join(missing)}")
+        compressions = {column.get('compression') for column in self.columns.values()} - {None, 'zlib'}
+        if compressions:
+            raise ValueError(f"Unsupported compression in {path}: {', '.join(sorted(compressions))}")
+        self._dictionaries = {}
+        self._decompressed = {}
+
+    def __len__(self):
+        return self.rows
+
+    def codes(self, name):
+        column = self.columns[name]
+        if 'compression' not in column:
+            return np.ndarray((self.rows,), dtype=column['dtype'], buffer=self.map, offset=column['offset'])
+        if name not in self._decompressed:
+            data = zlib.decompress(self.map[column['offset']:column['offset'] + column['length']])
+            self._decompressed[name] = np.frombuffer(data, dtype=column['dtype'])
+        return self._decompressed[name]
+
+    def dictionary(self, name):
+        """
+        Return the column's dictionary as an array (None for columns stored as plain values).
+        """
+        if name not in self._dictionaries:
+            dictionary = self.columns[name]['dictionary']
+            if dictionary is not None:
+                dtype = object if _kind(name) == 'text' or None in dictionary else None
+                dictionary = np.array(dictionary, dtype=dtype)
+            self._dictionaries[name] = dictionary
+        return self._dictionaries[name]
+
+    def column(self, name, start=0, stop=None):
+        """
+        Return the values of rows `start` to `stop` of a column.
+        """
+        codes = self.codes(name)[start:stop]
+        if _kind(name) == 'timestamp':
+            return codes.view('datetime64[us]')  # Same bytes, no copy
+        dictionary = self.dictionary(name)
+        return codes if dictionary is None else dictionary[codes]
+
+    def chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Yield `{field: values}` dicts of decoded columns, `chunk_size` rows at a time.
+        """
+        for start in range(0, self.rows, chunk_size):
+            yield {name: self.column(name, start, start + chunk_size) for name in self.columns}
+
+    def records(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Lazily yield unsaved NetworkTraffic instances, ready for `ingest.bulk_ingest`.
+        """
+        defaults = [None] + [NetworkTraffic._meta.get_field(name).get_default() for name in FIELDS]
+        for chunk in self.chunks(chunk_size):
+            count = len(next(iter(chunk.values()), ()))
+            columns = [[defaults[0]] * count]
+            for position, name in enumerate(FIELDS, start=1):
+                values = chunk.get(name)
+                if values is None:
+                    columns.append([defaults[position]] * count)
+                elif values.dtype.kind == 'f' and NetworkTraffic._meta.get_field(name).null:
+                    columns.append([None if value != value else value for value in values.tolist()])  # NaN -> NULL
+                elif values.dtype.kind == 'M':
+                    columns.append([value.replace(tzinfo=timezone.utc) for value in values.tolist()])
+                else:
+                    columns.append(values.tolist())
+            for row in zip(*columns):
+                yield NetworkTraffic(*row)  # Positional arguments, in field order, skip the keyword path
@@ -0,0 +1,237 @@
+import threading
+from copy import copy
+from datetime import timezone as dt_timezone
+import numpy as np
+from django.utils import timezone
+from .models import DatasetVersion, NetworkTraffic
+from .stats import PERCENTILES
+
+# Dictionary-encoded text columns: stored as integer codes into a per-column list of values.
+CATEGORICAL_COLUMNS = ('protocol_type', 'service', 'flag')
+
+# Every other field, stored as a typed array (integers shrunk to the smallest type that fits).
+NUMERIC_COLUMNS = tuple(
+    field.name for field in NetworkTraffic._meta.concrete_fields
+    if not field.primary_key and field.name not in CATEGORICAL_COLUMNS
+)
+
+# Rows read per round trip while loading the snapshot.
+LOAD_CHUNK_SIZE = 20000
+
+# Date and time columns are stored as naive UTC with microsecond resolution.
+TIMESTAMP_DTYPE = np.dtype('datetime64[us]')
+
+_COLUMNS = ('id',) + CATEGORICAL_COLUMNS + NUMERIC_COLUMNS
+
+
+def _dtype(name):
+    field = NetworkTraffic._meta.get_field(name)
+    if field.get_internal_type() == 'BooleanField':
+        return np.bool_
+    if field.get_internal_type() == 'FloatField':
+        return np.float64
+    if field.get_internal_type() == 'DateTimeField':
+        return TIMESTAMP_DTYPE
+    return np.int64
+
+
+def _timestamp(value):
+    return np.datetime64(timezone.make_naive(value, dt_timezone.utc) if timezone.is_aware(value) else value, 'us')
+
+
+def _shrink(array):
+    # Store integer columns in the narrowest dtype that holds every value
+    if array.dtype != np.int64 or not len(array):
+        return array
+    return array.astype(np.result_type(np.min_scalar_type(int(array.min())), np.min_scalar_type(int(array.max()))))
+
+
+class ColumnarSnapshot:
+    """
+    Column-oriented copy of NetworkTraffic held in NumPy arrays, for vectorized filtering.
+
+    `ids` is sorted ascending and every column is aligned with it. Text columns are dictionary
+    encoded: `codes[name]` holds indexes into `values[name]`. Nullable numeric columns (such as
+    `attack_score`) store NULL as NaN, and `observed_at` is held as `datetime64[us]` in UTC.
+    """
+    def __init__(self):
+        self.state = None  # The (version, changed_at, rewrites) of DatasetVersion last loaded
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.values = {name: [] for name in CATEGORICAL_COLUMNS}
+        self.lookups = {name: {} for name in CATEGORICAL_COLUMNS}
+        self.codes = {name: np.zeros(0, dtype=np.int32) for name in CATEGORICAL_COLUMNS}
+        self.numeric = {name: np.zeros(0, dtype=_dtype(name)) for name in NUMERIC_COLUMNS}
+
+    def __copy__(self):
+        # Arrays are replaced rather than modified in place, so copying the containers is enough
+        # to give a reader a consistent view while another thread refreshes
+        snapshot = ColumnarSnapshot.__new__(ColumnarSnapshot)
+        snapshot.__dict__.update(self.__dict__)
+        snapshot.values = {name: list(values) for name, values in self.values.items()}
+        snapshot.lookups = {name: dict(lookup) for name, lookup in self.lookups.items()}
+        snapshot.codes = dict(self.codes)
+        snapshot.numeric = dict(self.numeric)
+        return snapshot
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        arrays = [self.ids, *self.codes.values(), *self.numeric.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def refresh(self):
+        """
+        Bring the snapshot up to date with the table.
+
+        Inserts are appended by reading only primary keys above the last one loaded; any update
+        or delete since the last refresh (tracked by `DatasetVersion.rewrites`) reloads everything.
+        Returns the number of rows read.
+        """
+        state = DatasetVersion.objects.filter(pk=1).values_list('version', 'changed_at', 'rewrites').first() or (0, None, 0)
+        if state == self.state:
+            return 0
+        # A version that did not move forwards means the table was restored or rolled back
+        if self.state is None or state[2] != self.state[2] or state[0] <= self.state[0]:
+            self.__init__()
+        queryset = NetworkTraffic.objects.order_by('pk')
+        if len(self.ids):
+            queryset = queryset.filter(pk__gt=int(self.ids[-1]))
+        read = self._load(queryset)
+        self.state = state
+        return read
+
+    def _load(self, queryset):
+        rows = queryset.values_list(*_COLUMNS).iterator(chunk_size=LOAD_CHUNK_SIZE)
+        chunks, chunk = [], []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == LOAD_CHUNK_SIZE:
+                chunks.append(self._encode(chunk))
+                chunk = []
+        if chunk:
+            chunks.append(self._encode(chunk))
+        if not chunks:
+            return 0
+
+        self.ids = np.concatenate([self.ids] + [ids for ids, _, _ in chunks])
+        for name in CATEGORICAL_COLUMNS:
+            self.codes[name] = np.concatenate([self.codes[name]] + [codes[name] for _, codes, _ in chunks])
+        for name in NUMERIC_COLUMNS:
+            self.numeric[name] = _shrink(np.concatenate([self.numeric[name]] + [numeric[name] for _, _, numeric in chunks]))
+        return sum(len(ids) for ids, _, _ in chunks)
+
+    def _encode(self, rows):
+        columns = list(zip(*rows))
+        ids = np.array(columns[0], dtype=np.int64)
+        codes = {}
+        for offset, name in enumerate(CATEGORICAL_COLUMNS, start=1):
+            lookup, values = self.lookups[name], self.values[name]
+            for value in set(columns[offset]) - lookup.keys():
+                lookup[value] = len(values)
+                values.append(value)
+            codes[name] = np.fromiter(map(lookup.__getitem__, columns[offset]), dtype=np.int32, count=len(rows))
+        numeric = {}
+        for offset, name in enumerate(NUMERIC_COLUMNS, start=1 + len(CATEGORICAL_COLUMNS)):
+            column = columns[offset]
+            if _dtype(name) is np.float64:
+                column = [np.nan if value is None else value for value in column]
+            elif _dtype(name) is TIMESTAMP_DTYPE:
+                column = [timezone.make_naive(value, dt_timezone.utc) for value in column]
+            numeric[name] = np.array(column, dtype=_dtype(name))
+        return ids, codes, numeric
+
+    def mask(self, conditions):
+        """
+        Return the boolean row mask for `(lookup, field, value)` conditions, all of which must hold.
+
+        Lookups are `iexact` (text columns, `value` already lower-case), `exact` and `range`
+        (`value` is a `(low, high)` pair, either end None for unbounded).
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        for lookup, field, value in conditions:
+            if lookup == 'iexact':
+                matching = [code for code, text in enumerate(self.values[field]) if text.lower() == value]
+                mask &= np.isin(self.codes[field], matching)
+            elif lookup == 'range':
+                mask &= self.range_mask(field, *value)
+            else:
+                mask &= self.numeric[field] == value
+        return mask
+
+    def range_mask(self, field, low=None, high=None):
+        column = self.numeric[field]
+        if column.dtype == TIMESTAMP_DTYPE:
+            # Bounds are aware datetimes, as in the ORM filters
+            low = None if low is None else _timestamp(low)
+            high = None if high is None else _timestamp(high)
+        mask = np.ones(len(column), dtype=bool)
+        if low is not None:
+            mask &= column >= low
+        if high is not None:
+            mask &= column <= high
+        return mask
+
+    def select(self, mask):
+        """
+        Return the ascending primary keys of the rows selected by `mask`.
+        """
+        return self.ids[mask]
+
+    def summarize(self, group_by=('service',)):
+        """
+        Same output as `stats.summarize`, computed from the snapshot with exact percentiles.
+        """
+        if not len(self.ids):
+            return []
+        key = np.zeros(len(self.ids), dtype=np.int64)
+        for name in group_by:
+            key = key * len(self.values[name]) + self.codes[name]
+        groups, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+        attacks = np.bincount(inverse, weights=self.numeric['attack'], minlength=len(groups))
+
+        # Decode the combined key back to one code per grouped column
+        decoded, remainder = {}, groups.copy()
+        for name in reversed(group_by):
+            decoded[name] = remainder % len(self.values[name])
+            remainder //= len(self.values[name])
+
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        byte_stats = {}
+        for field in ('src_bytes', 'dst_bytes'):
+            column = self.numeric[field].astype(np.int64)
+            ordered = column[np.lexsort((column, inverse))]  # Values sorted within each group
+            byte_stats[field] = {
+                'sum': np.bincount(inverse, weights=column, minlength=len(groups)),
+                **{pct: ordered[starts + np.ceil(counts * pct / 100).astype(np.int64) - 1] for pct in PERCENTILES},
+            }
+
+        results = []
+        for index in range(len(groups)):
+            records = int(counts[index])
+            entry = {name: self.values[name][int(decoded[name][index])] for name in group_by}
+            entry['records'] = records
+            entry['attacks'] = int(attacks[index])
+            entry['attack_ratio'] = round(int(attacks[index]) / records, 4)
+            for field, values in byte_stats.items():
+                total = int(values['sum'][index])
+                entry[field] = {'sum': total, 'mean': round(total / records, 2)}
+                for pct in PERCENTILES:
+                    entry[field][f'p{pct}'] = int(values[pct][index])
+            results.append(entry)
+        results.sort(key=lambda entry: (-entry['records'], tuple(entry[name] for name in group_by)))
+        return results
+
+
+_snapshot = ColumnarSnapshot()
+_lock = threading.Lock()
+
+
+def get_snapshot():
+    """
+    Return a copy of this process's snapshot, refreshed against the current dataset version.
+    """
+    with _lock:
+        _snapshot.refresh()
+        return copy(_snapshot)
@@ -0,0 +1,228 @@
+import csv
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+from operator import itemgetter
+import numpy as np
+from .ingest import parse_timestamp
+from .models import NetworkTraffic
+
+# KDD Cup 99 style window features computed from raw per-connection flow logs, in one pass.
+#
+# For every connection, in time order:
+# - time-based features over the connections of the last TIME_WINDOW_SECONDS seconds: `count`
+#   (same destination host), `srv_count` (same service) and the error and service rates of the
+#   same-host connections;
+# - host-based features over the last HOST_WINDOW connections: `dst_host_count`,
+#   `dst_host_srv_count` (same host and service) and their same/different service rates.
+# Both windows include the connection itself. Each is a queue of the connections inside it plus
+# counters per host, per service and per (host, service): a connection is counted when it enters
+# and uncounted when it leaves, so every connection costs a few dictionary updates, however long
+# the log. Rates are derived from the counters a chunk at a time with NumPy and rounded half up
+# to two decimals like the dataset's.
+
+TIME_WINDOW_SECONDS = 2.0
+HOST_WINDOW = 100
+
+# Connection states counted as SYN errors (`serror_rate`) and REJ errors (`rerror_rate`).
+SERROR_FLAGS = frozenset(('S0', 'S1', 'S2', 'S3'))
+RERROR_FLAGS = frozenset(('REJ',))
+
+# Columns every flow log must have. `timestamp` is in seconds since the epoch or ISO 8601.
+FLOW_COLUMNS = ('timestamp', 'src_host', 'src_port', 'dst_host', 'dst_port', 'protocol', 'service', 'flag', 'src_bytes', 'dst_bytes')
+
+# Optional flow log columns, copied to the record as they are, and their defaults.
+OPTIONAL_COLUMNS = {
+    'duration': 0, 'wrong_fragment': 0, 'urgent': 0, 'hot': 0, 'logged_in': 0, 'num_compromised': 0, 'attack': 'no',
+}
+
+# Window counters returned by `WindowFeatures.add`, from which `rates` derives the features.
+COUNTS = ('count', 'srv_count', 'serrors', 'rerrors', 'same_srv_count', 'dst_host_count', 'dst_host_srv_count')
+
+# The features computed here, in the order of the NetworkTraffic fields.
+FEATURES = (
+    'count', 'srv_count', 'serror_rate', 'rerror_rate', 'same_srv_rate', 'diff_srv_rate', 'srv_diff_host_rate',
+    'dst_host_count', 'dst_host_srv_count', 'dst_host_same_srv_rate', 'dst_host_diff_srv_rate',
+)
+
+# Flows whose features are computed together by `extract`.
+CHUNK_SIZE = 5000
+
+
+class WindowFeatures:
+    """
+    Streaming state of both windows. Feed connections in time order with `add`.
+    """
+    def __init__(self, seconds=TIME_WINDOW_SECONDS, host_window=HOST_WINDOW):
+        self.seconds = seconds
+        self.latest = float('-inf')
+        # Time window: (timestamp, host, service, pair, error) per connection
+        self.recent = deque()
+        self.hosts, self.services, self.pairs = {}, {}, {}
+        self.serrors, self.rerrors = {}, {}
+        # Host window: a ring buffer of the last `host_window` (host, pair) keys
+        self.last = deque(maxlen=host_window)
+        self.last_hosts, self.last_pairs = {}, {}
+
+    def add(self, timestamp, host, service, flag):
+        """
+        Count one connection into the windows and return its `COUNTS`.
+
+        A connection older than one already added is taken to have happened at the same time
+        as that one, so a slightly out-of-order log never moves the window back.
+        """
+        # Counters are updated inline: this runs once per connection and a helper call per
+        # counter would cost more than the updates themselves. Keys that leave a window are
+        # deleted, so memory follows the windows and not the length of the log.
+        if timestamp < self.latest:
+            timestamp = self.latest
+        self.latest = timestamp
+        pair = (host, service)
+        error = 1 if flag in SERROR_FLAGS else 2 if flag in RERROR_FLAGS else 0
+
+        # Time window: drop what is more than `seconds` old, then add this connection
+        recent, hosts, services, pairs = self.recent, self.hosts, self.services, self.pairs
+        horizon = timestamp - self.seconds
+        while recent and recent[0][0] < horizon:
+            _, old_host, old_service, old_pair, old_error = recent.popleft()
+            value = hosts[old_host] - 1
+            if value:
+                hosts[old_host] = value
+            else:
+                del hosts[old_host]
+            value = services[old_service] - 1
+            if value:
+                services[old_service] = value
+            else:
+                del services[old_service]
+            value = pairs[old_pair] - 1
+            if value:
+                pairs[old_pair] = value
+            else:
+                del pairs[old_pair]
+            if old_error:
+                errors = self.serrors if old_error == 1 else self.rerrors
+                value = errors[old_host] - 1
+                if value:
+                    errors[old_host] = value
+                else:
+                    del errors[old_host]
+        recent.append((timestamp, host, service, pair, error))
+        count = hosts[host] = hosts.get(host, 0) + 1
+        srv_count = services[service] = services.get(service, 0) + 1
+        same = pairs[pair] = pairs.get(pair, 0) + 1
+        if error:
+            errors = self.serrors if error == 1 else self.rerrors
+            errors[host] = errors.get(host, 0) + 1
+
+        # Host window: the ring buffer evicts the oldest connection once full
+        last, last_hosts, last_pairs = self.last, self.last_hosts, self.last_pairs
+        if len(last) == last.maxlen:
+            old_host, old_pair = last[0]
+            value = last_hosts[old_host] - 1
+            if value:
+                last_hosts[old_host] = value
+            else:
+                del last_hosts[old_host]
+            value = last_pairs[old_pair] - 1
+            if value:
+                last_pairs[old_pair] = value
+            else:
+                del last_pairs[old_pair]
+        last.append((host, pair))
+        host_count = last_hosts[host] = last_hosts.get(host, 0) + 1
+        host_srv_count = last_pairs[pair] = last_pairs.get(pair, 0) + 1
+
+        return count, srv_count, self.serrors.get(host, 0), self.rerrors.get(host, 0), same, host_count, host_srv_count
+
+
+def _rate(part, whole):
+    # part / whole rounded half up to two decimals, in integers so halves round the same way every time
+    return (200 * part + whole) // (2 * whole) / 100
+
+
+def rates(counts):
+    """
+    Turn an `(n, len(COUNTS))` array of `WindowFeatures.add` results into `{feature: array}`.
+    """
+    count, srv_count, serrors, rerrors, same, host_count, host_srv_count = counts.T
+    return {
+        'count': count,
+        'srv_count': srv_count,
+        'serror_rate': _rate(serrors, count),
+        'rerror_rate': _rate(rerrors, count),
+        'same_srv_rate': _rate(same, count),
+        'diff_srv_rate': _rate(count - same, count),
+        'srv_diff_host_rate': _rate(srv_count - same, srv_count),
+        'dst_host_count': host_count,
+        'dst_host_srv_count': host_srv_count,
+        'dst_host_same_srv_rate': _rate(host_srv_count, host_count),
+        'dst_host_diff_srv_rate': _rate(host_count - host_srv_count, host_count),
+    }
+
+
+def read_flows(file):
+    """
+    Lazily yield one dict per row of an open flow log CSV, holding the `FLOW_COLUMNS` and every
+    `OPTIONAL_COLUMNS` entry. The timestamp is converted to epoch seconds; every other value is
+    kept as read and converted by `records`.
+    """
+    reader = csv.reader(file)
+    header = next(reader, None) or []
+    missing = [name for name in FLOW_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"Flow log is missing the column(s): {', '.join(missing)}.")
+    names = FLOW_COLUMNS + tuple(name for name in OPTIONAL_COLUMNS if name in header)
+    pick = itemgetter(*(header.index(name) for name in names))
+    defaults = {name: value for name, value in OPTIONAL_COLUMNS.items() if name not in header}
+    for row in reader:
+        flow = dict(zip(names, pick(row)))
+        try:
+            flow['timestamp'] = float(flow['timestamp'])
+        except ValueError:  # Not epoch seconds, so it has to be ISO 8601
+            flow['timestamp'] = parse_timestamp(flow['timestamp']).timestamp()
+        if defaults:
+            flow.update(defaults)
+        yield flow
+
+
+def extract(flows, seconds=TIME_WINDOW_SECONDS, host_window=HOST_WINDOW, chunk_size=CHUNK_SIZE):
+    """
+    Yield `(flows, features)` per chunk of at most `chunk_size` flow dicts, `features` being
+    `{feature: array}` with one value per flow.
+    """
+    add = WindowFeatures(seconds, host_window).add
+    iterator = iter(flows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        counts = [add(flow['timestamp'], flow['dst_host'], flow['service'], flow['flag']) for flow in chunk]
+        yield chunk, rates(np.array(counts, dtype=np.int64))
+
+
+def records(flows, seconds=TIME_WINDOW_SECONDS, host_window=HOST_WINDOW):
+    """
+    Lazily yield an unsaved NetworkTraffic instance for every flow, ready for `ingest.bulk_ingest`.
+    """
+    for chunk, features in extract(flows, seconds, host_window):
+        columns = [features[name].tolist() for name in FEATURES]
+        for flow, values in zip(chunk, zip(*columns)):
+            yield NetworkTraffic(
+                duration=round(float(flow['duration'])),
+                protocol_type=flow['protocol'],
+                service=flow['service'],
+                flag=flow['flag'],
+                src_bytes=int(flow['src_bytes']),
+                dst_bytes=int(flow['dst_bytes']),
+                # Source and destination are the same host and port
+                land=flow['src_host'] == flow['dst_host'] and int(flow['src_port']) == int(flow['dst_port']),
+                wrong_fragment=int(flow['wrong_fragment']),
+                urgent=int(flow['urgent']),
+                hot=int(flow['hot']),
+                logged_in=bool(int(flow['logged_in'])),
+                num_compromised=int(flow['num_compromised']),
+                attack=str(flow['attack']).strip().lower() in ('yes', '1', 'true'),
+                observed_at=datetime.fromtimestamp(flow['timestamp'], dt_timezone.utc),
+                **dict(zip(FEATURES, values)),
+            )
@@ -0,0 +1,152 @@
+import csv
+import time
+from itertools import islice
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import anomaly, rules, sketches, stats
+from .cache import bump_version
+from .models import NetworkTraffic
+
+# Default number of rows written per transaction by the bulk ingest path.
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 date and time; times without an offset are taken to be in TIME_ZONE.
+    """
+    try:
+        parsed = parse_datetime(value.strip())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"Invalid timestamp '{value}'. Use ISO 8601, e.g. 2024-06-01T12:00:00Z.")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def parse_row(row):
+    """
+    Convert one CSV row (as produced by `csv.DictReader`) into an unsaved NetworkTraffic instance.
+
+    An `observed_at` column is optional: rows without one are stamped with the time of ingest.
+    """
+    record = NetworkTraffic(
+        duration=float(row['duration']),  # Duration of the network traffic session.
+        protocol_type=row['protocol_type'],  # Protocol type used in the session (e.g., TCP, UDP).
+        service=row['service'],  # The service or application accessed (e.g., HTTP, FTP).
+        flag=row['flag'],  # Flag status indicating the session state (e.g., SF, REJ).
+        src_bytes=int(row['src_bytes']),  # Number of bytes sent from the source.
+        dst_bytes=int(row['dst_bytes']),  # Number of bytes sent to the destination.
+        land=bool(int(row['land'])),  # Boolean indicating if the source and destination are the same.
+        wrong_fragment=int(row['wrong_fragment']),  # Count of wrong fragments in the session.
+        urgent=int(row['urgent']),  # Number of urgent packets in the session.
+        hot=int(row['hot']),  # Number of "hot" indicators (suspicious activities).
+        logged_in=bool(int(row['logged_in'])),  # Boolean indicating if the session was logged in.
+        num_compromised=int(row['num_compromised']),  # Number of compromised conditions observed.
+        count=int(row['count']),  # Number of connections to the same host as the current session.
+        srv_count=int(row['srv_count']),  # Number of connections to the same service as the current session.
+        serror_rate=float(row['serror_rate']),  # Percentage of connections with SYN errors.
+        rerror_rate=float(row['rerror_rate']),  # Percentage of connections with REJ errors.
+        same_srv_rate=float(row['same_srv_rate']),  # Percentage of connections to the same service.
+        diff_srv_rate=float(row['diff_srv_rate']),  # Percentage of connections to different services.
+        srv_diff_host_rate=float(row['srv_diff_host_rate']),  # Percentage of connections to different hosts.
+        dst_host_count=int(row['dst_host_count']),  # Number of connections to the same destination host.
+        dst_host_srv_count=int(row['dst_host_srv_count']),  # Number of connections to the same service at the destination host.
+        dst_host_same_srv_rate=float(row['dst_host_same_srv_rate']),  # Percentage of same-service connections to the destination host.
+        dst_host_diff_srv_rate=float(row['dst_host_diff_srv_rate']),  # Percentage of different-service connections to the destination host.
+        attack=row['attack'].strip().lower() == 'yes',  # Boolean indicating if this session is an attack.
+    )
+    if row.get('observed_at'):
+        record.observed_at = parse_timestamp(row['observed_at'])  # When the session was observed.
+    return record
+
+
+def read_csv(file):
+    """
+    Lazily yield unsaved NetworkTraffic instances from an open CSV file, one row at a time.
+    """
+    for row in csv.DictReader(file):
+        yield parse_row(row)
+
+
+def chunked(iterable, size):
+    """
+    Split any iterable into lists of at most `size` items without materializing the whole input.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def records_created(records):
+    """
+    Bring derived data up to date after NetworkTraffic rows were inserted.
+    """
+    stats.apply(records)
+    anomaly.apply(records)
+    sketches.apply(records)
+    rules.evaluate(records)
+    bump_version()
+
+
+def records_deleted(records):
+    """
+    Bring derived data up to date after NetworkTraffic rows were deleted.
+    """
+    stats.apply(records, sign=-1)
+    anomaly.apply(records, sign=-1)
+    sketches.apply(records, sign=-1)
+    rules.forget(records)
+    bump_version(rewrite=True)
+
+
+def records_updated(before, after):
+    """
+    Bring derived data up to date after NetworkTraffic rows changed from `before` to `after`.
+    """
+    stats.apply(before, sign=-1)
+    stats.apply(after)
+    anomaly.apply(before, sign=-1)
+    anomaly.apply(after)
+    sketches.apply(before, sign=-1)
+    sketches.apply(after)
+    rules.forget(before)
+    rules.evaluate(after)
+    bump_version(rewrite=True)
+
+
+def write_chunk(records):
+    """
+    Insert one chunk of unsaved NetworkTraffic instances in a single transaction.
+    """
+    with transaction.atomic():
+        created = NetworkTraffic.objects.bulk_create(records)
+        records_created(created)
+        return created
+
+
+def bulk_ingest(records, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, classifier=None):
+    """
+    Stream NetworkTraffic instances into the database in chunks of `chunk_size`.
+
+    Each chunk is written with `bulk_create` inside its own transaction, so only one chunk
+    is held in memory at a time. With a `classifier` (see classifier.py), every chunk gets its
+    `attack_score` predicted before it is written. `progress`, if given, is called after every
+    chunk with the running row total, the elapsed time and the chunk's inference time in
+    seconds (None when not scoring). The traffic sketches are saved once all chunks are written.
+    Returns the number of rows written.
+    """
+    total = 0
+    started = time.perf_counter()
+    for chunk in chunked(records, chunk_size):
+        inference = classifier.score_records(chunk) if classifier is not None else None
+        write_chunk(chunk)
+        total += len(chunk)
+        if progress is not None:
+            progress(total, time.perf_counter() - started, inference)
+    sketches.flush_quietly()  # Every chunk has committed: a failed save must not fail the load
+    return total
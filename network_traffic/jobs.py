@@ -0,0 +1,393 @@
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Count
+from django.utils import timezone
+from . import anomaly, colfile, features, retention, sketches, stats
+from .classifier import get_classifier
+from .ingest import DEFAULT_CHUNK_SIZE, bulk_ingest, read_csv
+from .models import Job
+
+# Background jobs for work too heavy for a request: ingesting files, exporting, rebuilding the
+# derived tables and purging old records.
+#
+# The Job table is the queue, so nothing but the database is needed. `submit` validates the
+# parameters and inserts a queued row; `run_jobs` workers claim the oldest queued job whose kind
+# is below its concurrency limit (IDS_JOB_LIMITS) with a conditional UPDATE, run it, and store
+# the result. Handlers report progress after every chunk through `JobContext.progress`, which
+# also notices a cancellation request and stops the job there. Work already committed by earlier
+# chunks stays, exactly as if the equivalent management command had been interrupted. While a
+# job runs, a `Heartbeat` thread also marks it alive, so long steps that report no progress (an
+# export, a rebuild step) are not taken for a dead worker by `fail_stale`.
+
+# Heartbeats per IDS_JOB_STALE_SECONDS while a job runs.
+HEARTBEATS_PER_STALE_PERIOD = 4
+
+# Job kinds by name: `{'handler': handler(context, **parameters), 'parameters': clean(parameters)}`.
+JOB_KINDS = {}
+
+
+def job_kind(name, clean):
+    """
+    Register a job handler under `name`; `clean(parameters)` validates and completes its parameters.
+    """
+    def register(handler):
+        JOB_KINDS[name] = {'handler': handler, 'parameters': clean}
+        return handler
+    return register
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a handler when its job was cancelled.
+    """
+
+
+class JobContext:
+    """
+    Handed to a running handler to report progress.
+    """
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, done, total=None):
+        """
+        Record `done` (and `total`) units of work, or raise JobCancelled if the job was cancelled.
+        """
+        values = {'done': done, 'heartbeat_at': timezone.now()}
+        if total is not None:
+            values['total'] = total
+        # One statement both saves the progress and tells whether a cancel was requested
+        if not Job.objects.filter(pk=self.job.pk, cancel_requested=False).update(**values):
+            raise JobCancelled()
+
+
+def beat(job):
+    """
+    Record that the worker running `job` is still alive.
+    """
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+
+
+class Heartbeat:
+    """
+    Calls `beat(job)` from a background thread every IDS_JOB_STALE_SECONDS / HEARTBEATS_PER_STALE_PERIOD
+    for as long as the `with` block runs.
+
+    A beat cannot land while another connection holds SQLite's write lock, including a step of
+    the job itself that writes in one long transaction; it is tried again at the next interval.
+    """
+    def __init__(self, job):
+        self.job = job
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        interval = settings.IDS_JOB_STALE_SECONDS / HEARTBEATS_PER_STALE_PERIOD
+        try:
+            while not self.stopped.wait(interval):
+                try:
+                    beat(self.job)
+                except DatabaseError:
+                    pass  # Locked: the next beat tries again
+        finally:
+            connection.close()  # The thread's own connection
+
+
+def job_path(value, must_exist=False):
+    """
+    Resolve a file name given to a job inside IDS_JOB_DIR, refusing anything outside it.
+    """
+    if not isinstance(value, str) or not value:
+        raise ValueError("'path' must be a file name inside the job directory.")
+    directory = os.path.realpath(settings.IDS_JOB_DIR)
+    path = os.path.realpath(os.path.join(directory, value))
+    if os.path.commonpath([directory, path]) != directory:
+        raise ValueError("'path' must be a file name inside the job directory.")
+    if must_exist and not os.path.isfile(path):
+        raise ValueError(f"File '{value}' not found in the job directory.")
+    return path
+
+
+def _only(parameters, *names):
+    if not isinstance(parameters, dict):
+        raise ValueError("'parameters' must be an object.")
+    unknown = sorted(set(parameters) - set(names))
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(unknown)}. Use: {', '.join(names) or 'none'}.")
+
+
+def _positive_int(parameters, name, default):
+    value = parameters.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f"'{name}' must be a positive integer.")
+    return value
+
+
+def _flag(parameters, name):
+    value = parameters.get(name, False)
+    if not isinstance(value, bool):
+        raise ValueError(f"'{name}' must be true or false.")
+    return value
+
+
+# Input formats of ingest jobs: `load_csv`, `extract_features` and `import_traffic` files.
+INGEST_FORMATS = ('csv', 'flows', 'columns')
+
+
+def _ingest_parameters(parameters):
+    _only(parameters, 'path', 'format', 'chunk_size', 'score')
+    job_path(parameters.get('path'), must_exist=True)
+    if parameters.get('format', 'csv') not in INGEST_FORMATS:
+        raise ValueError(f"'format' must be one of: {', '.join(INGEST_FORMATS)}.")
+    if _flag(parameters, 'score') and get_classifier() is None:
+        raise ValueError("'score' needs a trained model. Run `python manage.py train_classifier` first.")
+    return {
+        'path': parameters['path'],
+        'format': parameters.get('format', 'csv'),
+        'chunk_size': _positive_int(parameters, 'chunk_size', DEFAULT_CHUNK_SIZE),
+        'score': _flag(parameters, 'score'),
+    }
+
+
+@job_kind('ingest', _ingest_parameters)
+def ingest_job(context, path, format, chunk_size, score):
+    """
+    Load a CSV, flow log or column file from the job directory. Progress is counted in rows.
+    """
+    path = job_path(path, must_exist=True)
+    classifier = get_classifier() if score else None
+
+    def report(rows, elapsed, inference=None):
+        context.progress(rows)
+
+    if format == 'columns':
+        source = colfile.ColumnFile(path)
+        context.progress(0, source.rows)
+        rows = bulk_ingest(source.records(chunk_size), chunk_size=chunk_size, progress=report, classifier=classifier)
+    else:
+        # Counting lines first costs one quick read of the file and gives the progress a total
+        with open(path, 'rb') as file:
+            lines = sum(block.count(b'\n') for block in iter(lambda: file.read(1 << 20), b''))
+        context.progress(0, max(lines - 1, 0))  # Every line but the header
+        with open(path) as file:
+            records = read_csv(file) if format == 'csv' else features.records(features.read_flows(file))
+            rows = bulk_ingest(records, chunk_size=chunk_size, progress=report, classifier=classifier)
+    return {'rows': rows}
+
+
+def _export_parameters(parameters):
+    _only(parameters, 'path', 'compress', 'chunk_size')
+    job_path(parameters.get('path'))
+    return {
+        'path': parameters['path'],
+        'compress': _flag(parameters, 'compress'),
+        'chunk_size': _positive_int(parameters, 'chunk_size', colfile.DEFAULT_CHUNK_SIZE),
+    }
+
+
+@job_kind('export', _export_parameters)
+def export_job(context, path, compress, chunk_size):
+    """
+    Export every record to a column file in the job directory.
+
+    The export reads inside one transaction, and progress written there would only show once it
+    commits, so progress is reported before and after. A cancel requested meanwhile discards the file.
+    """
+    path = job_path(path)
+    context.progress(0, 1)
+    try:
+        rows = colfile.export(path, chunk_size=chunk_size, compress=compress)
+        context.progress(1)
+    except JobCancelled:
+        for leftover in (path, f'{path}.partial'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    return {'rows': rows, 'bytes': os.path.getsize(path)}
+
+
+def _no_parameters(parameters):
+    _only(parameters)
+    return {}
+
+
+@job_kind('rebuild', _no_parameters)
+def rebuild_job(context):
+    """
+    Recompute the summary table, the anomaly baselines and the sketches. Progress is counted in steps.
+    """
+    context.progress(0, 3)
+    groups = stats.rebuild()
+    context.progress(1)
+    baselines = anomaly.rebuild()
+    context.progress(2)
+    records = sketches.rebuild()
+    context.progress(3)
+    return {'groups': groups, 'baselines': baselines, 'sketched_records': records}
+
+
+def _purge_parameters(parameters):
+    _only(parameters, 'older_than', 'batch_size')
+    retention.parse_duration(parameters.get('older_than'))
+    return {
+        'older_than': parameters['older_than'],
+        'batch_size': _positive_int(parameters, 'batch_size', retention.DEFAULT_BATCH_SIZE),
+    }
+
+
+@job_kind('purge', _purge_parameters)
+def purge_job(context, older_than, batch_size):
+    """
+    Delete the records older than a duration, e.g. '30d'. Progress is counted in records.
+    """
+    cutoff = timezone.now() - retention.parse_duration(older_than)
+    queryset = retention.older_than(cutoff)
+    context.progress(0, queryset.count())
+    purged = retention.purge(queryset, batch_size=batch_size, progress=context.progress)
+    return {'purged': purged, 'cutoff': cutoff.isoformat()}
+
+
+def submit(kind, parameters=None):
+    """
+    Validate the parameters of a job and queue it. Raises ValueError for unknown kinds or bad parameters.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind '{kind}'. Use one of: {', '.join(sorted(JOB_KINDS))}.")
+    return Job.objects.create(kind=kind, parameters=JOB_KINDS[kind]['parameters'](parameters or {}))
+
+
+def cancel(job):
+    """
+    Cancel a job: a queued job at once, a running one at its next progress report.
+    Returns False if it had already finished.
+    """
+    if Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(status=Job.CANCELLED, cancel_requested=True, finished_at=timezone.now()):
+        return True
+    return bool(Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(cancel_requested=True))
+
+
+# Kinds that write to the table run one at a time by default: SQLite has a single writer, and
+# concurrent writers would only queue up on its lock. Kinds not listed are limited only by the
+# size of the worker pools.
+DEFAULT_JOB_LIMITS = {'ingest': 1, 'rebuild': 1, 'purge': 1}
+
+
+def job_limits():
+    """
+    Return the most jobs of each kind allowed to run at once, across all workers.
+    """
+    return {**DEFAULT_JOB_LIMITS, **settings.IDS_JOB_LIMITS}
+
+
+_claim_lock = threading.Lock()
+
+
+def claim(worker):
+    """
+    Mark the oldest runnable queued job as running for `worker` and return it, or None.
+
+    Limits are checked against the jobs running when the claim is made: exact within one worker
+    process, whose threads claim one at a time, and best effort between processes.
+    """
+    with _claim_lock:
+        running = dict(Job.objects.filter(status=Job.RUNNING).values_list('kind').annotate(count=Count('id')))
+        blocked = [kind for kind, limit in job_limits().items() if running.get(kind, 0) >= limit]
+        candidates = Job.objects.filter(status=Job.QUEUED).exclude(kind__in=blocked).order_by('pk').values_list('pk', flat=True)
+        for pk in candidates[:10]:
+            now = timezone.now()
+            # Another worker may claim the same row first; only one UPDATE matches the queued status
+            if Job.objects.filter(pk=pk, status=Job.QUEUED).update(status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now):
+                return Job.objects.get(pk=pk)
+    return None
+
+
+def fail_stale():
+    """
+    Fail running jobs whose worker stopped reporting progress IDS_JOB_STALE_SECONDS ago.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.IDS_JOB_STALE_SECONDS)
+    return Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=cutoff).update(
+        status=Job.FAILED, error="The worker stopped reporting progress.", finished_at=timezone.now(),
+    )
+
+
+def execute(job):
+    """
+    Run a claimed job to completion and store its outcome.
+    """
+    kind = JOB_KINDS.get(job.kind)
+    values = {}
+    with Heartbeat(job):
+        try:
+            if kind is None:
+                raise ValueError(f"Unknown job kind '{job.kind}'.")
+            values['result'] = kind['handler'](JobContext(job), **job.parameters)
+            values['status'] = Job.SUCCEEDED
+        except JobCancelled:
+            values['status'] = Job.CANCELLED
+        except Exception:
+            values.update(status=Job.FAILED, error=traceback.format_exc())
+    # A job failed as stale meanwhile keeps that outcome: its slot may already be taken by another job
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(finished_at=timezone.now(), **values)
+    job.refresh_from_db()
+    return job
+
+
+class Worker:
+    """
+    Runs queued jobs in `concurrency` threads until stopped (or, with `burst`, until none are left).
+    """
+    def __init__(self, concurrency=1, poll=1.0, name=None):
+        self.concurrency = concurrency
+        self.poll = poll
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self, burst=False, on_finish=None):
+        """
+        Work through the queue; `on_finish(job)`, if given, is called after every job.
+        """
+        if self.concurrency == 1:
+            self._loop(self.name, burst, on_finish)  # In the calling thread
+            return
+        threads = [
+            threading.Thread(target=self._loop, args=(f'{self.name}/{number}', burst, on_finish), daemon=True)
+            for number in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _loop(self, name, burst, on_finish):
+        try:
+            while not self.stopping.is_set():
+                fail_stale()
+                job = claim(name)
+                if job is None:
+                    if burst and not Job.objects.filter(status=Job.RUNNING).exists():
+                        return
+                    self.stopping.wait(self.poll)
+                    continue
+                job = execute(job)
+                if on_finish is not None:
+                    on_finish(job)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()  # Each thread opened its own connection
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .batch import create_batch, max_batch_size
+
+# Path the ASGI router in smarthome_network_ids/asgi.py sends to `websocket_application`.
+INGEST_PATH = '/ws/ingest/'
+
+# Close code sent to WebSocket connections on any other path.
+CLOSE_NOT_FOUND = 4404
+
+# What to do with a frame when the queue is full: 'block' stops reading from the socket until
+# the writer catches up, 'drop' discards the frame and reports it.
+OVERFLOW_POLICIES = ('block', 'drop')
+
+
+def live_settings():
+    return {
+        'batch_size': getattr(settings, 'IDS_LIVE_BATCH_SIZE', 2000),
+        'flush_interval': getattr(settings, 'IDS_LIVE_FLUSH_INTERVAL', 0.25),
+        'queue_frames': getattr(settings, 'IDS_LIVE_QUEUE_FRAMES', 1000),
+        'overflow': getattr(settings, 'IDS_LIVE_OVERFLOW', 'block'),
+    }
+
+
+class _Counters:
+    """
+    Per-process counters of the live ingest channel.
+    """
+    fields = ('connections', 'frames', 'received', 'created', 'rejected', 'dropped', 'failed', 'batches')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            for name in self.fields:
+                setattr(self, name, 0)
+            self.write_seconds = 0.0
+
+    def add(self, **amounts):
+        with self.lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self.lock:
+            data = {name: getattr(self, name) for name in self.fields}
+            data['mean_batch_ms'] = round(self.write_seconds * 1000 / self.batches, 3) if self.batches else 0.0
+            return data
+
+
+counters = _Counters()
+
+
+def decode_frame(message):
+    """
+    Return the records carried by one WebSocket message: a JSON object, a JSON array of objects,
+    or newline-delimited JSON objects. Raises ValueError on anything else.
+    """
+    text = message.get('text')
+    if text is None:
+        text = (message.get('bytes') or b'').decode('utf-8')
+    text = text.strip()
+    if not text:
+        raise ValueError('Empty frame.')
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]  # NDJSON
+    if isinstance(data, dict):
+        return [data]
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON object, an array of objects, or NDJSON.')
+    return data
+
+
+def write_frames(frames):
+    """
+    Validate and insert the records of several frames in one transaction.
+
+    Returns one `{"created": ..., "errors": ...}` result per frame; error indexes are relative
+    to the frame they came from.
+    """
+    records, owners = [], []
+    for position, frame in enumerate(frames):
+        records.extend(frame)
+        owners.extend((position, index) for index in range(len(frame)))
+    result = create_batch(records)
+
+    results = [{'created': 0, 'errors': []} for _ in frames]
+    for error in result['errors']:
+        position, index = owners[error['index']]
+        results[position]['errors'].append({'index': index, 'errors': error['errors']})
+    for position, frame in enumerate(frames):
+        results[position]['created'] = len(frame) - len(results[position]['errors'])
+    return results
+
+
+class MicroBatcher:
+    """
+    Collects frames from every connection of one event loop and writes them in bulk.
+
+    A batch is flushed once it holds `batch_size` records or `flush_interval` seconds after its
+    first frame arrived, whichever comes first. Frames wait in a bounded queue while a batch is
+    being written; what happens when it is full depends on the overflow policy.
+    """
+    def __init__(self, batch_size, flush_interval, queue_frames, overflow):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"IDS_LIVE_OVERFLOW must be one of: {', '.join(OVERFLOW_POLICIES)}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.queue = asyncio.Queue(maxsize=queue_frames)
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def submit(self, records, reply):
+        """
+        Queue one frame; `reply(result)` is awaited once it has been written. Returns False if it was dropped.
+        """
+        if self.overflow == 'drop':
+            try:
+                self.queue.put_nowait((records, reply))
+            except asyncio.QueueFull:
+                counters.add(dropped=len(records))
+                return False
+        else:
+            await self.queue.put((records, reply))  # Waits while the queue is full
+        return True
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            frames = [await self.queue.get()]
+            size = len(frames[0][0])
+            deadline = loop.time() + self.flush_interval
+            while size < self.batch_size:
+                try:
+                    frame = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        frame = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                frames.append(frame)
+                size += len(frame[0])
+            await self.flush(frames)
+
+    async def flush(self, frames):
+        started = time.perf_counter()
+        try:
+            results = await sync_to_async(write_frames)([records for records, _ in frames])
+        except Exception as exc:
+            counters.add(failed=sum(len(records) for records, _ in frames))
+            results = [{'created': 0, 'error': f'Write failed: {exc}'} for _ in frames]
+        else:
+            created = sum(result['created'] for result in results)
+            counters.add(
+                created=created, rejected=sum(len(result['errors']) for result in results),
+                batches=1, write_seconds=time.perf_counter() - started,
+            )
+        for (_, reply), result in zip(frames, results):
+            try:
+                await reply(result)
+            except Exception:
+                pass  # The connection went away before its frame was written
+
+
+_batchers = {}
+
+
+def get_batcher():
+    """
+    Return the MicroBatcher of the running event loop, starting it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    for closed in [other for other in _batchers if other.is_closed()]:
+        del _batchers[closed]
+    batcher = _batchers.get(loop)
+    if batcher is None or batcher.task.done():
+        batcher = _batchers[loop] = MicroBatcher(**live_settings())
+    return batcher
+
+
+async def websocket_application(scope, receive, send):
+    """
+    ASGI application for gateways pushing records over a WebSocket.
+
+    Every text (or binary UTF-8) message holds one record, an array of records, or NDJSON. Each
+    message is acknowledged once written with `{"seq": n, "created": ..., "errors": [...]}`, where
+    `n` counts the connection's messages from 1 and error indexes are relative to the message.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if scope['path'] != INGEST_PATH:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    await send({'type': 'websocket.accept'})
+    counters.add(connections=1)
+
+    batcher = get_batcher()
+    sequence = 0
+
+    async def reply(payload):
+        await send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+        if message['type'] != 'websocket.receive':
+            continue
+        sequence += 1
+        try:
+            records = decode_frame(message)
+        except ValueError as exc:
+            await reply({'seq': sequence, 'error': str(exc)})
+            continue
+        if len(records) > max_batch_size():
+            await reply({'seq': sequence, 'error': f'Too many records. Send at most {max_batch_size()} per message.'})
+            continue
+
+        counters.add(frames=1, received=len(records))
+        ack = lambda result, seq=sequence: reply({'seq': seq, **result})
+        if not await batcher.submit(records, ack):
+            await reply({'seq': sequence, 'dropped': len(records)})
@@ -0,0 +1,62 @@
+import json
+import platform
+import sqlite3
+import subprocess
+from django import get_version
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from network_traffic.benchmarks import SCENARIOS
+
+# Define a custom Django management command to run the registered performance benchmarks.
+class Command(BaseCommand):
+    help = "Run performance benchmarks against synthetic rows that are rolled back afterwards."
+
+    def add_arguments(self, parser):
+        # Scenarios to run; all registered scenarios when none are named.
+        parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run (choices: {', '.join(sorted(SCENARIOS))})")
+        # Every scenario runs once per table size, smallest first.
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000], help="Number(s) of rows to benchmark against")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the fastest is reported")
+        parser.add_argument('--output', default=None, help="Also write the results to this JSON file")
+
+    # Identify the code and environment the results were measured on, so runs can be compared
+    def environment(self):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10,
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+        }
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or sorted(SCENARIOS)
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(unknown)}")
+        sizes = options['rows'] if isinstance(options['rows'], list) else [options['rows']]  # call_command(rows=n)
+        if min(sizes) < 0 or options['repeat'] < 1:
+            raise CommandError("--rows must not be negative and --repeat must be a positive integer.")
+
+        results = []
+        for name in names:
+            for rows in sorted(sizes):
+                result = SCENARIOS[name](rows=rows, repeat=options['repeat'])
+                results.append({'scenario': name, 'rows': rows, 'metrics': result})
+                self.stdout.write(self.style.SUCCESS(f"{name} ({rows} rows)"))
+                for key, value in result.items():
+                    self.stdout.write(f"  {key}: {value}")
+
+        if options['output']:
+            report = {**self.environment(), 'repeat': options['repeat'], 'results': results}
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f"Wrote {len(results)} results to {options['output']}")
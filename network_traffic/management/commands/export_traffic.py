@@ -0,0 +1,32 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from network_traffic import colfile
+
+# Define a custom Django management command to write every stored record to a binary column file.
+class Command(BaseCommand):
+    help = "Export all NetworkTraffic records to a compact binary column file (see network_traffic/colfile.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help="The path of the column file to write")
+        parser.add_argument(
+            '--chunk-size', type=int, default=colfile.DEFAULT_CHUNK_SIZE,
+            help=f"Rows read from the database at a time (default: {colfile.DEFAULT_CHUNK_SIZE})",
+        )
+        # Smaller files, at the cost of decompressing each column on read instead of mapping it.
+        parser.add_argument('--compress', action='store_true', help="Compress every column with zlib")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be a positive integer.")
+        started = time.perf_counter()
+        try:
+            rows = colfile.export(options['path'], chunk_size=options['chunk_size'], compress=options['compress'])
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        size = os.path.getsize(options['path'])
+        per_row = f", {size / rows:.1f} bytes/row" if rows else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {rows} rows to {options['path']} ({size:,} bytes{per_row}) in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from network_traffic.classifier import get_classifier
+from network_traffic.features import HOST_WINDOW, TIME_WINDOW_SECONDS, read_flows, records
+from network_traffic.ingest import DEFAULT_CHUNK_SIZE, bulk_ingest
+
+# Define a custom Django management command to turn a raw flow log into NetworkTraffic records.
+class Command(BaseCommand):
+    help = "Compute the KDD window features of a raw per-connection flow log (CSV) and load the records into the Database."
+
+    def add_arguments(self, parser):
+        # Flow log with timestamp, src_host, src_port, dst_host, dst_port, protocol, service, flag, src_bytes, dst_bytes.
+        parser.add_argument('flow_log', type=str, help="The path to the flow log CSV, in time order")
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f"Number of rows written per transaction (default: {DEFAULT_CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            '--window-seconds', type=float, default=TIME_WINDOW_SECONDS,
+            help=f"Length of the time-based window (default: {TIME_WINDOW_SECONDS:g} seconds)",
+        )
+        parser.add_argument(
+            '--host-window', type=int, default=HOST_WINDOW,
+            help=f"Number of connections in the host-based window (default: {HOST_WINDOW})",
+        )
+        # Predict an attack score for every row with the trained classifier.
+        parser.add_argument('--score', action='store_true', help="Store the classifier's attack_score with every row")
+
+    # Report the running row count and throughput after every chunk.
+    def report_progress(self, rows, elapsed, inference=None):
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(f"Loaded {rows} connections ({rate:,.0f} rows/sec)")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['host_window'] < 1 or options['window_seconds'] <= 0:
+            raise CommandError("--chunk-size, --host-window and --window-seconds must be positive.")
+        classifier = None
+        if options['score']:
+            classifier = get_classifier()
+            if classifier is None:
+                raise CommandError("--score needs a trained model. Run `python manage.py train_classifier` first.")
+
+        try:
+            with open(options['flow_log']) as file:
+                # Flows are parsed, windowed and written a chunk at a time, so memory stays flat
+                flows = records(read_flows(file), options['window_seconds'], options['host_window'])
+                rows = bulk_ingest(flows, chunk_size=options['chunk_size'], progress=self.report_progress, classifier=classifier)
+        except FileNotFoundError:
+            raise CommandError(f"File {options['flow_log']} not found.")
+        except (IndexError, KeyError, ValueError) as exc:
+            raise CommandError(f"Invalid flow log: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Successfully loaded {rows} connections into the database."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from network_traffic import colfile
+from network_traffic.classifier import get_classifier
+from network_traffic.ingest import DEFAULT_CHUNK_SIZE, bulk_ingest
+
+# Define a custom Django management command to load records from a binary column file into DB.
+class Command(BaseCommand):
+    help = "Load NetworkTraffic records from a binary column file written by export_traffic."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help="The path of the column file to load")
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f"Number of rows written per transaction (default: {DEFAULT_CHUNK_SIZE})",
+        )
+        # Predict an attack score for every row with the trained classifier.
+        parser.add_argument('--score', action='store_true', help="Store the classifier's attack_score with every row")
+
+    # Report the running row count and throughput after every chunk.
+    def report_progress(self, rows, elapsed, inference=None):
+        rate = rows / elapsed if elapsed else 0
+        scored = f", scored in {inference * 1000:.1f} ms" if inference is not None else ""
+        self.stdout.write(f"Loaded {rows} rows ({rate:,.0f} rows/sec{scored})")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be a positive integer.")
+
+        classifier = None
+        if options['score']:
+            classifier = get_classifier()
+            if classifier is None:
+                raise CommandError("--score needs a trained model. Run `python manage.py train_classifier` first.")
+
+        try:
+            source = colfile.ColumnFile(options['path'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        # Columns are decoded one chunk at a time straight from the memory-mapped file
+        rows = bulk_ingest(source.records(chunk_size), chunk_size=chunk_size, progress=self.report_progress, classifier=classifier)
+        self.stdout.write(self.style.SUCCESS(f"Successfully loaded {rows} rows into the database."))
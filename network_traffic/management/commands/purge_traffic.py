@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from network_traffic import colfile
+from network_traffic.ingest import parse_timestamp
+from network_traffic.retention import DEFAULT_BATCH_SIZE, older_than, parse_duration, purge
+
+# Define a custom Django management command to delete (and optionally archive) old records.
+class Command(BaseCommand):
+    help = "Delete NetworkTraffic records observed before a cutoff, in small batched transactions."
+
+    def add_arguments(self, parser):
+        # The cutoff, either relative to now or as a timestamp; records observed before it are purged.
+        cutoff = parser.add_mutually_exclusive_group(required=True)
+        cutoff.add_argument('--older-than', help="Purge records older than this duration, e.g. 30d, 12h or 90m")
+        cutoff.add_argument('--before', help="Purge records observed before this ISO 8601 timestamp")
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f"Number of records deleted per transaction (default: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches")
+        # Keep a copy of the purged records in a binary column file (see import_traffic).
+        parser.add_argument('--archive', default=None, help="Export the records to this column file before deleting them")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many records would be purged")
+
+    # Report the running total after every batch.
+    def report_progress(self, total):
+        self.stdout.write(f"Purged {total} records")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['pause'] < 0:
+            raise CommandError("--batch-size must be a positive integer and --pause must not be negative.")
+        try:
+            if options['older_than']:
+                cutoff = timezone.now() - parse_duration(options['older_than'])
+            else:
+                cutoff = parse_timestamp(options['before'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        queryset = older_than(cutoff)
+        if options['dry_run']:
+            self.stdout.write(f"{queryset.count()} records observed before {cutoff.isoformat()} would be purged.")
+            return
+
+        if options['archive']:
+            # Only purge what was archived: rows written with an old timestamp after the export stay
+            last = queryset.order_by('-pk').values_list('pk', flat=True).first()
+            if last is None:
+                self.stdout.write(f"No records observed before {cutoff.isoformat()}.")
+                return
+            queryset = queryset.filter(pk__lte=last)
+            archived = colfile.export(options['archive'], queryset)
+            self.stdout.write(f"Archived {archived} records to {options['archive']}")
+
+        total = purge(queryset, batch_size=options['batch_size'], pause=options['pause'], progress=self.report_progress)
+        self.stdout.write(self.style.SUCCESS(f"Purged {total} records observed before {cutoff.isoformat()}."))
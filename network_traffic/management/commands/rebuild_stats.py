@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from network_traffic import anomaly, sketches, stats
+
+# Define a custom Django management command to recompute the traffic summary, baseline and sketch tables from scratch.
+class Command(BaseCommand):
+    help = "Rebuild the traffic statistics summary table, the anomaly baselines and the traffic sketches from all stored NetworkTraffic records."
+
+    def handle(self, *args, **options):
+        groups = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt traffic statistics for {groups} groups."))
+        baselines = anomaly.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt anomaly baselines for {baselines} groups."))
+        records = sketches.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt traffic sketches from {records} records."))
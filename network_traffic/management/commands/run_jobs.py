@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from network_traffic.jobs import Worker
+
+# Define a custom Django management command to run the queued background jobs.
+class Command(BaseCommand):
+    help = "Run queued background jobs (ingest, export, rebuild, purge) submitted through /api/jobs/."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help="Number of jobs run at once (default: 1)")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds between checks of an empty queue (default: 1)")
+        # Exit once the queue is empty instead of waiting for new jobs.
+        parser.add_argument('--burst', action='store_true', help="Stop when no jobs are left")
+
+    # Report every finished job.
+    def report_job(self, job):
+        detail = job.result if job.status == job.SUCCEEDED else job.error.strip().splitlines()[-1:] or ''
+        self.stdout.write(f"Job {job.pk} ({job.kind}) {job.status}: {detail}")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['poll'] <= 0:
+            raise CommandError("--concurrency and --poll must be positive.")
+        worker = Worker(concurrency=options['concurrency'], poll=options['poll'])
+        self.stdout.write(f"Worker {worker.name} running {options['concurrency']} job(s) at a time.")
+        try:
+            worker.run(burst=options['burst'], on_finish=self.report_job)
+        except KeyboardInterrupt:
+            worker.stop()
+        self.stdout.write(self.style.SUCCESS("Worker stopped."))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from network_traffic import classifier
+
+# Define a custom Django management command to train the attack classifier on the stored records.
+class Command(BaseCommand):
+    help = "Train the attack classifier on all stored NetworkTraffic records and save it as a new model version."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--epochs', type=int, default=5, help="Passes over the training records (default: 5)")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows read from the database at a time (default: 5000)")
+        parser.add_argument('--learning-rate', type=float, default=0.1, help="Initial SGD step size (default: 0.1)")
+        parser.add_argument('--output', default=None, help="Directory for the model artifact (default: IDS_MODEL_DIR)")
+
+    def handle(self, *args, **options):
+        if options['epochs'] < 1 or options['chunk_size'] < 1:
+            raise CommandError("--epochs and --chunk-size must be positive integers.")
+        try:
+            model = classifier.train(
+                epochs=options['epochs'], chunk_size=options['chunk_size'], learning_rate=options['learning_rate'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        path = model.save(options['output'] or settings.IDS_MODEL_DIR)
+        holdout = model.metadata['holdout']
+        self.stdout.write(f"Trained on {model.metadata['records']} records in {model.metadata['training_seconds']}s")
+        self.stdout.write(
+            f"Held-out records: {holdout['records']} "
+            f"(accuracy {holdout['accuracy']}, precision {holdout['precision']}, recall {holdout['recall']})"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Saved model version {model.version} to {path}"))
@@ -0,0 +1,286 @@
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+# Per-request performance metrics, aggregated per URL name and served in Prometheus text format.
+#
+# Every thread adds to its own `_Store`, so recording a request never takes a lock: the GIL makes
+# each single increment safe, and only one thread ever writes a given store. A scrape sums all the
+# stores. The measurements of the request being handled live in a context variable, which
+# `sync_to_async` carries into worker threads, so async views are measured too.
+
+# Upper bounds (seconds) of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+slow_request_logger = logging.getLogger('network_traffic.slow_requests')
+
+
+class _Route:
+    """
+    Running totals of one URL name in one thread.
+    """
+    __slots__ = ('requests', 'errors', 'buckets', 'seconds', 'queries', 'query_seconds', 'serialization_seconds', 'bytes', 'rows')
+
+    def __init__(self):
+        self.requests = self.errors = self.queries = self.bytes = self.rows = 0
+        self.seconds = self.query_seconds = self.serialization_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+
+class _Store(threading.local):
+    def __init__(self):
+        self.routes = {}
+        with _registry_lock:
+            _stores.append(self.routes)  # Registered once per thread; the lock is never taken again
+
+
+_stores = []
+_registry_lock = threading.Lock()
+_store = _Store()
+
+
+class RequestMetrics:
+    """
+    Measurements of the request being handled, filled in while it runs.
+    """
+    __slots__ = ('queries', 'query_seconds', 'serialization_seconds', 'rows', 'statements')
+
+    def __init__(self, capture_sql=False):
+        self.queries = self.rows = 0
+        self.query_seconds = self.serialization_seconds = 0.0
+        self.statements = [] if capture_sql else None  # (sql, seconds), kept for the slow request log
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper: count and time every query of the request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.query_seconds += elapsed
+            if self.statements is not None:
+                self.statements.append((sql, elapsed))
+
+
+current = ContextVar('network_traffic_request_metrics', default=None)
+
+
+def record_serialization(seconds, rows=0):
+    """
+    Add time spent encoding records (and the number of records) to the current request, if any.
+    """
+    metrics = current.get()
+    if metrics is not None:
+        metrics.serialization_seconds += seconds
+        metrics.rows += rows
+
+
+def _record(route, status_code, seconds, metrics, size):
+    routes = _store.routes
+    totals = routes.get(route)
+    if totals is None:
+        totals = routes[route] = _Route()
+    totals.requests += 1
+    totals.errors += status_code >= 500
+    totals.seconds += seconds
+    for index, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            totals.buckets[index] += 1
+            break
+    totals.queries += metrics.queries
+    totals.query_seconds += metrics.query_seconds
+    totals.serialization_seconds += metrics.serialization_seconds
+    totals.bytes += size
+    totals.rows += metrics.rows
+
+
+def _count_bytes(route, chunks):
+    # Pass a streamed body through, adding its size to the route once it has been sent
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        _add_bytes(route, size)
+
+
+async def _acount_bytes(route, chunks):
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        _add_bytes(route, size)
+
+
+def _add_bytes(route, size):
+    totals = _store.routes.get(route)
+    if totals is None:
+        totals = _store.routes[route] = _Route()
+    totals.bytes += size
+
+
+def snapshot():
+    """
+    Return the totals of every route, summed over all threads, as `{route: _Route}`.
+    """
+    merged = {}
+    for routes in list(_stores):
+        for route, totals in list(routes.items()):
+            target = merged.get(route)
+            if target is None:
+                target = merged[route] = _Route()
+            for name in _Route.__slots__:
+                if name == 'buckets':
+                    target.buckets = [a + b for a, b in zip(target.buckets, totals.buckets)]
+                else:
+                    setattr(target, name, getattr(target, name) + getattr(totals, name))
+    return merged
+
+
+def reset():
+    for routes in list(_stores):
+        routes.clear()
+
+
+def render_prometheus(routes=None):
+    """
+    Render the route totals in the Prometheus text exposition format.
+    """
+    routes = snapshot() if routes is None else routes
+    lines = [
+        '# HELP ids_request_duration_seconds Request latency by URL name.',
+        '# TYPE ids_request_duration_seconds histogram',
+    ]
+    for route, totals in sorted(routes.items()):
+        label = f'route="{route}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, totals.buckets):
+            cumulative += count
+            lines.append(f'ids_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'ids_request_duration_seconds_bucket{{{label},le="+Inf"}} {totals.requests}')
+        lines.append(f'ids_request_duration_seconds_sum{{{label}}} {totals.seconds:.6f}')
+        lines.append(f'ids_request_duration_seconds_count{{{label}}} {totals.requests}')
+
+    counters = (
+        ('ids_request_errors_total', 'Responses with a 5xx status by URL name.', 'errors', '{}'),
+        ('ids_db_queries_total', 'SQL queries run by URL name.', 'queries', '{}'),
+        ('ids_db_query_seconds_total', 'Time spent in SQL queries by URL name.', 'query_seconds', '{:.6f}'),
+        ('ids_serialization_seconds_total', 'Time spent encoding records and rendering responses by URL name.', 'serialization_seconds', '{:.6f}'),
+        ('ids_response_bytes_total', 'Response body bytes by URL name.', 'bytes', '{}'),
+        ('ids_rows_returned_total', 'Records encoded into responses by URL name.', 'rows', '{}'),
+    )
+    for metric, description, attribute, number in counters:
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} counter')
+        for route, totals in sorted(routes.items()):
+            lines.append(f'{metric}{{route="{route}"}} {number.format(getattr(totals, attribute))}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Serve the metrics of this worker process to a Prometheus scraper.
+    """
+    return HttpResponse(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def count_queries(metrics):
+    """
+    Return a context manager installing `metrics` as execute wrapper on every database alias, so
+    reads sent to the read-only alias (see sqlite.py) are counted too.
+    """
+    stack = ExitStack()
+    wrappers = {id(wrapper): wrapper for wrapper in connections.all()}  # Test mirrors may share one
+    for wrapper in wrappers.values():
+        stack.enter_context(wrapper.execute_wrapper(metrics))
+    return stack
+
+
+class MetricsMiddleware:
+    """
+    Time every request and record it under its URL name (see `render_prometheus`).
+
+    With `IDS_SLOW_REQUEST_SECONDS` set, requests slower than that are logged to the
+    `network_traffic.slow_requests` logger together with every SQL statement they ran.
+    Works under WSGI and ASGI without moving async views to a thread. Streamed bodies are
+    counted in bytes once sent, but their rows are encoded after the request and not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        slow_seconds = getattr(settings, 'IDS_SLOW_REQUEST_SECONDS', None)
+        metrics = RequestMetrics(capture_sql=slow_seconds is not None)
+        token = current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with count_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - started, slow_seconds)
+
+    async def __acall__(self, request):
+        slow_seconds = getattr(settings, 'IDS_SLOW_REQUEST_SECONDS', None)
+        metrics = RequestMetrics(capture_sql=slow_seconds is not None)
+        token = current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with count_queries(metrics):
+                response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - started, slow_seconds)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time the rendering as serialization
+        render = response.render
+
+        def timed_render():
+            started = time.perf_counter()
+            try:
+                return render()
+            finally:
+                record_serialization(time.perf_counter() - started)
+        response.render = timed_render
+        return response
+
+    def finish(self, request, response, metrics, seconds, slow_seconds=None):
+        match = request.resolver_match
+        route = (match.url_name or match.view_name) if match is not None else 'unmatched'
+        if response.streaming:
+            size = 0  # Counted as the body is sent
+            if response.is_async:
+                response.streaming_content = _acount_bytes(route, response.streaming_content)
+            else:
+                response.streaming_content = _count_bytes(route, response.streaming_content)
+        else:
+            size = len(response.content)
+        _record(route, response.status_code, seconds, metrics, size)
+
+        if slow_seconds is not None and seconds >= slow_seconds:
+            slow_request_logger.warning(
+                "Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms\n%s",
+                request.method, request.get_full_path(), route, seconds * 1000, metrics.queries, metrics.query_seconds * 1000,
+                '\n'.join(f'  {elapsed * 1000:.2f} ms  {sql}' for sql, elapsed in metrics.statements),
+            )
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:29
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_traffic', '0002_alter_networktraffic_duration'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['service'], name='nt_service_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(django.db.models.functions.text.Lower('service'), name='nt_service_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(django.db.models.functions.text.Lower('protocol_type'), django.db.models.functions.text.Lower('flag'), name='nt_protocol_flag_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(django.db.models.functions.text.Lower('flag'), name='nt_flag_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['src_bytes'], name='nt_src_bytes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['dst_bytes'], name='nt_dst_bytes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['serror_rate'], name='nt_serror_rate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(condition=models.Q(('attack', True)), fields=['id'], name='nt_attack_rows_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(condition=models.Q(('attack', False)), fields=['id'], name='nt_normal_rows_idx'),
+        ),
+    ]
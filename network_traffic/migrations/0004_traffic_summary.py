@@ -0,0 +1,32 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_traffic', '0003_traffic_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrafficSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(max_length=50)),
+                ('protocol_type', models.CharField(max_length=20)),
+                ('flag', models.CharField(max_length=10)),
+                ('records', models.BigIntegerField(default=0)),
+                ('attacks', models.BigIntegerField(default=0)),
+                ('src_bytes_total', models.BigIntegerField(default=0)),
+                ('dst_bytes_total', models.BigIntegerField(default=0)),
+                ('src_bytes_histogram', models.JSONField(default=dict)),
+                ('dst_bytes_histogram', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='trafficsummary',
+            constraint=models.UniqueConstraint(fields=('service', 'protocol_type', 'flag'), name='traffic_summary_group_unique'),
+        ),
+    ]
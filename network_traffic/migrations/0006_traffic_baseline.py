@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_traffic', '0005_dataset_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrafficBaseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(max_length=50)),
+                ('protocol_type', models.CharField(max_length=20)),
+                ('samples', models.BigIntegerField(default=0)),
+                ('mean', models.JSONField(default=list)),
+                ('m2', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='trafficbaseline',
+            constraint=models.UniqueConstraint(fields=('service', 'protocol_type'), name='traffic_baseline_group_unique'),
+        ),
+    ]
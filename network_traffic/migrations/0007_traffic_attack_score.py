@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_traffic', '0006_traffic_baseline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='networktraffic',
+            name='attack_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_traffic', '0007_traffic_attack_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetversion',
+            name='rewrites',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_traffic', '0008_dataset_rewrites'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='networktraffic',
+            name='observed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['observed_at'], name='nt_observed_at_idx'),
+        ),
+    ]
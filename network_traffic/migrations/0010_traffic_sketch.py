@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_traffic', '0009_traffic_observed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrafficSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('kind', models.CharField(max_length=20)),
+                ('parameters', models.JSONField(default=dict)),
+                ('total', models.BigIntegerField(default=0)),
+                ('candidates', models.JSONField(default=dict)),
+                ('data', models.BinaryField()),
+                ('updated_at', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.16 on 2026-10-18 10:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_traffic', '0010_traffic_sketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('expression', models.TextField()),
+                ('description', models.TextField(blank=True, default='')),
+                ('enabled', models.BooleanField(default=True)),
+                ('hits', models.BigIntegerField(default=0)),
+                ('evaluated', models.BigIntegerField(default=0)),
+                ('evaluation_seconds', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RuleMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('matched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='network_traffic.detectionrule')),
+                ('traffic', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='rule_matches', to='network_traffic.networktraffic')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['traffic'], name='nt_rule_match_traffic_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='rulematch',
+            constraint=models.UniqueConstraint(fields=('rule', 'traffic'), name='nt_rule_match_unique'),
+        ),
+    ]
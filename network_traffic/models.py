@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 class NetworkTraffic(models.Model):
     duration = models.IntegerField(null=False, blank=True)
@@ -25,6 +28,175 @@ class NetworkTraffic(models.Model):
     dst_host_same_srv_rate = models.FloatField()
     dst_host_diff_srv_rate = models.FloatField()
     attack = models.BooleanField()  # True for 'Yes', False for 'No'
+    attack_score = models.FloatField(null=True, blank=True)  # Classifier probability of an attack, if scored on ingest
+    observed_at = models.DateTimeField(default=timezone.now)  # When the session was observed; ingest time unless the source gives one
+
+    class Meta:
+        indexes = [
+            # Exact service lookups (NetworkTrafficFilterByServiceView)
+            models.Index(fields=['service'], name='nt_service_idx'),
+            # Case-insensitive equality on categorical fields (NetworkTrafficComplexFiltersView)
+            models.Index(Lower('service'), name='nt_service_ci_idx'),
+            models.Index(Lower('protocol_type'), Lower('flag'), name='nt_protocol_flag_ci_idx'),
+            models.Index(Lower('flag'), name='nt_flag_ci_idx'),
+            # Byte and error-rate ranges (AnomalousTrafficView, NetworkTrafficComplexFiltersView)
+            models.Index(fields=['src_bytes'], name='nt_src_bytes_idx'),
+            models.Index(fields=['dst_bytes'], name='nt_dst_bytes_idx'),
+            models.Index(fields=['serror_rate'], name='nt_serror_rate_idx'),
+            # Time-range filters (`?since=`, `?until=`, `?last=`) and retention purges
+            models.Index(fields=['observed_at'], name='nt_observed_at_idx'),
+            # Partial indexes keep each attack value in primary key order for keyset pages
+            # (NetworkTrafficFilterByAttackView); skipped on backends without partial indexes
+            models.Index(fields=['id'], condition=Q(attack=True), name='nt_attack_rows_idx'),
+            models.Index(fields=['id'], condition=Q(attack=False), name='nt_normal_rows_idx'),
+        ]
 
     def __str__(self):
         return f"{self.protocol_type} - {self.service} - Attack: {self.attack}"
+
+
+class TrafficSummary(models.Model):
+    """
+    Running totals of NetworkTraffic per (service, protocol_type, flag), kept up to date by every
+    write path so traffic statistics never have to scan the raw table.
+    """
+    service = models.CharField(max_length=50)
+    protocol_type = models.CharField(max_length=20)
+    flag = models.CharField(max_length=10)
+    records = models.BigIntegerField(default=0)
+    attacks = models.BigIntegerField(default=0)
+    src_bytes_total = models.BigIntegerField(default=0)
+    dst_bytes_total = models.BigIntegerField(default=0)
+    # Log-scale bucket -> row count, used for approximate byte percentiles
+    src_bytes_histogram = models.JSONField(default=dict)
+    dst_bytes_histogram = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'protocol_type', 'flag'], name='traffic_summary_group_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.protocol_type} - {self.service} - {self.flag}: {self.records} records"
+
+
+class DatasetVersion(models.Model):
+    """
+    Single-row counter bumped on every write to NetworkTraffic. Cached responses are keyed on it,
+    so a write invalidates every cached read at once.
+    """
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(null=True)
+    # Bumped only when existing rows are updated or deleted; inserts leave it unchanged, which lets
+    # derived copies of the table (see columnar.py) append new rows instead of reloading.
+    rewrites = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Dataset version {self.version}"
+
+
+class TrafficBaseline(models.Model):
+    """
+    Running count, mean and sum of squared deviations of the scored numeric features for one
+    (service, protocol_type) pair, merged batch by batch as records are written.
+    """
+    service = models.CharField(max_length=50)
+    protocol_type = models.CharField(max_length=20)
+    samples = models.BigIntegerField(default=0)
+    # One value per feature, in the order of network_traffic.anomaly.FEATURES
+    mean = models.JSONField(default=list)
+    m2 = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'protocol_type'], name='traffic_baseline_group_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.protocol_type} - {self.service}: {self.samples} samples"
+
+
+class TrafficSketch(models.Model):
+    """
+    One probabilistic sketch over every ingested record (see network_traffic/sketches.py), stored
+    as fixed-size arrays so reading it costs the same at any table size.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    kind = models.CharField(max_length=20)  # 'count-min' or 'hyperloglog'
+    parameters = models.JSONField(default=dict)  # Dimensions, e.g. {"width": ..., "depth": ...}
+    total = models.BigIntegerField(default=0)  # Records counted into the sketch
+    candidates = models.JSONField(default=dict)  # Heavy-hitter candidates and their estimates (count-min only)
+    data = models.BinaryField()  # The counters or registers
+    updated_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.kind} sketch {self.name}: {self.total} records"
+
+
+class DetectionRule(models.Model):
+    """
+    A standing condition over NetworkTraffic fields (see network_traffic/rules.py), evaluated
+    against every batch of records as it is written.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    expression = models.TextField()  # e.g. "flag == 'S0' and count > 100"
+    description = models.TextField(blank=True, default='')
+    enabled = models.BooleanField(default=True)
+    hits = models.BigIntegerField(default=0)  # Records matched since the rule was created
+    evaluated = models.BigIntegerField(default=0)  # Records evaluated since the rule was created
+    evaluation_seconds = models.FloatField(default=0.0)  # Time spent evaluating the rule
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.expression}"
+
+
+class RuleMatch(models.Model):
+    """
+    A record that matched a detection rule when it was written.
+    """
+    rule = models.ForeignKey(DetectionRule, on_delete=models.CASCADE, related_name='matches')
+    # Removed by the delete hooks in ingest.py together with the record. Without a cascade,
+    # deleting records stays a single DELETE instead of Django collecting them first.
+    traffic = models.ForeignKey(NetworkTraffic, on_delete=models.DO_NOTHING, db_constraint=False, related_name='rule_matches')
+    matched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['rule', 'traffic'], name='nt_rule_match_unique')]
+        # The unique constraint's index serves a rule's matches; this one the deletes by record
+        indexes = [models.Index(fields=['traffic'], name='nt_rule_match_traffic_idx')]
+
+    def __str__(self):
+        return f"{self.rule.name} matched {self.traffic_id}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work (see network_traffic/jobs.py). The table doubles as the queue:
+    `run_jobs` workers claim queued rows, run them and record progress and the outcome.
+    """
+    QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed'), (CANCELLED, 'Cancelled')]
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+    kind = models.CharField(max_length=30)  # A key of jobs.JOB_KINDS, e.g. 'ingest'
+    parameters = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    done = models.BigIntegerField(default=0)  # Units of work finished so far (rows, batches or steps)
+    total = models.BigIntegerField(null=True)  # Units of work in all, when known
+    result = models.JSONField(null=True)
+    error = models.TextField(blank=True, default='')
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=100, blank=True, default='')  # The worker thread that claimed the job
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    heartbeat_at = models.DateTimeField(null=True)  # Last progress report of a running job
+
+    class Meta:
+        # Workers look for the oldest queued job of a kind below its concurrency limit
+        indexes = [models.Index(fields=['status', 'id'], name='nt_job_status_idx')]
+
+    def __str__(self):
+        return f"{self.kind} job {self.pk}: {self.status}"
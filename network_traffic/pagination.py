@@ -0,0 +1,185 @@
+import base64
+import json
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination ordered by primary key.
+
+    Every page is fetched with `WHERE id > cursor ORDER BY id LIMIT n` (or the mirror image when
+    walking backwards), so a deep page costs the same as the first one. There is no OFFSET and no
+    COUNT(*) involved.
+    """
+    page_size = api_settings.PAGE_SIZE or 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    scan_chunk_size = 2000  # Rows read per query by `paginate_filtered`
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.page_query(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async version of `paginate_queryset`, for views running on the event loop.
+        """
+        return self.finish_page([row async for row in self.page_query(queryset, request)])
+
+    def page_query(self, queryset, request):
+        """
+        Read the cursor from the request and return the query for one more row than a page.
+        """
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        after, before = self.after, self.before = self.decode_cursor(request)
+        if before is not None:
+            # Walk backwards from the cursor; `finish_page` restores ascending order
+            return queryset.filter(pk__lt=before).order_by('-pk')[:self.page_size + 1]
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        return queryset.order_by('pk')[:self.page_size + 1]
+
+    def finish_page(self, rows):
+        """
+        Trim the rows read by `page_query` to one page and record which links it has.
+        """
+        if self.before is not None:
+            self.has_previous = len(rows) > self.page_size
+            self.has_next = True
+            rows = rows[:self.page_size][::-1]
+        else:
+            self.has_next = len(rows) > self.page_size
+            self.has_previous = self.after is not None
+            rows = rows[:self.page_size]
+
+        self.page = rows
+        return rows
+
+    def paginate_filtered(self, queryset, request, keep, view=None):
+        """
+        Paginate rows selected by a filter that can only be evaluated in Python.
+
+        `queryset` must yield tuples starting with the primary key. It is read in key order,
+        `scan_chunk_size` rows per query, and `keep(rows)` returns the items of each chunk to keep
+        (also starting with the primary key) until one more than a page has been kept.
+        """
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        after, before = self.after, self.before = self.decode_cursor(request)
+        reverse = before is not None
+
+        kept = []
+        position = before if reverse else after
+        while len(kept) <= self.page_size:
+            chunk = queryset
+            if position is not None:
+                chunk = chunk.filter(pk__lt=position) if reverse else chunk.filter(pk__gt=position)
+            rows = list(chunk.order_by('-pk' if reverse else 'pk')[:self.scan_chunk_size])
+            if not rows:
+                break
+            kept.extend(keep(rows))
+            position = rows[-1][0]
+            if len(rows) < self.scan_chunk_size:
+                break
+
+        return self.finish_page(kept)
+
+    def paginate_ids(self, ids, queryset, request, view=None):
+        """
+        Paginate rows whose primary keys were already selected, e.g. by the columnar engine.
+
+        `ids` is a sorted array of the matching primary keys. The cursor is located in it with a
+        binary search and only the rows of the page are read from `queryset`.
+        """
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        after, before = self.after, self.before = self.decode_cursor(request)
+        if before is not None:
+            end = ids.searchsorted(before, side='left')
+            selected, order = ids[max(end - self.page_size - 1, 0):end], '-pk'
+        else:
+            start = 0 if after is None else ids.searchsorted(after, side='right')
+            selected, order = ids[start:start + self.page_size + 1], 'pk'
+        return self.finish_page(list(queryset.filter(pk__in=selected.tolist()).order_by(order)))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_key(self, row):
+        """
+        Return the primary key of a row on the current page.
+        """
+        if isinstance(row, tuple):
+            return row[0]  # values_list() rows always start with the primary key
+        return row.pk
+
+    def decode_cursor(self, request):
+        """
+        Return the `(after, before)` primary key bounds carried by the request cursor.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            key = int(position['k'])
+            reverse = bool(position.get('r', False))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return (None, key) if reverse else (key, None)
+
+    def encode_cursor(self, key, reverse=False):
+        position = {'k': key}
+        if reverse:
+            position['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # An empty backwards page: everything from the cursor onwards is still ahead
+            return self.encode_cursor(self.before - 1)
+        return self.encode_cursor(self.get_key(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Walked past the last row: step back to the rows up to and including the cursor
+            return self.encode_cursor(self.after + 1, reverse=True)
+        return self.encode_cursor(self.get_key(self.page[0]), reverse=True)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,57 @@
+import json
+import msgpack
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from .renderers import COLUMNS_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parse newline-delimited JSON (one object per line) into a list.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        records = []
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line.decode(encoding)))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {number} - {exc}')
+        return records
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parse a MessagePack body, e.g. a record for /api/traffic/create/ or an array for /api/traffic/batch/.
+    """
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
+
+
+class ColumnarJSONParser(JSONParser):
+    """
+    Parse a columnar JSON body (`{field: [values]}`, see renderers.py) into a list of records,
+    e.g. for /api/traffic/batch/. Every column must hold the same number of values.
+    """
+    media_type = COLUMNS_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        columns = super().parse(stream, media_type, parser_context)
+        if not isinstance(columns, dict) or not all(isinstance(values, list) for values in columns.values()):
+            raise ParseError('Columnar JSON must be an object of arrays, one per field.')
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ParseError('Every column must hold the same number of values.')
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
@@ -0,0 +1,72 @@
+import msgpack
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# Alternative response bodies, chosen by the `Accept` header (or `?format=`) on every DRF view:
+#
+#     Accept: application/msgpack                   -> MessagePack, same structure as the JSON
+#     Accept: application/vnd.ids.columns+json      -> JSON with lists of records turned into columns
+#
+# Lists of records repeat every key name once per record; the columnar layout writes each name
+# once, followed by that column's values, which is what makes it smaller and faster to parse.
+# parsers.py accepts both formats as request bodies.
+
+COLUMNS_MEDIA_TYPE = 'application/vnd.ids.columns+json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+_json_default = JSONEncoder().default
+
+
+def _default(value):
+    # Values MessagePack cannot pack (dates, decimals, UUIDs, lazy strings) are converted as the JSON renderer does
+    return _json_default(value)
+
+
+def is_records(value):
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def to_columns(records):
+    """
+    Turn a list of record dicts into `{field: [value per record]}`, fields in first-seen order.
+    """
+    names = dict.fromkeys(name for record in records for name in record)
+    return {name: [record.get(name) for record in records] for name in names}
+
+
+def columnar(data):
+    """
+    Lay out the records of a response as columns: a bare list of records, or the `results` of a page.
+    Anything else (single records, counts, errors) is returned unchanged.
+    """
+    if is_records(data):
+        return to_columns(data)
+    if isinstance(data, dict) and is_records(data.get('results')):
+        return {**data, 'results': to_columns(data['results'])}
+    return data
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Render the response data as MessagePack.
+    """
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True, default=_default)
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Render lists of records as one JSON array per field (see `columnar`).
+    """
+    media_type = COLUMNS_MEDIA_TYPE
+    format = 'columns'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(columnar(data), accepted_media_type, renderer_context)
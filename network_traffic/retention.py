@@ -0,0 +1,54 @@
+import re
+import time
+from datetime import timedelta
+from .batch import delete_batch
+from .models import NetworkTraffic
+
+# Records deleted per transaction by `purge`. Small batches keep each write lock short, so
+# readers and the ingest paths are only held up for one batch at a time.
+DEFAULT_BATCH_SIZE = 1000
+
+# Units accepted by `parse_duration`, in seconds.
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+_DURATION = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$')
+
+
+def parse_duration(value):
+    """
+    Parse a duration such as `90`, `90s`, `5m`, `2h`, `30d` or `1w` (a bare number is seconds).
+    """
+    match = _DURATION.match(value or '')
+    if match is None:
+        raise ValueError(f"Invalid duration '{value}'. Use a number followed by s, m, h, d or w (e.g. 5m).")
+    return timedelta(seconds=float(match.group(1)) * DURATION_UNITS[match.group(2) or 's'])
+
+
+def purge(queryset, batch_size=DEFAULT_BATCH_SIZE, pause=0.0, progress=None):
+    """
+    Delete every record of `queryset` in batches of `batch_size`, oldest observation first.
+
+    Each batch is deleted in its own transaction through `batch.delete_batch`, so the traffic
+    summary, the baselines and the dataset version stay in step with the table. `pause` seconds
+    are slept between batches to leave room for other writers. `progress`, if given, is called
+    after every batch with the running total. Returns the number of records deleted.
+    """
+    total = 0
+    while True:
+        # The observed_at index returns the oldest rows first without sorting the table
+        ids = list(queryset.order_by('observed_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += delete_batch(ids)['deleted']
+        if progress is not None:
+            progress(total)
+        if len(ids) < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
+def older_than(cutoff):
+    """
+    Return the records observed strictly before `cutoff`.
+    """
+    return NetworkTraffic.objects.filter(observed_at__lt=cutoff)
@@ -0,0 +1,291 @@
+import ast
+import math
+import time
+from functools import lru_cache
+import numpy as np
+from django.db.models import Case, F, When
+from .models import DetectionRule, NetworkTraffic, RuleMatch
+
+# Standing detection rules, evaluated against every batch of records as it is written.
+#
+# A rule is a boolean expression over NetworkTraffic fields in a small subset of Python syntax:
+#
+#     flag == 'S0' and count > 100
+#     service in ('telnet', 'ftp') and src_bytes / (dst_bytes + 1) > 50
+#     attack_score >= 0.9 or not logged_in and num_compromised > 0
+#
+# Field names, numbers, strings, True/False, arithmetic (+ - * / %), comparisons (including
+# chains and `in` / `not in` a literal tuple or list) and `and` / `or` / `not` are allowed;
+# anything else (calls, attributes, subscripts, unknown names) is rejected before it runs.
+# Compiling turns the expression into nested closures over NumPy arrays, so a rule evaluates a
+# whole batch with a handful of vectorized operations. Compiled rules are cached by expression
+# text: editing a rule's expression compiles it again, and nothing else does.
+
+# Upper bounds that keep a rule cheap to compile and to evaluate.
+MAX_EXPRESSION_LENGTH = 1000
+MAX_EXPRESSION_NODES = 200
+
+# Primary keys per `IN (...)` clause when deleting matches, as in batch.py.
+ID_CHUNK_SIZE = 900
+
+# Fields a rule can refer to, by kind. observed_at is left out: rules describe connections, not times.
+TEXT_FIELDS = ('protocol_type', 'service', 'flag')
+BOOLEAN_FIELDS = tuple(
+    field.name for field in NetworkTraffic._meta.concrete_fields if field.get_internal_type() == 'BooleanField'
+)
+NUMBER_FIELDS = tuple(
+    field.name for field in NetworkTraffic._meta.concrete_fields
+    if not field.primary_key and field.name not in TEXT_FIELDS + BOOLEAN_FIELDS + ('observed_at',)
+)
+RULE_FIELDS = {
+    **{name: 'text' for name in TEXT_FIELDS},
+    **{name: 'bool' for name in BOOLEAN_FIELDS},
+    **{name: 'number' for name in NUMBER_FIELDS},
+}
+
+_COMPARISONS = {
+    ast.Eq: np.equal, ast.NotEq: np.not_equal, ast.Lt: np.less,
+    ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide, ast.Mod: np.mod}
+
+
+class RuleError(ValueError):
+    """
+    A rule expression that cannot be compiled.
+    """
+
+
+class CompiledRule:
+    """
+    A rule expression compiled into a vectorized predicate.
+
+    `predicate(columns)` takes `{field: array}` holding at least `fields` and returns the boolean
+    mask of the rows the rule matches.
+    """
+    def __init__(self, expression, predicate, fields):
+        self.expression = expression
+        self.predicate = predicate
+        self.fields = fields
+
+    def __call__(self, columns, size):
+        with np.errstate(divide='ignore', invalid='ignore'):  # x / 0 is inf or NaN and compares False
+            mask = self.predicate(columns)
+        return np.broadcast_to(np.asarray(mask, dtype=bool), (size,))  # Constant expressions give a scalar
+
+
+def _field(name):
+    return lambda columns: columns[name]
+
+
+def _constant(value):
+    return lambda columns: value
+
+
+class _Compiler:
+    def __init__(self):
+        self.fields = set()
+
+    def compile(self, node):
+        """
+        Return `(function, kind)` for an expression node, `kind` being 'number', 'text' or 'bool'.
+        """
+        method = getattr(self, f'visit_{type(node).__name__}', None)
+        if method is None:
+            raise RuleError(f"Unsupported syntax: {type(node).__name__}.")
+        return method(node)
+
+    def visit_Expression(self, node):
+        function, kind = self.compile(node.body)
+        if kind != 'bool':
+            raise RuleError("A rule must be a condition, such as `count > 100`.")
+        return function, kind
+
+    def visit_Name(self, node):
+        if node.id not in RULE_FIELDS:
+            raise RuleError(f"Unknown field '{node.id}'. Use one of: {', '.join(RULE_FIELDS)}.")
+        self.fields.add(node.id)
+        return _field(node.id), RULE_FIELDS[node.id]
+
+    def visit_Constant(self, node):
+        value = node.value
+        if isinstance(value, bool):
+            return _constant(value), 'bool'
+        if isinstance(value, (int, float)):
+            return _constant(self.number(value)), 'number'
+        if isinstance(value, str):
+            return _constant(value), 'text'
+        raise RuleError(f"Unsupported constant {value!r}.")
+
+    def visit_BoolOp(self, node):
+        operands = [self.operand(value, 'bool') for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+        def function(columns):
+            result = operands[0](columns)
+            for operand in operands[1:]:
+                result = combine(result, operand(columns))
+            return result
+        return function, 'bool'
+
+    def visit_UnaryOp(self, node):
+        if isinstance(node.op, ast.Not):
+            operand = self.operand(node.operand, 'bool')
+            return (lambda columns: np.logical_not(operand(columns))), 'bool'
+        if isinstance(node.op, ast.USub):
+            operand = self.operand(node.operand, 'number')
+            return (lambda columns: np.negative(operand(columns))), 'number'
+        raise RuleError(f"Unsupported operator {type(node.op).__name__}.")
+
+    def visit_BinOp(self, node):
+        operation = _ARITHMETIC.get(type(node.op))
+        if operation is None:
+            raise RuleError(f"Unsupported operator {type(node.op).__name__}.")
+        left, right = self.operand(node.left, 'number'), self.operand(node.right, 'number')
+        return (lambda columns: operation(left(columns), right(columns))), 'number'
+
+    def visit_Compare(self, node):
+        # `a < b < c` is `a < b and b < c`, as in Python
+        parts, left = [], node.left
+        for op, right in zip(node.ops, node.comparators):
+            parts.append(self.comparison(left, op, right))
+            left = right
+
+        def function(columns):
+            result = parts[0](columns)
+            for part in parts[1:]:
+                result = np.logical_and(result, part(columns))
+            return result
+        return function, 'bool'
+
+    def comparison(self, left, op, right):
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(right, (ast.Tuple, ast.List, ast.Set)):
+                raise RuleError("`in` needs a literal list of values, such as `service in ('ftp', 'telnet')`.")
+            function, kind = self.compile(left)
+            values = [self.literal(element, kind) for element in right.elts]
+            invert = isinstance(op, ast.NotIn)
+            return lambda columns: np.isin(function(columns), values, invert=invert)
+        operation = _COMPARISONS.get(type(op))
+        if operation is None:
+            raise RuleError(f"Unsupported comparison {type(op).__name__}.")
+        (left_function, left_kind), (right_function, right_kind) = self.compile(left), self.compile(right)
+        if left_kind != right_kind:
+            raise RuleError(f"Cannot compare {left_kind} with {right_kind}.")
+        if left_kind == 'text' and operation not in (np.equal, np.not_equal):
+            raise RuleError("Text fields can only be compared with ==, !=, in and not in.")
+        return lambda columns: operation(left_function(columns), right_function(columns))
+
+    def operand(self, node, kind):
+        function, actual = self.compile(node)
+        if actual != kind:
+            raise RuleError(f"Expected a {kind} expression, got {actual}.")
+        return function
+
+    def literal(self, node, kind):
+        if not isinstance(node, ast.Constant) or self.compile(node)[1] != kind:
+            raise RuleError(f"Every value after `in` must be a {kind} literal.")
+        return self.number(node.value) if kind == 'number' else node.value
+
+    def number(self, value):
+        # Fields are compared as float64: a constant outside its range would only fail once evaluated
+        try:
+            number = float(value)
+        except OverflowError:
+            number = math.inf
+        if not math.isfinite(number):
+            raise RuleError("Numbers must be finite and fit in a 64-bit float.")
+        return number
+
+
+@lru_cache(maxsize=256)
+def compile_rule(expression):
+    """
+    Compile a rule expression, raising RuleError if it is invalid. Cached by expression text.
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise RuleError(f"Rule expressions are limited to {MAX_EXPRESSION_LENGTH} characters.")
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as exc:
+        raise RuleError(f"Invalid syntax: {exc.msg}.")
+    if sum(1 for _ in ast.walk(tree)) > MAX_EXPRESSION_NODES:
+        raise RuleError(f"Rule expressions are limited to {MAX_EXPRESSION_NODES} terms.")
+    compiler = _Compiler()
+    predicate, _ = compiler.compile(tree)
+    return CompiledRule(expression, predicate, frozenset(compiler.fields))
+
+
+def dry_run(rule):
+    """
+    Evaluate a compiled rule over one row of placeholder values, so rules that cannot run are
+    rejected when they are saved rather than inside every write transaction.
+    """
+    placeholders = {'text': np.array([''], dtype=object), 'bool': np.array([False]), 'number': np.array([0.0])}
+    rule({name: placeholders[RULE_FIELDS[name]] for name in rule.fields}, 1)
+
+
+def _column(records, name):
+    # One field of every record as an array: text stays object, NULL scores become NaN
+    values = [getattr(record, name) for record in records]
+    kind = RULE_FIELDS[name]
+    if kind == 'text':
+        return np.array(values, dtype=object)
+    if kind == 'bool':
+        return np.array(values, dtype=bool)
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def match(rules, records):
+    """
+    Run `{key: CompiledRule}` over saved NetworkTraffic instances without touching the database.
+
+    Each field the rules need is turned into an array once, and each rule runs over the whole
+    batch at once. Returns `({key: array of matched ids}, {key: seconds spent evaluating})`.
+    """
+    columns = {name: _column(records, name) for name in set().union(*(rule.fields for rule in rules.values()))}
+    ids = np.array([record.pk for record in records], dtype=np.int64)
+    matched, seconds = {}, {}
+    for key, rule in rules.items():
+        started = time.perf_counter()
+        matched[key] = ids[rule(columns, len(ids))]
+        seconds[key] = time.perf_counter() - started
+    return matched, seconds
+
+
+def evaluate(records):
+    """
+    Run every enabled rule against saved NetworkTraffic instances and record their matches.
+
+    Hit counts and evaluation times are added to the rules in one UPDATE, so the queries per
+    batch do not grow with the number of rules. Returns `{rule id: number of matches}`.
+    """
+    records = list(records)
+    if not records:
+        return {}
+    rules = {
+        pk: compile_rule(expression)
+        for pk, expression in DetectionRule.objects.filter(enabled=True).order_by('pk').values_list('pk', 'expression')
+    }
+    if not rules:
+        return {}
+    matched, seconds = match(rules, records)
+    RuleMatch.objects.bulk_create([
+        RuleMatch(rule_id=pk, traffic_id=traffic_id) for pk, ids in matched.items() for traffic_id in ids.tolist()
+    ])
+    hits = {pk: len(ids) for pk, ids in matched.items()}
+    DetectionRule.objects.filter(pk__in=hits).update(
+        hits=F('hits') + Case(*(When(pk=pk, then=count) for pk, count in hits.items()), default=0),
+        evaluated=F('evaluated') + len(records),
+        evaluation_seconds=F('evaluation_seconds') + Case(*(When(pk=pk, then=value) for pk, value in seconds.items()), default=0.0),
+    )
+    return hits
+
+
+def forget(records):
+    """
+    Delete the matches of records that are being deleted or rewritten.
+    """
+    ids = [record.pk for record in records]
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        RuleMatch.objects.filter(traffic_id__in=ids[start:start + ID_CHUNK_SIZE]).delete()
@@ -1,5 +1,9 @@
+import time
+from django.db import models
 from rest_framework import serializers
-from .models import NetworkTraffic
+from .metrics import record_serialization
+from .models import DetectionRule, Job, NetworkTraffic
+from .rules import RuleError, compile_rule, dry_run
 
 class NetworkTrafficSerializer(serializers.ModelSerializer):
     def to_internal_value(self, data):
@@ -36,6 +40,127 @@ class NetworkTrafficSerializer(serializers.ModelSerializer):
     class Meta:
         model = NetworkTraffic
         fields = '__all__'
+        read_only_fields = ['attack_score']  # Set by the classifier on ingest, never by clients
+        # Reject negative counts during validation instead of failing on the database CHECK constraint
+        extra_kwargs = {
+            field.name: {'min_value': 0}
+            for field in NetworkTraffic._meta.concrete_fields
+            if isinstance(field, models.PositiveIntegerField)
+        }
+
+
+class NetworkTrafficFastSerializer:
+    """
+    Read-only serializer that encodes `values_list()` tuples straight into dicts.
+
+    Produces exactly the same output as `NetworkTrafficSerializer` (including the `yes` / `no`
+    mapping of `attack`) without instantiating models or running a DRF field per value. The
+    row encoder is built once per instance from the field list of `NetworkTrafficSerializer`.
+
+    `fields` narrows it to a subset of those fields, both in the query and in the output; `id`
+    is always kept because keyset pages are keyed on it. Unknown names raise ValueError.
+    """
+    # DRF fields whose `to_representation` is a no-op for values already converted by the ORM
+    passthrough_fields = (
+        serializers.BooleanField,
+        serializers.CharField,
+        serializers.FloatField,
+        serializers.IntegerField,
+    )
+
+    def __init__(self, fields=None):
+        declared = NetworkTrafficSerializer().fields
+        if fields is not None:
+            unknown = [name for name in fields if name not in declared]
+            if unknown:
+                raise ValueError(f"Invalid fields: {', '.join(unknown)}. Use any of: {', '.join(declared)}.")
+            declared = {name: field for name, field in declared.items() if name == 'id' or name in fields}
+        self.field_names = list(declared)
+        self.encode = self._compile(declared)
+
+    def _compile(self, declared):
+        names = tuple(self.field_names)
+        converters = []
+        for name in names:
+            field = declared[name]
+            if name == 'attack':
+                converters.append((name, _yes_no))
+            elif not isinstance(field, self.passthrough_fields):
+                converters.append((name, field.to_representation))
+
+        if not converters:
+            return lambda row: dict(zip(names, row))
+
+        converters = tuple(converters)
+
+        def encode(row):
+            record = dict(zip(names, row))
+            for name, convert in converters:
+                value = record[name]
+                if value is not None:
+                    record[name] = convert(value)
+            return record
+        return encode
+
+    def rows(self, queryset):
+        """
+        Narrow a NetworkTraffic queryset to plain tuples in serializer field order.
+        """
+        return queryset.values_list(*self.field_names)
+
+    def encode_many(self, rows):
+        started = time.perf_counter()
+        encode = self.encode
+        records = [encode(row) for row in rows]
+        record_serialization(time.perf_counter() - started, len(records))  # Counted by the metrics middleware
+        return records
+
+
+def _yes_no(value):
+    return "yes" if value else "no"
+
+
+class DetectionRuleSerializer(serializers.ModelSerializer):
+    """
+    Detection rules with their running statistics. The expression is compiled on validation,
+    so a rule that would fail to evaluate is never saved.
+    """
+    evaluation_us_per_record = serializers.SerializerMethodField()
+
+    def validate_expression(self, value):
+        try:
+            rule = compile_rule(value)
+        except RuleError as exc:
+            raise serializers.ValidationError(str(exc))
+        try:
+            dry_run(rule)
+        except (ArithmeticError, TypeError, ValueError) as exc:
+            raise serializers.ValidationError(f"Rule cannot be evaluated: {exc}")
+        return value
+
+    def get_evaluation_us_per_record(self, rule):
+        return round(rule.evaluation_seconds / rule.evaluated * 1e6, 3) if rule.evaluated else None
+
+    class Meta:
+        model = DetectionRule
+        fields = '__all__'
+        read_only_fields = ['hits', 'evaluated', 'evaluation_seconds', 'created_at', 'updated_at']
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Background jobs with their progress. Jobs are submitted through jobs.submit, never saved from here.
+    """
+    percent = serializers.SerializerMethodField()
+
+    def get_percent(self, job):
+        if job.status == Job.SUCCEEDED:
+            return 100.0
+        return round(100 * job.done / job.total, 1) if job.total else None
+
+    class Meta:
+        model = Job
+        fields = '__all__'
 
 
 
@@ -0,0 +1,434 @@
+import atexit
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from functools import lru_cache, partial
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import NetworkTraffic, TrafficSketch
+
+# Probabilistic summaries of everything ingested, answering "which services are attacked most"
+# and "how many distinct (protocol, service, flag) tuples are there" without a GROUP BY.
+#
+# Count-min sketch: `depth` rows of `width` counters. A key adds its count to one counter per row
+# and is estimated by the smallest of them, so an estimate never falls below the true count and,
+# with probability at least 1 - CMS_DELTA, exceeds it by at most CMS_EPSILON * total. Counts can
+# be removed again, so deletes and updates are applied exactly like inserts.
+#
+# HyperLogLog: 2 ** HLL_PRECISION one-byte registers holding the longest run of leading zero bits
+# seen among the hashes routed to them. The distinct-count estimate has a relative standard error
+# of 1.04 / sqrt(2 ** HLL_PRECISION). Registers only grow, so it counts every tuple ever ingested,
+# including ones whose records were deleted since.
+#
+# Both kinds merge exactly (counters add, registers take the maximum), so every process collects
+# its committed writes in a pending sketch and merges it into the stored one every
+# IDS_SKETCH_FLUSH_RECORDS records or IDS_SKETCH_FLUSH_SECONDS seconds. A background thread
+# saves what an idle process still holds, and the last changes are saved when the process exits
+# (both can be turned off with IDS_SKETCH_BACKGROUND_FLUSH). Saves that run after a write has
+# committed never fail it: an error is logged and the changes stay pending for the next save.
+
+CMS_EPSILON = 0.001
+CMS_DELTA = 0.01
+CMS_WIDTH = math.ceil(math.e / CMS_EPSILON)
+CMS_DEPTH = math.ceil(math.log(1 / CMS_DELTA))
+
+# Heavy-hitter candidates kept per count-min sketch: the most frequent keys seen so far.
+HEAVY_HITTER_CAPACITY = 64
+
+HLL_PRECISION = 12
+
+# Count-min sketches by name: the key each record is counted under, or None to skip the record.
+FREQUENCY_SKETCHES = {
+    'attack_services': lambda record: record.service if record.attack else None,
+    'attack_flags': lambda record: record.flag if record.attack else None,
+}
+
+# HyperLogLog sketches by name: the value whose distinct occurrences are counted.
+CARDINALITY_SKETCHES = {
+    'protocol_service_flag': lambda record: f'{record.protocol_type}\t{record.service}\t{record.flag}',
+}
+
+logger = logging.getLogger('network_traffic.sketches')
+
+# Rows read per round trip by `rebuild`.
+REBUILD_CHUNK_SIZE = 5000
+
+
+@lru_cache(maxsize=65536)
+def hash64(key):
+    """
+    Return a stable 64-bit hash of a string, the same in every process (unlike `hash()`).
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class CountMinSketch:
+    """
+    Count-min sketch with a bounded list of heavy-hitter candidates.
+    """
+    kind = 'count-min'
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, capacity=HEAVY_HITTER_CAPACITY):
+        self.width, self.depth, self.capacity = width, depth, capacity
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self.candidates = {}  # key -> estimated count
+
+    @property
+    def parameters(self):
+        return {'width': self.width, 'depth': self.depth, 'capacity': self.capacity}
+
+    def _columns(self, key):
+        # One counter per row from two halves of one hash (Kirsch & Mitzenmacher)
+        value = hash64(key)
+        low, high = value & 0xFFFFFFFF, (value >> 32) | 1
+        return (low + np.arange(self.depth, dtype=np.uint64) * high) % self.width
+
+    def update(self, counts):
+        """
+        Add a `{key: count}` mapping; negative counts remove earlier additions.
+        """
+        rows = np.arange(self.depth)
+        for key, count in counts.items():
+            if count:
+                self.table[rows, self._columns(key).astype(np.int64)] += count
+                self.total += count
+        self._track(counts)
+
+    def estimate(self, key):
+        return int(self.table[np.arange(self.depth), self._columns(key).astype(np.int64)].min())
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        self._track([*self.candidates, *other.candidates])  # Removals in `other` lower ours too
+
+    def _track(self, keys):
+        # Re-estimate the touched keys and keep the `capacity` largest candidates
+        for key in keys:
+            estimate = self.estimate(key)
+            if estimate > 0:
+                self.candidates[key] = estimate
+            else:
+                self.candidates.pop(key, None)
+        if len(self.candidates) > self.capacity:
+            kept = sorted(self.candidates.items(), key=lambda item: (-item[1], item[0]))[:self.capacity]
+            self.candidates = dict(kept)
+
+    def top(self, k):
+        """
+        Return the `k` most frequent candidates as `(key, estimate)` pairs, largest first.
+        """
+        return sorted(self.candidates.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    @property
+    def error_bound(self):
+        """
+        The most an estimate overshoots its true count, with probability 1 - CMS_DELTA.
+        """
+        return math.ceil(math.e / self.width * max(self.total, 0))
+
+    def load(self, data):
+        self.table = np.frombuffer(data, dtype='<i8').reshape(self.depth, self.width).astype(np.int64)
+
+    def dump(self):
+        return self.table.astype('<i8').tobytes()
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter (Flajolet et al.) with the small-range correction.
+    """
+    kind = 'hyperloglog'
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+        self.total = 0
+
+    @property
+    def parameters(self):
+        return {'precision': self.precision}
+
+    def update(self, counts):
+        """
+        Add the keys of a `{key: count}` mapping; repeated and removed keys change nothing.
+        """
+        bits = 64 - self.precision
+        for key, count in counts.items():
+            if count <= 0:
+                continue
+            value = hash64(key)
+            index, rest = value >> bits, value & ((1 << bits) - 1)
+            rank = bits - rest.bit_length() + 1  # Position of the first 1 bit after the index
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+            self.total += count
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        self.total += other.total
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))  # Linear counting is more accurate for small sets
+        return round(raw)
+
+    @property
+    def relative_error(self):
+        """
+        Relative standard error of `estimate()`.
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def load(self, data):
+        self.registers = np.frombuffer(data, dtype=np.uint8).copy()
+
+    def dump(self):
+        return self.registers.tobytes()
+
+
+def empty_sketches():
+    """
+    Return a new, empty sketch for every configured name.
+    """
+    sketches = {name: CountMinSketch() for name in FREQUENCY_SKETCHES}
+    sketches.update({name: HyperLogLog() for name in CARDINALITY_SKETCHES})
+    return sketches
+
+
+def _counts(records, sign):
+    # Group records into `{sketch name: {key: count}}`
+    records = list(records)
+    counts = {}
+    for name, key_of in {**FREQUENCY_SKETCHES, **CARDINALITY_SKETCHES}.items():
+        keys = Counter(key for key in map(key_of, records) if key is not None)
+        counts[name] = {key: sign * count for key, count in keys.items()}
+    return counts
+
+
+class _Pending:
+    """
+    Committed changes of this process that have not been merged into the stored sketches yet.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.sketches = empty_sketches()
+        self.records = 0
+        self.since = None
+
+    def add(self, counts, records):
+        with self.lock:
+            for name, keys in counts.items():
+                self.sketches[name].update(keys)
+            self.records += records
+            if self.since is None:
+                self.since = time.monotonic()
+            due = (
+                self.records >= getattr(settings, 'IDS_SKETCH_FLUSH_RECORDS', 10000)
+                or time.monotonic() - self.since >= getattr(settings, 'IDS_SKETCH_FLUSH_SECONDS', 5.0)
+            )
+        if due:
+            flush_quietly()
+        elif getattr(settings, 'IDS_SKETCH_BACKGROUND_FLUSH', True):
+            _flusher.start()
+
+    def take(self):
+        with self.lock:
+            sketches, records = self.sketches, self.records
+            self.reset()
+        return (sketches, records) if records else None
+
+    def put_back(self, sketches, records):
+        # Changes whose save failed: merged with whatever arrived meanwhile, saved by the next flush
+        with self.lock:
+            for name, sketch in sketches.items():
+                self.sketches[name].merge(sketch)
+            self.records += records
+            if self.since is None:
+                self.since = time.monotonic()
+
+    def merge_into(self, sketches):
+        with self.lock:
+            for name, sketch in self.sketches.items():
+                sketches[name].merge(sketch)
+
+
+_pending = _Pending()
+
+
+def apply(records, sign=1):
+    """
+    Count NetworkTraffic instances into (`sign=1`) or out of (`sign=-1`) the sketches.
+
+    The change reaches the pending sketches only once the surrounding transaction commits, so
+    rolled-back writes are never counted.
+    """
+    records = list(records)
+    if records:
+        transaction.on_commit(partial(_pending.add, _counts(records, sign), len(records)))
+
+
+def flush():
+    """
+    Merge this process's pending changes into the stored sketches. Returns True if there were any.
+    """
+    pending = _pending.take()
+    if pending is None:
+        return False
+    sketches, records = pending
+    try:
+        _save(sketches)
+    except Exception:
+        _pending.put_back(sketches, records)  # Nothing was saved: keep the changes for the next flush
+        raise
+    return True
+
+
+def flush_quietly():
+    """
+    `flush()` for code that runs once a write has committed: a failed save is logged, not raised,
+    and its changes stay pending for the next flush.
+    """
+    try:
+        return flush()
+    except Exception:
+        logger.exception("Saving the traffic sketches failed; the changes stay pending.")
+        return False
+
+
+class _Flusher:
+    """
+    Background thread saving the pending changes every IDS_SKETCH_FLUSH_SECONDS, so a process
+    that stops writing still saves them. It exits once nothing is pending; the next change starts it again.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='sketch-flush', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(getattr(settings, 'IDS_SKETCH_FLUSH_SECONDS', 5.0))
+            with self.lock:
+                if not _pending.records:
+                    self.thread = None
+                    return
+            flush_quietly()
+            connection.close()  # The thread's own connection; reopened at the next flush
+
+
+_flusher = _Flusher()
+
+
+@atexit.register
+def _flush_at_exit():
+    if getattr(settings, 'IDS_SKETCH_BACKGROUND_FLUSH', True):
+        flush_quietly()
+
+
+def _save(sketches, replace=False):
+    with transaction.atomic():
+        stored = {row.name: row for row in TrafficSketch.objects.select_for_update().filter(name__in=sketches)}
+        now = timezone.now()
+        for name, sketch in sketches.items():
+            row = stored.get(name)
+            if row is not None and not replace:
+                merged = _load(row)
+                merged.merge(sketch)
+                sketch = merged
+            TrafficSketch.objects.update_or_create(name=name, defaults={
+                'kind': sketch.kind, 'parameters': sketch.parameters, 'total': sketch.total,
+                'candidates': getattr(sketch, 'candidates', {}), 'data': sketch.dump(), 'updated_at': now,
+            })
+
+
+def _load(row):
+    sketch = (CountMinSketch if row.kind == CountMinSketch.kind else HyperLogLog)(**row.parameters)
+    sketch.load(bytes(row.data))
+    sketch.total = row.total
+    if isinstance(sketch, CountMinSketch):
+        sketch.candidates = dict(row.candidates)
+    return sketch
+
+
+def load():
+    """
+    Return the stored sketches by name, with this process's pending changes merged in.
+
+    The pending changes are only merged in memory: reads never save them, so they take no write lock.
+    """
+    sketches = empty_sketches()
+    for row in TrafficSketch.objects.filter(name__in=sketches):
+        sketches[row.name] = _load(row)
+    _pending.merge_into(sketches)
+    return sketches
+
+
+def rebuild():
+    """
+    Recompute every sketch from the stored records, replacing the saved ones. Returns the record count.
+    """
+    _pending.take()  # Already contained in the table
+    sketches, total = empty_sketches(), 0
+    rows = NetworkTraffic.objects.only('protocol_type', 'service', 'flag', 'attack').iterator(chunk_size=REBUILD_CHUNK_SIZE)
+    chunk = []
+    for record in rows:
+        chunk.append(record)
+        if len(chunk) == REBUILD_CHUNK_SIZE:
+            total += _update(sketches, chunk)
+            chunk = []
+    total += _update(sketches, chunk)
+    _save(sketches, replace=True)
+    return total
+
+
+def _update(sketches, records):
+    for name, keys in _counts(records, 1).items():
+        sketches[name].update(keys)
+    return len(records)
+
+
+def report(k=10):
+    """
+    Return the top `k` heavy hitters of every count-min sketch and every distinct-count estimate,
+    each with its error bound.
+    """
+    sketches = load()
+    heavy_hitters, cardinalities = {}, {}
+    for name, sketch in sketches.items():
+        if isinstance(sketch, CountMinSketch):
+            heavy_hitters[name] = {
+                'total': sketch.total,
+                'top': [{'value': key, 'estimate': estimate} for key, estimate in sketch.top(k)],
+                # Estimates are never low, and high by at most this much with probability 1 - delta
+                'max_overestimate': sketch.error_bound,
+                'epsilon': CMS_EPSILON,
+                'delta': CMS_DELTA,
+            }
+        else:
+            estimate = sketch.estimate()
+            cardinalities[name] = {
+                'estimate': estimate,
+                'relative_standard_error': round(sketch.relative_error, 4),
+                # About 95% of estimates fall within two standard errors of the true count
+                'interval_95': [math.floor(estimate * (1 - 2 * sketch.relative_error)), math.ceil(estimate * (1 + 2 * sketch.relative_error))],
+            }
+    return {'heavy_hitters': heavy_hitters, 'cardinality': cardinalities}
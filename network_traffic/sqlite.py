@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# SQLite tuning for concurrent ingest and dashboard reads, chosen with IDS_SQLITE_PROFILE.
+#
+# With the default rollback journal a writer needs every reader out of the file before it can
+# commit, so long reads and writes queue behind each other and give "database is locked" errors.
+# The production profile switches to write-ahead logging: readers keep reading the last commit
+# while a writer appends to the log, and only writers wait for each other. The other pragmas
+# trade durability of the very last commits on power loss (synchronous=NORMAL, safe in WAL mode)
+# and memory for speed. They are applied to every new connection by `configure_connection`, and
+# persistent connections (CONN_MAX_AGE) keep them from being re-run on every request. The default
+# alias also switches to the sqlite_backend engine, whose transactions lock before their first read.
+
+# Pragmas per profile, applied in this order. busy_timeout is in milliseconds, mmap_size in bytes
+# and a negative cache_size in KiB.
+PROFILES = {
+    'default': {},
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Pragmas that change the database file rather than the connection; read-only connections skip them.
+FILE_PRAGMAS = ('journal_mode',)
+
+
+def profile_pragmas():
+    """
+    Return the pragmas of IDS_SQLITE_PROFILE, with IDS_SQLITE_PRAGMAS overriding single values.
+    """
+    return {**PROFILES[getattr(settings, 'IDS_SQLITE_PROFILE', 'default')], **getattr(settings, 'IDS_SQLITE_PRAGMAS', {})}
+
+
+def is_read_only(settings_dict):
+    return 'mode=ro' in str(settings_dict['NAME'])
+
+
+def apply_pragmas(database, pragmas, read_only=False):
+    """
+    Run `PRAGMA name = value` for every pragma on a sqlite3 connection or cursor.
+    """
+    for name, value in pragmas.items():
+        if read_only and name in FILE_PRAGMAS:
+            continue
+        if not name.isidentifier() or not str(value).lstrip('-').isalnum():
+            raise ValueError(f"Invalid SQLite pragma {name}={value!r}.")
+        database.execute(f'PRAGMA {name} = {value}').fetchall()  # Pragmas take no bound parameters
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    `connection_created` receiver: tune every new SQLite connection for the current profile.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = profile_pragmas()
+    if pragmas:
+        # On the raw sqlite3 connection, so the pragmas are not logged or counted as queries
+        apply_pragmas(connection.connection, pragmas, read_only=is_read_only(connection.settings_dict))
+
+
+class ReadReplicaRouter:
+    """
+    Send reads to the read-only alias IDS_SQLITE_READ_ALIAS and everything else to the default one.
+
+    Reads made inside a transaction on the default connection stay on it, so they see that
+    transaction's own uncommitted writes.
+    """
+    def db_for_read(self, model, **hints):
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return getattr(settings, 'IDS_SQLITE_READ_ALIAS', 'replica')
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Both aliases are the same database file
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
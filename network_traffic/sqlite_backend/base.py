@@ -0,0 +1,16 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend whose transactions take the write lock as they begin (`BEGIN IMMEDIATE`).
+
+    A plain `BEGIN` only locks on the first write, so two transactions that read before writing
+    (the select_for_update() + update pattern of stats.py, anomaly.py and sketches.py, which
+    SQLite ignores) can each hold a read lock while waiting for the other's. SQLite breaks that
+    deadlock with an immediate "database is locked" error and no retry. With BEGIN IMMEDIATE
+    writers queue up on busy_timeout instead. Used by the production profile (see
+    network_traffic/sqlite.py); long read-only transactions belong on the read-only alias.
+    """
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
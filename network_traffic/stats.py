@@ -0,0 +1,181 @@
+import math
+from collections import defaultdict
+from django.db import transaction
+from .models import NetworkTraffic, TrafficSummary
+
+# Fields the summary table is keyed on, and the only ones the stats endpoint can group by.
+GROUP_FIELDS = ('service', 'protocol_type', 'flag')
+
+# Histogram buckets per doubling of the byte count. Four buckets per octave bound the error of a
+# reported percentile to about 9% of its true value.
+BUCKETS_PER_OCTAVE = 4
+
+# Percentiles reported for src_bytes / dst_bytes.
+PERCENTILES = (50, 90, 99)
+
+# Rows read per round trip when rebuilding the summary from the raw table.
+REBUILD_CHUNK_SIZE = 5000
+
+
+def bucket_of(value):
+    """
+    Return the histogram bucket of a byte count: 0 for zero, then 4 buckets per power of two.
+    """
+    if value <= 0:
+        return 0
+    return 1 + int(math.log2(value) * BUCKETS_PER_OCTAVE)
+
+
+def bucket_value(bucket):
+    """
+    Return the value reported for a bucket: the geometric midpoint of its range.
+    """
+    if bucket == 0:
+        return 0
+    return round(2 ** ((bucket - 0.5) / BUCKETS_PER_OCTAVE))
+
+
+class _Delta:
+    """
+    Pending changes to one summary row.
+    """
+    __slots__ = ('records', 'attacks', 'src_bytes_total', 'dst_bytes_total', 'src_bytes_histogram', 'dst_bytes_histogram')
+
+    def __init__(self):
+        self.records = self.attacks = self.src_bytes_total = self.dst_bytes_total = 0
+        self.src_bytes_histogram = defaultdict(int)
+        self.dst_bytes_histogram = defaultdict(int)
+
+    def add(self, attack, src_bytes, dst_bytes, sign):
+        self.records += sign
+        self.attacks += sign if attack else 0
+        self.src_bytes_total += sign * src_bytes
+        self.dst_bytes_total += sign * dst_bytes
+        self.src_bytes_histogram[str(bucket_of(src_bytes))] += sign
+        self.dst_bytes_histogram[str(bucket_of(dst_bytes))] += sign
+
+
+def _collect(rows, sign, deltas=None):
+    # rows are (service, protocol_type, flag, attack, src_bytes, dst_bytes) tuples
+    deltas = defaultdict(_Delta) if deltas is None else deltas
+    for service, protocol_type, flag, attack, src_bytes, dst_bytes in rows:
+        deltas[(service, protocol_type, flag)].add(attack, src_bytes, dst_bytes, sign)
+    return deltas
+
+
+def _merge_histogram(stored, delta):
+    merged = dict(stored)
+    for bucket, count in delta.items():
+        merged[bucket] = merged.get(bucket, 0) + count
+        if merged[bucket] <= 0:
+            del merged[bucket]
+    return merged
+
+
+def _save(deltas):
+    # Apply grouped deltas to the summary table in one transaction
+    if not deltas:
+        return
+    with transaction.atomic():
+        services = {service for service, _, _ in deltas}
+        existing = {
+            (row.service, row.protocol_type, row.flag): row
+            for row in TrafficSummary.objects.select_for_update().filter(service__in=services)
+        }
+        created, updated, emptied = [], [], []
+        for key, delta in deltas.items():
+            row = existing.get(key)
+            if row is None:
+                row = TrafficSummary(service=key[0], protocol_type=key[1], flag=key[2])
+                created.append(row)
+            else:
+                updated.append(row)
+            row.records += delta.records
+            row.attacks += delta.attacks
+            row.src_bytes_total += delta.src_bytes_total
+            row.dst_bytes_total += delta.dst_bytes_total
+            row.src_bytes_histogram = _merge_histogram(row.src_bytes_histogram, delta.src_bytes_histogram)
+            row.dst_bytes_histogram = _merge_histogram(row.dst_bytes_histogram, delta.dst_bytes_histogram)
+            if row.records <= 0:
+                emptied.append(row)
+
+        TrafficSummary.objects.bulk_create([row for row in created if row.records > 0])
+        TrafficSummary.objects.bulk_update(
+            [row for row in updated if row.records > 0],
+            ['records', 'attacks', 'src_bytes_total', 'dst_bytes_total', 'src_bytes_histogram', 'dst_bytes_histogram'],
+        )
+        TrafficSummary.objects.filter(pk__in=[row.pk for row in emptied if row.pk]).delete()
+
+
+def apply(records, sign=1):
+    """
+    Add (`sign=1`) or remove (`sign=-1`) NetworkTraffic instances from the summary table.
+    """
+    _save(_collect(
+        ((r.service, r.protocol_type, r.flag, r.attack, r.src_bytes, r.dst_bytes) for r in records),
+        sign,
+    ))
+
+
+def rebuild():
+    """
+    Recompute the whole summary table from NetworkTraffic. Returns the number of groups written.
+    """
+    rows = (
+        NetworkTraffic.objects
+        .values_list('service', 'protocol_type', 'flag', 'attack', 'src_bytes', 'dst_bytes')
+        .iterator(chunk_size=REBUILD_CHUNK_SIZE)
+    )
+    deltas = _collect(rows, 1)
+    with transaction.atomic():
+        TrafficSummary.objects.all().delete()
+        _save(deltas)
+    return len(deltas)
+
+
+def percentile(histogram, total, pct):
+    """
+    Return the approximate `pct`-th percentile of a bucket histogram holding `total` values.
+    """
+    rank = math.ceil(total * pct / 100)
+    seen = 0
+    for bucket in sorted(histogram, key=int):
+        seen += histogram[bucket]
+        if seen >= rank:
+            return bucket_value(int(bucket))
+    return 0
+
+
+def summarize(group_by=('service',)):
+    """
+    Return grouped counts, attack ratios and byte statistics, largest groups first.
+    """
+    groups = {}
+    for row in TrafficSummary.objects.all():
+        key = tuple(getattr(row, field) for field in group_by)
+        group = groups.setdefault(key, {
+            'records': 0, 'attacks': 0, 'src_bytes_total': 0, 'dst_bytes_total': 0,
+            'src_bytes_histogram': {}, 'dst_bytes_histogram': {},
+        })
+        group['records'] += row.records
+        group['attacks'] += row.attacks
+        group['src_bytes_total'] += row.src_bytes_total
+        group['dst_bytes_total'] += row.dst_bytes_total
+        group['src_bytes_histogram'] = _merge_histogram(group['src_bytes_histogram'], row.src_bytes_histogram)
+        group['dst_bytes_histogram'] = _merge_histogram(group['dst_bytes_histogram'], row.dst_bytes_histogram)
+
+    results = []
+    for key, group in sorted(groups.items(), key=lambda item: (-item[1]['records'], item[0])):
+        records = group['records']
+        entry = dict(zip(group_by, key))
+        entry['records'] = records
+        entry['attacks'] = group['attacks']
+        entry['attack_ratio'] = round(group['attacks'] / records, 4)
+        for field in ('src_bytes', 'dst_bytes'):
+            total = group[f'{field}_total']
+            histogram = group[f'{field}_histogram']
+            entry[field] = {'sum': total, 'mean': round(total / records, 2)}
+            for pct in PERCENTILES:
+                entry[field][f'p{pct}'] = percentile(histogram, records, pct)
+        results.append(entry)
+    return results
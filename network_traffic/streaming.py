@@ -0,0 +1,109 @@
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+from .serializers import NetworkTrafficFastSerializer
+
+# Rows fetched from the database cursor per round trip while streaming.
+STREAM_CHUNK_SIZE = 2000
+
+# Supported values of the `?stream=` query parameter and the content type each one is sent with.
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+_encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def encode_records(queryset, chunk_size=STREAM_CHUNK_SIZE, serializer=None):
+    """
+    Yield each record of the queryset as a JSON string, in primary key order.
+    """
+    serializer = serializer or NetworkTrafficFastSerializer()
+    encode, dumps = serializer.encode, _encoder.encode
+    for row in serializer.rows(queryset).order_by('pk').iterator(chunk_size=chunk_size):
+        yield dumps(encode(row))
+
+
+def _ndjson(records, chunk_size):
+    lines = []
+    for record in records:
+        lines.append(record)
+        if len(lines) >= chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _json_array(records, chunk_size):
+    yield '['
+    separator = ''
+    lines = []
+    for record in records:
+        lines.append(record)
+        if len(lines) >= chunk_size:
+            yield separator + ','.join(lines)
+            separator = ','
+            lines = []
+    if lines:
+        yield separator + ','.join(lines)
+    yield ']'
+
+
+def stream_response(queryset, fmt, chunk_size=STREAM_CHUNK_SIZE, serializer=None):
+    """
+    Return a StreamingHttpResponse that writes the queryset as NDJSON or as one JSON array.
+
+    Records are read with a chunked iterator and written out as they are encoded, so neither the
+    queryset nor the response body is ever held in memory as a whole. `serializer` selects the
+    fields written (default: all of them).
+    """
+    writer = _ndjson if fmt == 'ndjson' else _json_array
+    records = encode_records(queryset, chunk_size=chunk_size, serializer=serializer)
+    return StreamingHttpResponse(writer(records, chunk_size), content_type=STREAM_FORMATS[fmt])
+
+
+def _encode_rows(encode, dumps, rows):
+    return [dumps(encode(row)) for row in rows]
+
+
+async def aencode_chunks(queryset, chunk_size=STREAM_CHUNK_SIZE, serializer=None):
+    """
+    Async counterpart of `encode_records`: yield lists of encoded records, one per chunk.
+
+    Chunks are read with keyset queries on the event loop and encoded in a worker thread, so
+    encoding a large chunk never blocks other requests.
+    """
+    serializer = serializer or NetworkTrafficFastSerializer()
+    encode_chunk = sync_to_async(_encode_rows, thread_sensitive=False)
+    rows = serializer.rows(queryset).order_by('pk')
+    last = None
+    while True:
+        chunk = rows if last is None else rows.filter(pk__gt=last)
+        batch = [row async for row in chunk[:chunk_size]]
+        if not batch:
+            return
+        yield await encode_chunk(serializer.encode, _encoder.encode, batch)
+        if len(batch) < chunk_size:
+            return
+        last = batch[-1][0]  # values_list() rows start with the primary key
+
+
+def astream_response(queryset, fmt, chunk_size=STREAM_CHUNK_SIZE, serializer=None):
+    """
+    Async version of `stream_response` for views running on the event loop.
+    """
+    async def body():
+        if fmt == 'json':
+            yield '['
+        separator = ''
+        async for records in aencode_chunks(queryset, chunk_size=chunk_size, serializer=serializer):
+            if fmt == 'ndjson':
+                yield '\n'.join(records) + '\n'
+            else:
+                yield separator + ','.join(records)
+                separator = ','
+        if fmt == 'json':
+            yield ']'
+    return StreamingHttpResponse(body(), content_type=STREAM_FORMATS[fmt])
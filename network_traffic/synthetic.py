@@ -0,0 +1,154 @@
+import csv
+import os
+from functools import lru_cache
+import numpy as np
+from django.conf import settings
+from .models import NetworkTraffic
+
+# Synthetic NetworkTraffic rows that follow the bundled dataset, for benchmarks at any volume.
+#
+# Rows are drawn from the sample with replacement, which keeps the joint distribution of
+# protocol, service, flag, attack and every rate intact, and then perturbed: sizes and durations
+# get a multiplicative log-normal jitter and connection counts a small additive one, clipped to
+# the ranges seen in the sample. Output depends only on `seed` and `chunk_size`.
+
+DATASET_PATH = os.path.join(settings.BASE_DIR, 'data', 'network_data.csv')
+DEFAULT_SEED = 20240601
+DEFAULT_CHUNK_SIZE = 100000
+
+FIELDS = tuple(
+    field.name for field in NetworkTraffic._meta.concrete_fields
+    if not field.primary_key and field.name not in ('attack_score', 'observed_at')
+)
+TEXT_FIELDS = ('protocol_type', 'service', 'flag')
+BOOLEAN_FIELDS = ('land', 'logged_in', 'attack')
+
+# Columns perturbed by a factor of exp(N(0, SIZE_JITTER)), and by +-COUNT_JITTER respectively.
+SIZE_FIELDS = ('duration', 'src_bytes', 'dst_bytes')
+COUNT_FIELDS = ('count', 'srv_count', 'dst_host_count', 'dst_host_srv_count')
+SIZE_JITTER = 0.25
+COUNT_JITTER = 3
+
+
+@lru_cache(maxsize=None)
+def sample_columns(path=DATASET_PATH):
+    """
+    Read a CSV in the dataset's format into one typed array per field.
+    """
+    with open(path) as file:
+        reader = csv.DictReader(file)
+        rows = list(reader)
+    columns = {}
+    for name in FIELDS:
+        values = [row[name] for row in rows]
+        if name in TEXT_FIELDS:
+            columns[name] = np.array(values, dtype=object)
+        elif name == 'attack':
+            columns[name] = np.array([value.strip().lower() == 'yes' for value in values])
+        elif name in BOOLEAN_FIELDS:
+            columns[name] = np.array([int(value) for value in values], dtype=bool)
+        elif NetworkTraffic._meta.get_field(name).get_internal_type() == 'FloatField':
+            columns[name] = np.array(values, dtype=np.float64)
+        else:
+            columns[name] = np.array([float(value) for value in values]).astype(np.int64)
+    return columns
+
+
+def generate(rows, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield `{field: array}` chunks holding `rows` synthetic records in total.
+    """
+    sample = sample_columns()
+    size = len(sample['attack'])
+    for number, start in enumerate(range(0, rows, chunk_size)):
+        count = min(chunk_size, rows - start)
+        rng = np.random.default_rng([seed, number])  # One stream per chunk, so chunks are reproducible on their own
+        picked = rng.integers(0, size, count)
+        chunk = {name: column[picked] for name, column in sample.items()}
+        for name in SIZE_FIELDS:
+            values = chunk[name]
+            jittered = np.rint(values * np.exp(rng.normal(0, SIZE_JITTER, count))).astype(np.int64)
+            chunk[name] = np.where(values > 0, np.clip(jittered, 1, sample[name].max() * 2), 0)
+        for name in COUNT_FIELDS:
+            jittered = chunk[name] + rng.integers(-COUNT_JITTER, COUNT_JITTER + 1, count)
+            chunk[name] = np.clip(jittered, sample[name].min(), sample[name].max())
+        yield chunk
+
+
+def records(rows, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Lazily yield `rows` unsaved synthetic NetworkTraffic instances, ready for `ingest.bulk_ingest`.
+    """
+    for chunk in generate(rows, seed=seed, chunk_size=chunk_size):
+        columns = [chunk[name].tolist() for name in FIELDS]
+        for values in zip(*columns):
+            yield NetworkTraffic(None, *values, None)  # id first and attack_score last, in field order; observed_at defaults to now
+
+
+def write_csv(path, rows, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write `rows` synthetic records to `path` in the format of `data/network_data.csv`.
+    """
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(FIELDS)
+        for chunk in generate(rows, seed=seed, chunk_size=chunk_size):
+            columns = []
+            for name in FIELDS:
+                values = chunk[name]
+                if name == 'attack':
+                    columns.append(np.where(values, 'Yes', 'No').tolist())
+                elif name in BOOLEAN_FIELDS:
+                    columns.append(values.astype(np.int8).tolist())
+                elif values.dtype.kind == 'f':
+                    columns.append([f'{value:g}' for value in values.tolist()])
+                else:
+                    columns.append(values.tolist())
+            writer.writerows(zip(*columns))
+
+
+# Flow logs (see features.py) start at this time and carry this many connections per second on average.
+FLOW_START = 1717200000.0  # 2024-06-01T00:00:00Z
+FLOW_RATE = 1000
+FLOW_DST_HOSTS = 64
+FLOW_SRC_HOSTS = 1024
+WELL_KNOWN_PORTS = {'http': 80, 'ftp': 21, 'ftp_data': 20, 'smtp': 25, 'telnet': 23, 'domain_u': 53, 'private': 1024}
+
+
+def write_flow_log(path, rows, seed=DEFAULT_SEED, rate=FLOW_RATE, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write `rows` raw connections to `path` in the flow log format read by `features.read_flows`.
+
+    Protocol, service, flag, bytes, duration and label come from `generate`. Destination hosts
+    follow a Zipf-like distribution, so a few hosts draw most connections, and arrivals are a
+    Poisson process of `rate` connections per second.
+    """
+    weights = 1 / np.arange(1, FLOW_DST_HOSTS + 1)
+    weights /= weights.sum()
+    now = FLOW_START
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(('timestamp', 'src_host', 'src_port', 'dst_host', 'dst_port', 'protocol', 'service', 'flag', 'src_bytes', 'dst_bytes', 'duration', 'attack'))
+        for number, chunk in enumerate(generate(rows, seed=seed, chunk_size=chunk_size)):
+            count = len(chunk['attack'])
+            rng = np.random.default_rng([seed, number, 1])
+            timestamps = now + np.cumsum(rng.exponential(1 / rate, count))
+            now = float(timestamps[-1])
+            dst_hosts = rng.choice(FLOW_DST_HOSTS, count, p=weights)
+            src_hosts = rng.integers(0, FLOW_SRC_HOSTS, count)
+            src_ports = rng.integers(1024, 65536, count)
+            services = chunk['service'].tolist()
+            writer.writerows(zip(
+                (f'{value:.6f}' for value in timestamps.tolist()),
+                (f'10.0.{value // 256}.{value % 256}' for value in src_hosts.tolist()),
+                src_ports.tolist(),
+                (f'192.168.1.{value + 1}' for value in dst_hosts.tolist()),
+                (WELL_KNOWN_PORTS.get(service, 1024 + len(service)) for service in services),
+                chunk['protocol_type'].tolist(),
+                services,
+                chunk['flag'].tolist(),
+                chunk['src_bytes'].tolist(),
+                chunk['dst_bytes'].tolist(),
+                chunk['duration'].tolist(),
+                np.where(chunk['attack'], 'yes', 'no').tolist(),
+            ))
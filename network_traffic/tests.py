@@ -1,7 +1,74 @@
-from django.test import TestCase
-from .models import NetworkTraffic
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import msgpack
+import django
+import numpy as np
+from io import StringIO
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteWrapper
+from django.core.cache import caches
+from django.db.models import Count, F, Q, Sum
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from unittest import mock, skipUnless
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from smarthome_network_ids.asgi import application as asgi_application
+from .anomaly import FEATURES, SCORING_COLUMNS, AnomalyScorer
+from .classifier import NUMERIC, get_classifier
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal
+from .colfile import FIELDS as COLUMN_FILE_FIELDS, ColumnFile
+from .columnar import ColumnarSnapshot
+from . import columnar, compression, features, jobs, metrics, sketches, sqlite, synthetic
+from .ingest import bulk_ingest, read_csv
+from .live import MicroBatcher, counters as live_counters
+from .models import DetectionRule, Job, NetworkTraffic, RuleMatch, TrafficBaseline, TrafficSketch, TrafficSummary
+from .retention import parse_duration, purge
+from .rules import RuleError, compile_rule, evaluate as evaluate_rules
+from .sqlite_backend.base import DatabaseWrapper as ImmediateWrapper
+from .serializers import NetworkTrafficFastSerializer, NetworkTrafficSerializer
+from .synthetic import generate as generate_traffic, sample_columns
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+SAMPLE_CSV = os.path.join(settings.BASE_DIR, 'data', 'network_data.csv')
+
+
+def load_sample(rows):
+    """
+    Return the first `rows` records of the sample CSV as unsaved NetworkTraffic instances.
+    """
+    with open(SAMPLE_CSV) as source:
+        return [record for _, record in zip(range(rows), read_csv(source))]
+
+
+# Background sketch saves would write from their own thread, outside each test's transaction, and
+# the save at exit would write leftover test changes into the real database once the test one is gone
+_no_background_flush = override_settings(IDS_SKETCH_BACKGROUND_FLUSH=False)
+
+
+def setUpModule():
+    _no_background_flush.enable()
+
+
+def tearDownModule():
+    sketches._pending.take()
+    _no_background_flush.disable()
+
 
 ''' TEST MODELS
 1. Test the integrity NetworkTraffic model to ensure correct representation of dataset fields.
@@ -127,8 +194,8 @@ class NetworkTrafficViewTest(TestCase):
         """Test fetching all traffic records."""
         response = self.client.get('/api/traffic')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
-        self.assertEqual(response.data[0]['protocol_type'], 'TCP')  # Validate a sample record
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['protocol_type'], 'TCP')  # Validate a sample record
 
     def test_get_traffic_detail_valid(self):
         """Test fetching a single record by valid ID."""
@@ -143,3 +210,1946 @@ class NetworkTrafficViewTest(TestCase):
         self.assertIn('error', response.data)
         self.assertEqual(response.data['error'], 'Record not found')
 
+
+''' TEST SERIALIZERS
+1. Test that the fast read serializer renders byte-identical JSON to NetworkTrafficSerializer.
+2. Verify the yes/no mapping of `attack` on both values. '''
+
+class NetworkTrafficFastSerializerTest(TestCase):
+    def setUp(self):
+        records = load_sample(50)
+        NetworkTraffic.objects.bulk_create(records)
+
+    def test_output_is_byte_identical(self):
+        """Test the fast serializer against the model serializer on every stored record."""
+        queryset = NetworkTraffic.objects.order_by('pk')
+        fast = NetworkTrafficFastSerializer()
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(fast.encode_many(fast.rows(queryset))),
+            renderer.render(NetworkTrafficSerializer(queryset, many=True).data),
+        )
+
+    def test_attack_mapping(self):
+        """Test that both attack values are encoded as yes/no."""
+        fast = NetworkTrafficFastSerializer()
+        values = {record['attack'] for record in fast.encode_many(fast.rows(NetworkTraffic.objects.all()))}
+        self.assertEqual(values, {'yes', 'no'})
+
+    def test_benchmark_command(self):
+        """Test that the serializer benchmark runs and reports a speedup."""
+        out = StringIO()
+        call_command('benchmark', 'serializer', rows=100, repeat=1, stdout=out)
+        self.assertIn('speedup', out.getvalue())
+        self.assertEqual(NetworkTraffic.objects.count(), 50)  # Benchmark rows are rolled back
+
+
+''' TEST PAGINATION
+1. Test that list endpoints walk the table forwards and backwards with opaque cursors.
+2. Verify that filtered endpoints page through their own querysets only. '''
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        records = load_sample(12)
+        NetworkTraffic.objects.bulk_create(records)
+        self.ids = list(NetworkTraffic.objects.order_by('pk').values_list('pk', flat=True))
+
+    def test_walk_forwards_and_backwards(self):
+        """Test following next and previous cursors across every page."""
+        response = self.client.get('/api/traffic', {'page_size': 5})
+        self.assertIsNone(response.data['previous'])
+        seen = [row['id'] for row in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [row['id'] for row in response.data['results']]
+        self.assertEqual(seen, self.ids)
+
+        # The last page holds the final two rows; step back to the page before it
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([row['id'] for row in response.data['results']], self.ids[5:10])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([row['id'] for row in response.data['results']], self.ids[:5])
+        self.assertIsNone(response.data['previous'])
+
+    def test_invalid_cursor(self):
+        """Test that a tampered cursor is rejected."""
+        response = self.client.get('/api/traffic', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filtered_endpoint_is_paginated(self):
+        """Test that filter endpoints page through matching rows only."""
+        expected = list(NetworkTraffic.objects.filter(attack=False).order_by('pk').values_list('pk', flat=True))
+        response = self.client.get('/api/traffic/filter/attack/', {'attack': 'no', 'page_size': 3})
+        self.assertEqual([row['id'] for row in response.data['results']], expected[:3])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['results']], expected[3:6])
+
+
+''' TEST QUERY PLANS
+1. Run EXPLAIN QUERY PLAN on every query issued by the filtered endpoints.
+2. Fail if SQLite falls back to a full scan of the traffic table. '''
+
+class QueryPlanTest(TestCase):
+    # Endpoint requests whose queries must all be served by an index
+    requests = [
+        ('/api/traffic', {'cursor': 'eyJrIjo1MH0='}),
+        ('/api/traffic/anomalous/', {}),
+        ('/api/traffic/anomalous/', {'threshold': 5000}),
+        ('/api/traffic/filter/service/http/', {}),
+        ('/api/traffic/filter/attack/', {'attack': 'yes'}),
+        ('/api/traffic/filter/attack/', {'attack': 'no'}),
+        ('/traffic/complex-filters/', {'protocol_type': 'TCP'}),
+        ('/traffic/complex-filters/', {'protocol_type': 'tcp', 'flag': 'SF'}),
+        ('/traffic/complex-filters/', {'service': 'HTTP', 'attack': 'yes'}),
+        ('/traffic/complex-filters/', {'flag': 'rej'}),
+        ('/traffic/complex-filters/', {'src_bytes_min': 100, 'src_bytes_max': 500}),
+        ('/traffic/complex-filters/', {'dst_bytes_min': 100}),
+        ('/traffic/complex-filters/', {'dst_bytes_max': 100}),
+        ('/traffic/complex-filters/', {'serror_rate_min': 0.5}),
+        ('/traffic/complex-filters/', {'attack': 'no'}),
+        ('/api/traffic', {'last': '5m'}),
+        ('/api/traffic', {'since': '2024-06-01T00:00:00Z', 'until': '2024-06-02T00:00:00Z'}),
+        ('/api/traffic/filter/attack/', {'attack': 'no', 'until': '2024-06-01T00:00:00Z'}),
+        ('/api/traffic/filter/service/http/', {'count': 'true'}),
+        ('/traffic/complex-filters/', {'protocol_type': 'tcp', 'fields': 'service,src_bytes'}),
+    ]
+
+    def setUp(self):
+        self.client = APIClient()
+        records = load_sample(300)
+        NetworkTraffic.objects.bulk_create(records)
+
+    def capture_queries(self, url, params):
+        # Record the SQL and parameters of every statement the request executes
+        queries = []
+
+        def record(execute, sql, sql_params, many, context):
+            queries.append((sql, sql_params))
+            return execute(sql, sql_params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return queries
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_no_full_table_scans(self):
+        """Test that every endpoint query is planned with an index."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are checked against SQLite only.')
+        table = NetworkTraffic._meta.db_table
+        for url, params in self.requests:
+            for sql, sql_params in self.capture_queries(url, params):
+                plan = self.explain(sql, sql_params)
+                with self.subTest(url=url, params=params, plan=plan):
+                    self.assertNotIn(f'SCAN {table}', plan)
+
+    @skipUnlessDBFeature('supports_partial_indexes')
+    def test_attack_filter_uses_partial_index(self):
+        """Test that filtering on attack walks the partial index of attack rows."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are checked against SQLite only.')
+        plans = [
+            line
+            for sql, sql_params in self.capture_queries('/api/traffic/filter/attack/', {'attack': 'yes'})
+            for line in self.explain(sql, sql_params)
+        ]
+        self.assertTrue(any('nt_attack_rows_idx' in line for line in plans))
+
+    def test_range_filters_match_open_ranges(self):
+        """Test that the bounded range filters return the same rows as open-ended ones."""
+        anomalous = self.client.get('/api/traffic/anomalous/', {'page_size': 1000})
+        self.assertEqual(
+            len(anomalous.data['results']),
+            NetworkTraffic.objects.filter(Q(src_bytes__gte=1000) | Q(dst_bytes__gte=1000)).count(),
+        )
+        self.assertGreater(len(anomalous.data['results']), 0)
+        for params, expected in (
+            ({'dst_bytes_min': 100}, NetworkTraffic.objects.filter(dst_bytes__gte=100)),
+            ({'src_bytes_max': 100}, NetworkTraffic.objects.filter(src_bytes__lte=100)),
+            ({'serror_rate_min': 0.5}, NetworkTraffic.objects.filter(serror_rate__gte=0.5)),
+        ):
+            response = self.client.get('/traffic/complex-filters/', {**params, 'page_size': 1000})
+            self.assertEqual(len(response.data['results']), expected.count())
+
+    def test_case_insensitive_filters(self):
+        """Test that the index-friendly filters still ignore case."""
+        upper = self.client.get('/traffic/complex-filters/', {'protocol_type': 'TCP', 'flag': 'sf', 'page_size': 1000})
+        lower = self.client.get('/traffic/complex-filters/', {'protocol_type': 'tcp', 'flag': 'SF', 'page_size': 1000})
+        expected = NetworkTraffic.objects.filter(protocol_type__iexact='tcp', flag__iexact='sf').count()
+        self.assertEqual(len(upper.data['results']), expected)
+        self.assertEqual(upper.data['results'], lower.data['results'])
+
+
+''' TEST STREAMING
+1. Test that `?stream=ndjson` and `?stream=json` return every matching record in one response.
+2. Verify that streamed records match the paginated representation. '''
+
+class StreamingResponseTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        records = load_sample(30)
+        NetworkTraffic.objects.bulk_create(records)
+
+    def test_stream_ndjson(self):
+        """Test streaming every record as newline-delimited JSON."""
+        response = self.client.get('/api/traffic', {'stream': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 30)
+        page = self.client.get('/api/traffic', {'page_size': 30}).json()['results']
+        self.assertEqual([json.loads(line) for line in lines], page)
+
+    def test_stream_json_array_with_filter(self):
+        """Test streaming a filtered result as one JSON array."""
+        response = self.client.get('/traffic/complex-filters/', {'attack': 'no', 'stream': 'json'})
+        records = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(records), NetworkTraffic.objects.filter(attack=False).count())
+        self.assertTrue(all(record['attack'] == 'no' for record in records))
+
+    def test_stream_empty_result(self):
+        """Test that an empty stream is still valid JSON."""
+        response = self.client.get('/api/traffic/anomalous/', {'threshold': 10 ** 9, 'stream': 'json'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    def test_invalid_stream_format(self):
+        """Test that unknown stream formats are rejected."""
+        response = self.client.get('/api/traffic', {'stream': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+''' TEST TRAFFIC STATISTICS
+1. Test that every write path keeps the summary table in step with NetworkTraffic.
+2. Verify the grouped counts, ratios and byte statistics served by the stats endpoint. '''
+
+class TrafficStatsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {
+            'duration': 0, 'protocol_type': 'tcp', 'service': 'http', 'flag': 'SF',
+            'src_bytes': 200, 'dst_bytes': 4000, 'land': False, 'wrong_fragment': 0, 'urgent': 0,
+            'hot': 0, 'logged_in': True, 'num_compromised': 0, 'count': 1, 'srv_count': 1,
+            'serror_rate': 0.0, 'rerror_rate': 0.0, 'same_srv_rate': 1.0, 'diff_srv_rate': 0.0,
+            'srv_diff_host_rate': 0.0, 'dst_host_count': 10, 'dst_host_srv_count': 10,
+            'dst_host_same_srv_rate': 1.0, 'dst_host_diff_srv_rate': 0.0, 'attack': 'no',
+        }
+
+    def stats(self, **params):
+        response = self.client.get('/api/traffic/stats/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {tuple(group[field] for field in response.data['group_by']): group for group in response.data['results']}
+
+    def test_create_update_delete_keep_summary_current(self):
+        """Test the summary after creating, moving and deleting records through the API."""
+        first = self.client.post('/api/traffic/create/', self.payload, format='json').data['id']
+        self.client.post('/api/traffic/create/', {**self.payload, 'attack': 'yes', 'src_bytes': 800}, format='json')
+        http = self.stats()[('http',)]
+        self.assertEqual((http['records'], http['attacks'], http['attack_ratio']), (2, 1, 0.5))
+        self.assertEqual(http['src_bytes']['sum'], 1000)
+        self.assertEqual(http['src_bytes']['mean'], 500)
+
+        self.client.put(f'/api/traffic/update/{first}/', {**self.payload, 'service': 'ftp'}, format='json')
+        groups = self.stats()
+        self.assertEqual(groups[('http',)]['records'], 1)
+        self.assertEqual(groups[('ftp',)]['records'], 1)
+
+        self.client.delete(f'/api/traffic/delete/{first}/')
+        self.assertNotIn(('ftp',), self.stats())
+        self.assertFalse(TrafficSummary.objects.filter(service='ftp').exists())
+
+    def test_bulk_load_matches_rebuild(self):
+        """Test that the incrementally maintained summary equals a rebuild from scratch."""
+        bulk_ingest(load_sample(500), chunk_size=64)
+        incremental = self.stats(group_by='service,protocol_type,flag')
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertEqual(self.stats(group_by='service,protocol_type,flag'), incremental)
+        self.assertEqual(sum(group['records'] for group in incremental.values()), 500)
+        self.assertEqual(
+            sum(group['attacks'] for group in incremental.values()),
+            NetworkTraffic.objects.filter(attack=True).count(),
+        )
+
+    def test_percentiles_are_approximate(self):
+        """Test that byte percentiles stay within the histogram's relative error."""
+        records = [NetworkTraffic(**{**self.payload, 'attack': False, 'dst_bytes': value}) for value in range(1, 1001)]
+        bulk_ingest(records)
+        dst_bytes = self.stats(group_by='protocol_type')[('tcp',)]['dst_bytes']
+        for pct, exact in (('p50', 500), ('p90', 900), ('p99', 990)):
+            self.assertAlmostEqual(dst_bytes[pct], exact, delta=exact * 0.1)
+
+    def test_query_count_is_constant(self):
+        """Test that the endpoint only reads the summary table."""
+        bulk_ingest(NetworkTraffic(**{**self.payload, 'attack': False}) for _ in range(200))
+        with self.settings(IDS_RESPONSE_CACHE_ENABLED=False), self.assertNumQueries(1):
+            self.client.get('/api/traffic/stats/', {'group_by': 'flag'})
+
+    def test_invalid_group_by(self):
+        """Test that only summary fields can be grouped on."""
+        response = self.client.get('/api/traffic/stats/', {'group_by': 'src_bytes'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+''' TEST ANOMALY SCORING
+1. Test that the per-group baselines maintained on ingest match a rebuild from scratch.
+2. Verify that method=zscore flags outliers of their group and pages through the results. '''
+
+class AnomalyScoringTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {
+            'duration': 0, 'protocol_type': 'tcp', 'service': 'http', 'flag': 'SF',
+            'src_bytes': 200, 'dst_bytes': 4000, 'land': False, 'wrong_fragment': 0, 'urgent': 0,
+            'hot': 0, 'logged_in': True, 'num_compromised': 0, 'count': 1, 'srv_count': 1,
+            'serror_rate': 0.0, 'rerror_rate': 0.0, 'same_srv_rate': 1.0, 'diff_srv_rate': 0.0,
+            'srv_diff_host_rate': 0.0, 'dst_host_count': 10, 'dst_host_srv_count': 10,
+            'dst_host_same_srv_rate': 1.0, 'dst_host_diff_srv_rate': 0.0, 'attack': False,
+        }
+
+    def normal_traffic(self, count):
+        # Small, varied requests so every feature of the http group has a baseline
+        return [
+            NetworkTraffic(**{**self.payload, 'src_bytes': 180 + i % 40, 'dst_bytes': 3800 + i % 400, 'count': 1 + i % 5})
+            for i in range(count)
+        ]
+
+    def baselines(self):
+        return {
+            (row.service, row.protocol_type): (row.samples, [round(value, 6) for value in row.mean], [round(value, 3) for value in row.m2])
+            for row in TrafficBaseline.objects.all()
+        }
+
+    def test_incremental_baselines_match_rebuild(self):
+        """Test that baselines maintained across chunks, updates and deletes equal a rebuild."""
+        bulk_ingest(load_sample(500), chunk_size=64)
+        record = NetworkTraffic.objects.order_by('pk').first()
+        self.client.put(f'/api/traffic/update/{record.pk}/', {**self.payload, 'attack': 'no', 'src_bytes': 999}, format='json')
+        self.client.delete(f'/api/traffic/delete/{record.pk + 1}/')
+
+        incremental = self.baselines()
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertEqual(self.baselines(), incremental)
+        self.assertEqual(sum(samples for samples, _, _ in incremental.values()), 499)
+        self.assertTrue(all(len(mean) == len(FEATURES) for _, mean, _ in incremental.values()))
+
+    def test_zscore_flags_group_outliers(self):
+        """Test that a record far from its group's baseline is flagged and scored."""
+        bulk_ingest(self.normal_traffic(200))
+        outlier = NetworkTraffic.objects.create(**{**self.payload, 'src_bytes': 5000000, 'hot': 30})
+
+        response = self.client.get('/api/traffic/anomalous/', {'method': 'zscore'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([record['id'] for record in response.data['results']], [outlier.pk])
+        self.assertGreater(response.data['results'][0]['anomaly_score'], 10)
+        self.assertEqual(response.data['results'][0]['attack'], 'no')
+
+    def test_small_groups_use_protocol_baseline(self):
+        """Test that a group without enough samples is scored against its protocol's baseline."""
+        bulk_ingest(self.normal_traffic(200))
+        NetworkTraffic.objects.create(**{**self.payload, 'service': 'gopher'})
+        rows = list(NetworkTraffic.objects.filter(service='gopher').values_list(*SCORING_COLUMNS))
+        rows.append((0, 'http', 'tcp') + tuple(5000000 if name == 'src_bytes' else self.payload[name] for name in FEATURES))
+        scores = AnomalyScorer().score_rows(rows)
+        self.assertLess(scores[0], 3)
+        self.assertGreater(scores[1], 3)
+
+    def test_zscore_pages_follow_cursors(self):
+        """Test that scored results page through the keyset cursors without gaps."""
+        bulk_ingest(self.normal_traffic(300))
+        outliers = [NetworkTraffic.objects.create(**{**self.payload, 'src_bytes': 5000000 + i}).pk for i in range(5)]
+        with self.settings(IDS_RESPONSE_CACHE_ENABLED=False):
+            seen, url = [], '/api/traffic/anomalous/?method=zscore&page_size=2'
+            while url:
+                page = self.client.get(url).data
+                seen.extend(record['id'] for record in page['results'])
+                url = page['next']
+        self.assertEqual(seen, outliers)
+
+    def test_invalid_method(self):
+        """Test that unknown methods and non-numeric scores are rejected."""
+        self.assertEqual(self.client.get('/api/traffic/anomalous/', {'method': 'magic'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/traffic/anomalous/', {'method': 'zscore', 'min_score': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+''' TEST RESPONSE CACHE
+1. Test that repeated reads are served from the cache until the dataset version changes.
+2. Verify that every write path invalidates cached responses and that eviction is bounded. '''
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        caches['traffic'].clear()
+        self.rows = load_sample(20)
+        bulk_ingest(self.rows[:10])
+
+    def test_repeat_query_is_a_hit(self):
+        """Test that an identical query skips the database apart from the version check."""
+        first = self.client.get('/api/traffic/filter/attack/', {'attack': 'no'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/traffic/filter/attack/', {'attack': 'no'})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+
+    def test_parameter_order_is_normalized(self):
+        """Test that the same parameters in a different order share one entry."""
+        self.client.get('/traffic/complex-filters/?protocol_type=tcp&flag=SF')
+        response = self.client.get('/traffic/complex-filters/?flag=SF&protocol_type=tcp')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_writes_invalidate(self):
+        """Test that bulk loads, creates and deletes all produce fresh responses."""
+        before = len(self.client.get('/api/traffic').data['results'])
+        bulk_ingest(self.rows[10:])
+        response = self.client.get('/api/traffic')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results']), before + 10)
+
+        record = NetworkTraffic.objects.order_by('pk').first()
+        self.client.get(f'/api/traffic/{record.pk}/')
+        self.client.delete(f'/api/traffic/delete/{record.pk}/')
+        self.assertEqual(self.client.get(f'/api/traffic/{record.pk}/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_streams_are_not_cached(self):
+        """Test that streaming responses bypass the cache."""
+        self.client.get('/api/traffic', {'stream': 'ndjson'})
+        response = self.client.get('/api/traffic', {'stream': 'ndjson'})
+        self.assertFalse(response.has_header('X-Cache'))
+
+    @override_settings(CACHES={
+        **settings.CACHES,
+        'traffic': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'traffic-lru-test',
+            'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_FREQUENCY': 2},
+        },
+    })
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test that a full cache evicts the entry used longest ago."""
+        for threshold in (1, 2):
+            self.client.get('/api/traffic/anomalous/', {'threshold': threshold})
+        self.client.get('/api/traffic/anomalous/', {'threshold': 1})  # Refresh the first entry
+        self.client.get('/api/traffic/anomalous/', {'threshold': 3})  # Evicts threshold=2
+        self.assertEqual(self.client.get('/api/traffic/anomalous/', {'threshold': 1})['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/api/traffic/anomalous/', {'threshold': 2})['X-Cache'], 'MISS')
+
+    def test_counters(self):
+        """Test that hits and misses are counted."""
+        before = self.client.get('/api/traffic/cache/').data
+        self.client.get('/api/traffic/stats/')
+        self.client.get('/api/traffic/stats/')
+        after = self.client.get('/api/traffic/cache/').data
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+
+''' TEST BATCH API
+1. Test creating, updating and deleting many records per request, from JSON arrays and NDJSON.
+2. Verify that invalid items are reported by index while the rest of the batch is saved. '''
+
+class NetworkTrafficBatchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.record = {
+            'duration': 0, 'protocol_type': 'udp', 'service': 'domain_u', 'flag': 'SF',
+            'src_bytes': 40, 'dst_bytes': 80, 'land': False, 'wrong_fragment': 0, 'urgent': 0,
+            'hot': 0, 'logged_in': False, 'num_compromised': 0, 'count': 1, 'srv_count': 1,
+            'serror_rate': 0.0, 'rerror_rate': 0.0, 'same_srv_rate': 1.0, 'diff_srv_rate': 0.0,
+            'srv_diff_host_rate': 0.0, 'dst_host_count': 1, 'dst_host_srv_count': 1,
+            'dst_host_same_srv_rate': 1.0, 'dst_host_diff_srv_rate': 0.0, 'attack': 'no',
+        }
+
+    def test_create_with_per_item_errors(self):
+        """Test that valid items are created and invalid ones reported by index."""
+        records = [
+            self.record,
+            {**self.record, 'attack': True},
+            {**self.record, 'attack': 'maybe'},
+            {**self.record, 'src_bytes': -1},
+            {**self.record, 'attack': 'YES'},
+        ]
+        response = self.client.post('/api/traffic/batch/', records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([error['index'] for error in response.data['errors']], [2, 3])
+        self.assertIn('attack', response.data['errors'][0]['errors'])
+        self.assertEqual(
+            list(NetworkTraffic.objects.filter(pk__in=response.data['ids']).order_by('pk').values_list('attack', flat=True)),
+            [False, True, True],
+        )
+        self.assertEqual(TrafficSummary.objects.get(service='domain_u').records, 3)
+
+    def test_create_from_ndjson(self):
+        """Test that an NDJSON body is accepted."""
+        body = '\n'.join(json.dumps({**self.record, 'src_bytes': value}) for value in range(1, 6)) + '\n'
+        response = self.client.post('/api/traffic/batch/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(NetworkTraffic.objects.count(), 5)
+
+    def test_create_in_bulk(self):
+        """Test that a batch is inserted in bulk, not one INSERT per record."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/traffic/batch/', [self.record] * 300, format='json')
+        self.assertEqual(response.data['created'], 300)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "network_traffic_networktraffic"')]
+        self.assertLess(len(inserts), 30)
+
+    def test_all_invalid_is_bad_request(self):
+        """Test that a batch without a single valid item is rejected."""
+        response = self.client.post('/api/traffic/batch/', [{'attack': 'no'}, 'not-an-object'], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['errors']), 2)
+
+    def test_batch_size_limit(self):
+        """Test that oversized batches are rejected before validation."""
+        with self.settings(IDS_BATCH_MAX_RECORDS=2):
+            response = self.client.post('/api/traffic/batch/', [self.record] * 3, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_and_delete_by_id(self):
+        """Test batch partial updates and deletes, including unknown ids."""
+        ids = self.client.post('/api/traffic/batch/', [self.record] * 3, format='json').data['ids']
+        response = self.client.patch('/api/traffic/batch/', [
+            {'id': ids[0], 'service': 'http', 'attack': 'yes'},
+            {'id': ids[1], 'src_bytes': 'many'},
+            {'id': 999999, 'src_bytes': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        updated = NetworkTraffic.objects.get(pk=ids[0])
+        self.assertEqual((updated.service, updated.attack, updated.src_bytes), ('http', True, 40))
+        self.assertEqual(TrafficSummary.objects.get(service='http').attacks, 1)
+
+        response = self.client.delete('/api/traffic/batch/', {'ids': [ids[0], ids[1], 999999]}, format='json')
+        self.assertEqual(response.data, {'deleted': 2, 'missing': [999999]})
+        self.assertEqual(list(NetworkTraffic.objects.values_list('pk', flat=True)), [ids[2]])
+        self.assertFalse(TrafficSummary.objects.filter(service='http').exists())
+
+    def test_update_duplicate_ids(self):
+        """Test that an id repeated in one update batch is reported by index and applied once."""
+        ids = self.client.post('/api/traffic/batch/', [self.record] * 2, format='json').data['ids']
+        DetectionRule.objects.create(name='large', expression='src_bytes > 100')
+        response = self.client.patch('/api/traffic/batch/', [
+            {'id': ids[0], 'src_bytes': 500},
+            {'id': ids[0], 'service': 'http'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['updated'], [error['index'] for error in response.data['errors']]), (1, [1]))
+        self.assertEqual(NetworkTraffic.objects.get(pk=ids[0]).service, 'domain_u')
+        summary = TrafficSummary.objects.get(service='domain_u')
+        self.assertEqual((summary.records, summary.src_bytes_total), (2, 540))
+        self.assertFalse(TrafficSummary.objects.filter(service='http').exists())
+        self.assertEqual(RuleMatch.objects.filter(traffic_id=ids[0]).count(), 1)
+
+
+''' TEST ATTACK CLASSIFIER
+1. Test that train_classifier writes a new model version with held-out metrics.
+2. Verify that the predict endpoint, batch creates and load_csv score records with the latest model. '''
+
+class AttackClassifierTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.model_dir = tempfile.mkdtemp()
+        self.override = override_settings(IDS_MODEL_DIR=self.model_dir, IDS_MODEL_VERSION=None)
+        self.override.enable()
+        self.records = load_sample(600)
+        self.payload = NetworkTrafficSerializer(self.records[0]).data
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.model_dir)
+
+    def train(self):
+        bulk_ingest(self.records)
+        call_command('train_classifier', stdout=StringIO())
+
+    def test_training_writes_versioned_artifacts(self):
+        """Test that every training run saves the next version together with its metrics."""
+        self.train()
+        out = StringIO()
+        call_command('train_classifier', epochs=2, stdout=out)
+        self.assertIn('Saved model version 2', out.getvalue())
+        self.assertEqual(sorted(os.listdir(self.model_dir)), ['classifier-v1.json', 'classifier-v1.npz', 'classifier-v2.json', 'classifier-v2.npz'])
+
+        model = get_classifier()
+        self.assertEqual(model.version, 2)
+        self.assertIs(get_classifier(), model)  # Loaded once, then reused
+        self.assertEqual(model.metadata['records'] + model.metadata['holdout']['records'], 600)
+        self.assertGreater(model.metadata['holdout']['accuracy'], 0.8)
+
+        # Scaling comes from the training rows only, never from the held-out fifth
+        training = [record for record in NetworkTraffic.objects.order_by('pk') if record.pk % 5]
+        self.assertEqual(model.metadata['records'], len(training))
+        self.assertAlmostEqual(model.mean[NUMERIC.index('count')], np.mean([record.count for record in training]))
+        self.assertEqual(model.vocabularies['service'], sorted({record.service for record in training}))
+
+    def test_pinned_version_without_artifact(self):
+        """Test that a pinned version that was never saved, or is not a number, counts as no model."""
+        self.train()
+        for pinned in ('7', 'latest'):
+            with self.settings(IDS_MODEL_VERSION=pinned):
+                self.assertIsNone(get_classifier())
+                response = self.client.post('/api/traffic/predict/', [self.payload], format='json')
+                self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        with self.settings(IDS_MODEL_VERSION='1'):
+            self.assertEqual(get_classifier().version, 1)
+
+    def test_predict_endpoint(self):
+        """Test that unlabeled records are scored and invalid ones reported by index."""
+        records = [{key: value for key, value in self.payload.items() if key not in ('id', 'attack')}, {'service': 'http'}]
+        response = self.client.post('/api/traffic/predict/', records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        self.train()
+        response = self.client.post('/api/traffic/predict/', records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['model_version'], 1)
+        self.assertEqual([prediction['index'] for prediction in response.data['predictions']], [0])
+        self.assertTrue(0 <= response.data['predictions'][0]['attack_score'] <= 1)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertIn('src_bytes', response.data['errors'][0]['errors'])
+        self.assertIn('inference_ms', response.data)
+
+    def test_ingest_attaches_scores(self):
+        """Test that batch creates with ?score=true and load_csv --score store attack_score."""
+        self.train()
+        record = {key: value for key, value in self.payload.items() if key != 'id'}
+        response = self.client.post('/api/traffic/batch/?score=true', [record, record], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('inference_ms', response.data)
+        scores = NetworkTraffic.objects.filter(pk__in=response.data['ids']).values_list('attack_score', flat=True)
+        self.assertTrue(all(score is not None for score in scores))
+
+        handle, csv_path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as file, open(SAMPLE_CSV) as source:
+            file.writelines(next(source) for _ in range(11))  # Header and ten rows
+        out = StringIO()
+        call_command('load_csv', csv_path, score=True, stdout=out)
+        os.remove(csv_path)
+        self.assertIn('scored in', out.getvalue())
+        self.assertEqual(NetworkTraffic.objects.filter(attack_score__isnull=True).count(), 600)  # Only the training rows are unscored
+
+
+''' TEST LIVE INGEST
+1. Test that records pushed over the WebSocket channel are written in batches and acknowledged.
+2. Verify per-message errors, unknown paths and the drop policy of a full queue. '''
+
+@override_settings(IDS_LIVE_FLUSH_INTERVAL=0.05, IDS_LIVE_OVERFLOW='block')
+class LiveIngestTest(TestCase):
+    def setUp(self):
+        self.record = {
+            'duration': 0, 'protocol_type': 'udp', 'service': 'domain_u', 'flag': 'SF',
+            'src_bytes': 40, 'dst_bytes': 80, 'land': False, 'wrong_fragment': 0, 'urgent': 0,
+            'hot': 0, 'logged_in': False, 'num_compromised': 0, 'count': 1, 'srv_count': 1,
+            'serror_rate': 0.0, 'rerror_rate': 0.0, 'same_srv_rate': 1.0, 'diff_srv_rate': 0.0,
+            'srv_diff_host_rate': 0.0, 'dst_host_count': 1, 'dst_host_srv_count': 1,
+            'dst_host_same_srv_rate': 1.0, 'dst_host_diff_srv_rate': 0.0, 'attack': 'no',
+        }
+        live_counters.reset()
+
+    async def connect(self, path='/ws/ingest/'):
+        communicator = ApplicationCommunicator(asgi_application, {'type': 'websocket', 'path': path})
+        await communicator.send_input({'type': 'websocket.connect'})
+        return communicator, await communicator.receive_output(timeout=1)
+
+    async def test_frames_are_batched_and_acknowledged(self):
+        """Test that messages from two connections are written together and each one acknowledged."""
+        first, accepted = await self.connect()
+        second, _ = await self.connect()
+        self.assertEqual(accepted['type'], 'websocket.accept')
+
+        await first.send_input({'type': 'websocket.receive', 'text': json.dumps([self.record] * 3)})
+        await second.send_input({'type': 'websocket.receive', 'text': '\n'.join([json.dumps(self.record)] * 2)})
+        first_ack = json.loads((await first.receive_output(timeout=2))['text'])
+        second_ack = json.loads((await second.receive_output(timeout=2))['text'])
+
+        self.assertEqual(first_ack, {'seq': 1, 'created': 3, 'errors': []})
+        self.assertEqual(second_ack, {'seq': 1, 'created': 2, 'errors': []})
+        self.assertEqual(await NetworkTraffic.objects.acount(), 5)
+        self.assertEqual(live_counters.snapshot()['batches'], 1)
+        for communicator in (first, second):
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(timeout=1)
+
+    async def test_errors_are_reported_per_message(self):
+        """Test that invalid records and malformed messages are reported by sequence number."""
+        communicator, _ = await self.connect()
+        await communicator.send_input({'type': 'websocket.receive', 'text': 'not json'})
+        await communicator.send_input({'type': 'websocket.receive', 'text': json.dumps([self.record, {**self.record, 'attack': 'maybe'}])})
+
+        malformed = json.loads((await communicator.receive_output(timeout=2))['text'])
+        self.assertEqual(malformed['seq'], 1)
+        self.assertIn('error', malformed)
+        ack = json.loads((await communicator.receive_output(timeout=2))['text'])
+        self.assertEqual((ack['seq'], ack['created']), (2, 1))
+        self.assertEqual([error['index'] for error in ack['errors']], [1])
+        self.assertEqual(live_counters.snapshot()['rejected'], 1)
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(timeout=1)
+
+    async def test_unknown_path_is_closed(self):
+        """Test that WebSocket connections to other paths are refused."""
+        communicator, message = await self.connect('/ws/other/')
+        self.assertEqual(message, {'type': 'websocket.close', 'code': 4404})
+        await communicator.wait(timeout=1)
+
+    async def test_full_queue_drops_frames(self):
+        """Test that the drop policy discards and counts messages once the queue is full."""
+        batcher = MicroBatcher(batch_size=10, flush_interval=1, queue_frames=1, overflow='drop')
+        batcher.task.cancel()  # Nothing drains the queue, as if the database had fallen behind
+
+        async def reply(result):
+            pass
+        self.assertTrue(await batcher.submit([self.record], reply))
+        self.assertFalse(await batcher.submit([self.record, self.record], reply))
+        self.assertEqual(live_counters.snapshot()['dropped'], 2)
+
+
+''' TEST ASYNC VIEWS
+1. Test that every async read endpoint returns the same JSON as its sync counterpart.
+2. Verify cursors, streaming, caching and error responses on the async stack. '''
+
+@override_settings(IDS_RESPONSE_CACHE_ENABLED=False)
+class AsyncViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bulk_ingest(load_sample(300))
+        cls.first = NetworkTraffic.objects.order_by('pk').first()
+
+    def setUp(self):
+        self.client = APIClient()
+
+    async def assertSameAsSync(self, async_url, sync_url):
+        response = await self.async_client.get(async_url)
+        expected = await sync_to_async(self.client.get)(sync_url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, expected.status_code)
+        data, expected = json.loads(response.content), json.loads(expected.content)
+        for link in ('next', 'previous'):
+            if link in expected:
+                # Same cursor, different path
+                self.assertEqual(bool(data.pop(link)), bool(expected.pop(link)))
+        self.assertEqual(data, expected)
+        return data
+
+    async def test_endpoints_match_sync_views(self):
+        """Test each async endpoint against the sync view with the same query."""
+        pairs = [
+            ('/api/async/traffic?page_size=50', '/api/traffic?page_size=50'),
+            (f'/api/async/traffic/{self.first.pk}/', f'/api/traffic/{self.first.pk}/'),
+            ('/api/async/traffic/99999/', '/api/traffic/99999/'),
+            ('/api/async/traffic/anomalous/?threshold=5000', '/api/traffic/anomalous/?threshold=5000'),
+            ('/api/async/traffic/anomalous/?method=zscore', '/api/traffic/anomalous/?method=zscore'),
+            ('/api/async/traffic/anomalous/?method=magic', '/api/traffic/anomalous/?method=magic'),
+            ('/api/async/traffic/anomalous/?threshold=abc', '/api/traffic/anomalous/?threshold=abc'),
+            ('/api/async/traffic/complex-filters/?src_bytes_min=abc', '/traffic/complex-filters/?src_bytes_min=abc'),
+            ('/api/async/traffic/filter/service/http/', '/api/traffic/filter/service/http/'),
+            ('/api/async/traffic/filter/attack/?attack=no', '/api/traffic/filter/attack/?attack=no'),
+            ('/api/async/traffic/filter/attack/?attack=maybe', '/api/traffic/filter/attack/?attack=maybe'),
+            ('/api/async/traffic/complex-filters/?protocol_type=TCP&src_bytes_min=100', '/traffic/complex-filters/?protocol_type=TCP&src_bytes_min=100'),
+        ]
+        for async_url, sync_url in pairs:
+            data = await self.assertSameAsSync(async_url, sync_url)
+            self.assertTrue(data)
+
+    async def test_cursors_walk_every_record(self):
+        """Test that following async next links visits every record once."""
+        seen, url = [], '/api/async/traffic?page_size=70'
+        while url:
+            page = json.loads((await self.async_client.get(url)).content)
+            seen.extend(record['id'] for record in page['results'])
+            url = page['next']
+        self.assertEqual(seen, [pk async for pk in NetworkTraffic.objects.order_by('pk').values_list('pk', flat=True)])
+        response = await self.async_client.get('/api/async/traffic', {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_stream_matches_sync_stream(self):
+        """Test that the async NDJSON dump equals the sync one."""
+        response = await self.async_client.get('/api/async/traffic', {'stream': 'ndjson'})
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        expected = await sync_to_async(lambda: b''.join(self.client.get('/api/traffic', {'stream': 'ndjson'}).streaming_content))()
+        self.assertEqual(body, expected)
+        self.assertEqual(body.count(b'\n'), 300)
+
+    async def test_responses_are_cached(self):
+        """Test that async responses are cached until the dataset version changes."""
+        with self.settings(IDS_RESPONSE_CACHE_ENABLED=True):
+            await sync_to_async(caches['traffic'].clear)()
+            first = await self.async_client.get('/api/async/traffic/filter/service/http/')
+            second = await self.async_client.get('/api/async/traffic/filter/service/http/')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.content, second.content)
+
+    async def test_cached_formats_follow_accept(self):
+        """Test that a cached MessagePack response is not served to a JSON client."""
+        url = '/api/async/traffic/anomalous/?method=zscore'
+        with self.settings(IDS_RESPONSE_CACHE_ENABLED=True):
+            await sync_to_async(caches['traffic'].clear)()
+            packed = await self.async_client.get(url, headers={'accept': 'application/msgpack'})
+            plain = await self.async_client.get(url, headers={'accept': 'application/json'})
+            again = await self.async_client.get(url, headers={'accept': 'application/msgpack'})
+        self.assertEqual((packed['X-Cache'], plain['X-Cache'], again['X-Cache']), ('MISS', 'MISS', 'HIT'))
+        self.assertEqual((packed['Content-Type'], plain['Content-Type']), ('application/msgpack', 'application/json'))
+        self.assertEqual(msgpack.unpackb(again.content, raw=False), json.loads(plain.content))
+
+
+''' TEST COLUMNAR ENGINE
+1. Test that engine=columnar selects the same records and statistics as the SQL queries.
+2. Verify that the snapshot appends inserts and reloads after updates and deletes. '''
+
+@override_settings(IDS_RESPONSE_CACHE_ENABLED=False)
+class ColumnarEngineTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bulk_ingest(load_sample(300))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {
+            'duration': 0, 'protocol_type': 'tcp', 'service': 'http', 'flag': 'SF',
+            'src_bytes': 200, 'dst_bytes': 4000, 'land': False, 'wrong_fragment': 0, 'urgent': 0,
+            'hot': 0, 'logged_in': True, 'num_compromised': 0, 'count': 1, 'srv_count': 1,
+            'serror_rate': 0.0, 'rerror_rate': 0.0, 'same_srv_rate': 1.0, 'diff_srv_rate': 0.0,
+            'srv_diff_host_rate': 0.0, 'dst_host_count': 10, 'dst_host_srv_count': 10,
+            'dst_host_same_srv_rate': 1.0, 'dst_host_diff_srv_rate': 0.0, 'attack': False,
+        }
+        columnar._snapshot.__init__()  # Ids are reused once a test's transaction is rolled back
+
+    def walk(self, url, **params):
+        # Follow the next links and return every record seen
+        records, params = [], {'page_size': 40, **params}
+        while url:
+            page = self.client.get(url, params).data
+            records.extend(page['results'])
+            url, params = page['next'], {}
+        return records
+
+    def test_filters_match_orm(self):
+        """Test complex filters and byte thresholds against the ORM engine, page by page."""
+        queries = [
+            ('/traffic/complex-filters/', {'protocol_type': 'TCP', 'src_bytes_min': '100'}),
+            ('/traffic/complex-filters/', {'service': 'HTTP', 'flag': 'sf', 'attack': 'no'}),
+            ('/traffic/complex-filters/', {'dst_bytes_max': '500', 'serror_rate_min': '0.5'}),
+            ('/traffic/complex-filters/', {'land': 'no', 'attack': 'yes', 'src_bytes_max': '1000'}),
+            ('/api/traffic/anomalous/', {'threshold': '5000'}),
+        ]
+        for url, params in queries:
+            expected = self.walk(url, **params)
+            self.assertTrue(expected)
+            self.assertEqual(self.walk(url, engine='columnar', **params), expected)
+
+        page = self.client.get('/traffic/complex-filters/', {'engine': 'columnar', 'page_size': 40}).data
+        previous = self.client.get(self.client.get(page['next']).data['previous']).data
+        self.assertEqual(previous['results'], page['results'])
+
+    def test_stats_match_summary(self):
+        """Test that columnar statistics agree with the summary table on every exact figure."""
+        params = {'group_by': 'service,protocol_type'}
+        expected = self.client.get('/api/traffic/stats/', params).data['results']
+        results = self.client.get('/api/traffic/stats/', {**params, 'engine': 'columnar'}).data['results']
+        self.assertEqual(len(results), len(expected))
+        for group, other in zip(results, expected):
+            for key in ('service', 'protocol_type', 'records', 'attacks', 'attack_ratio'):
+                self.assertEqual(group[key], other[key])
+            for field in ('src_bytes', 'dst_bytes'):
+                self.assertEqual(group[field]['sum'], other[field]['sum'])
+                self.assertEqual(group[field]['mean'], other[field]['mean'])
+
+    def test_exact_percentiles(self):
+        """Test that the snapshot reports exact nearest-rank percentiles."""
+        bulk_ingest(NetworkTraffic(**{**self.payload, 'service': 'synthetic', 'dst_bytes': value}) for value in range(1, 1001))
+        snapshot = ColumnarSnapshot()
+        snapshot.refresh()
+        synthetic = next(group for group in snapshot.summarize(('service',)) if group['service'] == 'synthetic')
+        dst_bytes = synthetic['dst_bytes']
+        self.assertEqual((dst_bytes['p50'], dst_bytes['p90'], dst_bytes['p99']), (500, 900, 990))
+
+    def test_refresh_appends_inserts_and_reloads_rewrites(self):
+        """Test that inserts are read incrementally while updates and deletes reload the table."""
+        snapshot = ColumnarSnapshot()
+        self.assertEqual(snapshot.refresh(), 300)
+        self.assertEqual(snapshot.refresh(), 0)
+
+        first = NetworkTraffic.objects.order_by('pk').first()
+        bulk_ingest([NetworkTraffic(**{**self.payload, 'service': 'synthetic'}) for _ in range(10)])
+        self.assertEqual(snapshot.refresh(), 10)
+        self.assertEqual(len(snapshot.select(snapshot.mask([('iexact', 'service', 'synthetic')]))), 10)
+
+        payload = {**NetworkTrafficSerializer(first).data, 'src_bytes': 123456789}
+        self.client.put(f'/api/traffic/update/{first.pk}/', payload, format='json')
+        self.assertEqual(snapshot.refresh(), 310)
+        self.assertEqual(snapshot.select(snapshot.range_mask('src_bytes', 123456789, 123456789)).tolist(), [first.pk])
+
+        self.client.delete(f'/api/traffic/delete/{first.pk}/')
+        self.assertEqual(snapshot.refresh(), 309)
+        self.assertNotIn(first.pk, snapshot.ids)
+
+    def test_invalid_engine_and_stream(self):
+        """Test that unknown engines, bad thresholds and streaming from the snapshot are rejected."""
+        for url in ('/traffic/complex-filters/', '/api/traffic/anomalous/', '/api/traffic/stats/'):
+            self.assertEqual(self.client.get(url, {'engine': 'magic'}).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/traffic/anomalous/', {'engine': 'columnar', 'threshold': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for engine in ('orm', 'columnar'):
+            for name, value in (('src_bytes_min', 'abc'), ('dst_bytes_max', '1.5'), ('serror_rate_min', 'high'), ('serror_rate_max', 'nan')):
+                response = self.client.get('/traffic/complex-filters/', {'engine': engine, name: value})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, (engine, name))
+                self.assertIn(name, response.data['error'])
+        response = self.client.get('/traffic/complex-filters/', {'engine': 'columnar', 'stream': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+''' TEST COLUMN FILES
+1. Test that export_traffic / import_traffic round-trip every field, NULLs included.
+2. Verify the file is smaller than the CSV and that columns are read from the file without copying. '''
+
+class ColumnFileTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'traffic.ntcol')
+        self.csv_path = SAMPLE_CSV
+        bulk_ingest(load_sample(2000))
+        NetworkTraffic.objects.filter(pk__in=NetworkTraffic.objects.order_by('pk').values('pk')[:3]).update(attack_score=0.25)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def stored_rows(self):
+        return list(NetworkTraffic.objects.order_by('pk').values_list(*COLUMN_FILE_FIELDS))
+
+    def test_round_trip(self):
+        """Test that importing an export restores every value of every record, compressed or not."""
+        expected = self.stored_rows()
+        for options in ([], ['--compress']):
+            call_command('export_traffic', self.path, *options, stdout=StringIO())
+            NetworkTraffic.objects.all().delete()
+            call_command('import_traffic', self.path, '--chunk-size', '700', stdout=StringIO())
+            self.assertEqual(self.stored_rows()[-2000:], expected)
+            self.assertEqual(NetworkTraffic.objects.filter(attack_score__isnull=True).count(), 1997)
+
+    def test_file_is_compact(self):
+        """Test that the column file is a fraction of the size of the same rows as CSV."""
+        call_command('export_traffic', self.path, stdout=StringIO())
+        with open(self.csv_path) as source:
+            csv_size = sum(len(line) for _, line in zip(range(2001), source))
+        # The same rows as CSV carry their observation times too, as load_csv accepts them
+        csv_size += sum(len(',' + value.isoformat()) for value in NetworkTraffic.objects.values_list('observed_at', flat=True))
+        self.assertLess(os.path.getsize(self.path) * 2, csv_size)
+        call_command('export_traffic', self.path, '--compress', stdout=StringIO())
+        self.assertLess(os.path.getsize(self.path) * 4, csv_size)
+
+    def test_columns_are_memory_mapped(self):
+        """Test that stored columns are views into the mapped file and decode to the stored values."""
+        call_command('export_traffic', self.path, stdout=StringIO())
+        source = ColumnFile(self.path)
+        self.assertEqual(len(source), 2000)
+        self.assertTrue(np.shares_memory(source.codes('src_bytes'), source.map))
+        self.assertEqual(source.column('service').tolist(), list(NetworkTraffic.objects.order_by('pk').values_list('service', flat=True)))
+        self.assertEqual(source.codes('service').dtype.itemsize, 1)
+
+    def test_rejects_other_files(self):
+        """Test that importing a file that is not a column file fails without writing anything."""
+        NetworkTraffic.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('import_traffic', self.csv_path, stdout=StringIO())
+        self.assertFalse(NetworkTraffic.objects.exists())
+
+
+''' TEST BENCHMARK SUITE
+1. Test that synthetic traffic is reproducible and follows the bundled dataset.
+2. Verify that the benchmark command runs scenarios at several sizes and writes JSON results. '''
+
+class BenchmarkSuiteTest(TestCase):
+    def test_synthetic_traffic_follows_sample(self):
+        """Test that a seed always gives the same rows, with the sample's category and label mix."""
+        first = next(generate_traffic(20000, seed=7))
+        again = next(generate_traffic(20000, seed=7))
+        other = next(generate_traffic(20000, seed=8))
+        self.assertTrue(all(np.array_equal(first[name], again[name]) for name in first))
+        self.assertFalse(np.array_equal(first['src_bytes'], other['src_bytes']))
+
+        sample = sample_columns()
+        self.assertAlmostEqual(first['attack'].mean(), sample['attack'].mean(), delta=0.02)
+        self.assertAlmostEqual((first['protocol_type'] == 'tcp').mean(), (sample['protocol_type'] == 'tcp').mean(), delta=0.02)
+        self.assertLessEqual(first['dst_host_count'].max(), 255)
+        self.assertEqual(sum(len(chunk['attack']) for chunk in generate_traffic(250, chunk_size=100)), 250)
+
+    def test_suite_writes_json_results(self):
+        """Test every scenario of the suite at two sizes, rolled back, with a JSON report."""
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'results.json')
+        try:
+            call_command('benchmark', 'ingest', 'endpoints', 'serializer', '--rows', '60', '30', '--repeat', '1', '--output', path, stdout=StringIO())
+            with open(path) as file:
+                report = json.load(file)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([(result['scenario'], result['rows']) for result in report['results']], [
+            ('ingest', 30), ('ingest', 60), ('endpoints', 30), ('endpoints', 60), ('serializer', 30), ('serializer', 60),
+        ])
+        self.assertIn('commit', report)
+        endpoints = report['results'][3]['metrics']
+        self.assertGreater(endpoints['traffic-list_bytes'], 0)
+        self.assertIn('traffic-stats_peak_kb', endpoints)
+        self.assertGreater(report['results'][0]['metrics']['rows_per_sec'], 0)
+        self.assertFalse(NetworkTraffic.objects.exists())  # Benchmark rows are rolled back
+
+
+''' TEST METRICS
+1. Test that the metrics middleware records latency, queries, rows and bytes per URL name.
+2. Verify the Prometheus endpoint, async views and the slow request log. '''
+
+@override_settings(IDS_RESPONSE_CACHE_ENABLED=False)
+class MetricsMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bulk_ingest(load_sample(120))
+
+    def setUp(self):
+        self.client = APIClient()
+        metrics.reset()
+
+    def test_requests_are_recorded_by_url_name(self):
+        """Test that a list request adds its queries, rows and bytes to its route."""
+        response = self.client.get('/api/traffic', {'page_size': 50}, HTTP_ACCEPT='application/json')
+        self.client.get('/api/traffic/99999/', HTTP_ACCEPT='application/json')
+        totals = metrics.snapshot()['traffic-list']
+        self.assertEqual((totals.requests, totals.errors, totals.rows), (1, 0, 50))
+        self.assertGreaterEqual(totals.queries, 1)
+        self.assertEqual(totals.bytes, len(response.content))
+        self.assertEqual(sum(totals.buckets), 1)
+        self.assertGreater(totals.serialization_seconds, 0)
+        self.assertEqual(metrics.snapshot()['traffic-detail'].requests, 1)
+
+    def test_prometheus_endpoint(self):
+        """Test that /metrics serves cumulative histograms and counters in text format."""
+        for _ in range(3):
+            self.client.get('/api/traffic', {'page_size': 10}, HTTP_ACCEPT='application/json')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE ids_request_duration_seconds histogram', text)
+        self.assertIn('ids_request_duration_seconds_bucket{route="traffic-list",le="+Inf"} 3', text)
+        self.assertIn('ids_request_duration_seconds_count{route="traffic-list"} 3', text)
+        self.assertIn('ids_rows_returned_total{route="traffic-list"} 30', text)
+        buckets = [int(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith('ids_request_duration_seconds_bucket{route="traffic-list"')]
+        self.assertEqual(buckets, sorted(buckets))
+
+    async def test_async_views_and_streams_are_recorded(self):
+        """Test that async views are measured and streamed bodies are counted in bytes once sent."""
+        await self.async_client.get('/api/async/traffic', {'page_size': 20})
+        response = await self.async_client.get('/api/async/traffic', {'stream': 'ndjson'})
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        totals = metrics.snapshot()['async-traffic-list']
+        self.assertEqual((totals.requests, totals.rows), (2, 20))  # Streamed rows are encoded after the request
+        self.assertGreater(totals.bytes, len(body))
+
+    def test_slow_request_log(self):
+        """Test that requests over IDS_SLOW_REQUEST_SECONDS are logged with their SQL."""
+        with self.settings(IDS_SLOW_REQUEST_SECONDS=0), self.assertLogs('network_traffic.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/traffic/filter/service/http/', HTTP_ACCEPT='application/json')
+        self.assertIn('traffic-filter-service', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+        with self.assertNoLogs('network_traffic.slow_requests'):
+            self.client.get('/api/traffic/filter/service/http/', HTTP_ACCEPT='application/json')
+
+    def test_queries_on_every_alias(self):
+        """Test that queries on other aliases, such as the read-only replica, are counted once each."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        replica = SQLiteWrapper({**connection.settings_dict, 'NAME': os.path.join(directory, 'replica.sqlite3')}, alias='replica')
+        self.addCleanup(replica.close)
+        request_metrics = metrics.RequestMetrics(capture_sql=True)
+        with mock.patch.object(metrics.connections, 'all', return_value=[connection, replica, connection]):
+            with metrics.count_queries(request_metrics):
+                NetworkTraffic.objects.count()
+                with replica.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+        self.assertEqual(request_metrics.queries, 2)
+        self.assertEqual(request_metrics.statements[1][0], 'SELECT 1')
+
+
+''' TEST SPARSE FIELDSETS
+1. Test that ?fields= narrows both the SELECT and every record on every read endpoint.
+2. Verify that ?count=true returns only the number of matching records. '''
+
+@override_settings(IDS_RESPONSE_CACHE_ENABLED=False)
+class SparseFieldsetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bulk_ingest(load_sample(300))
+
+    def setUp(self):
+        self.client = APIClient()
+        columnar._snapshot.__init__()
+
+    def get(self, url, params):
+        response = self.client.get(url, params, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()
+
+    def test_fields_narrow_query_and_records(self):
+        """Test that only the requested columns (and id) are selected and returned."""
+        full = self.get('/api/traffic', {'page_size': 50})['results']
+        with CaptureQueriesContext(connection) as queries:
+            narrow = self.get('/api/traffic', {'page_size': 50, 'fields': 'attack, service,src_bytes'})['results']
+        self.assertEqual(narrow, [{name: record[name] for name in ('id', 'service', 'src_bytes', 'attack')} for record in full])
+        select = queries.captured_queries[-1]['sql']
+        self.assertIn('"src_bytes"', select)
+        self.assertNotIn('"dst_host_srv_count"', select)
+
+        first = full[0]['id']
+        requests = [
+            (f'/api/traffic/{first}/', {}),
+            ('/api/traffic/anomalous/', {}),
+            ('/api/traffic/anomalous/', {'engine': 'columnar'}),
+            ('/api/traffic/anomalous/', {'method': 'zscore', 'min_score': 0}),
+            ('/api/traffic/filter/service/http/', {}),
+            ('/api/traffic/filter/attack/', {'attack': 'no'}),
+            ('/traffic/complex-filters/', {'protocol_type': 'tcp'}),
+        ]
+        for url, params in requests:
+            with self.subTest(url=url, params=params):
+                data = self.get(url, {**params, 'fields': 'service'})
+                records = data['results'] if 'results' in data else [data]
+                self.assertTrue(records)
+                extra = {'anomaly_score'} if 'method' in params else set()
+                self.assertTrue(all(set(record) == {'id', 'service'} | extra for record in records))
+
+        stream = self.client.get('/api/traffic', {'stream': 'ndjson', 'fields': 'flag'})
+        lines = b''.join(stream.streaming_content).splitlines()
+        self.assertEqual(len(lines), 300)
+        self.assertEqual(set(json.loads(lines[0])), {'id', 'flag'})
+
+    def test_count_only(self):
+        """Test that count=true returns COUNT(*) without rows on the SQL and columnar engines."""
+        expected = NetworkTraffic.objects.filter(service='http').count()
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get('/api/traffic/filter/service/http/', {'count': 'true'})
+        self.assertEqual(data, {'count': expected})
+        self.assertIn('COUNT(*)', queries.captured_queries[-1]['sql'])
+        self.assertEqual(self.get('/api/traffic', {'count': '1'}), {'count': 300})
+        tcp = NetworkTraffic.objects.filter(protocol_type='tcp').count()
+        self.assertEqual(self.get('/traffic/complex-filters/', {'protocol_type': 'TCP', 'count': 'true'}), {'count': tcp})
+        self.assertEqual(self.get('/traffic/complex-filters/', {'protocol_type': 'TCP', 'count': 'true', 'engine': 'columnar'}), {'count': tcp})
+        scored = self.get('/api/traffic/anomalous/', {'method': 'zscore', 'min_score': 2, 'page_size': 1000})
+        self.assertEqual(self.get('/api/traffic/anomalous/', {'method': 'zscore', 'min_score': 2, 'count': 'true'}), {'count': len(scored['results'])})
+
+    async def test_async_fields_and_count(self):
+        """Test that the async endpoints accept the same fields and count parameters."""
+        response = await self.async_client.get('/api/async/traffic/filter/service/http/', {'fields': 'src_bytes,dst_bytes'})
+        records = json.loads(response.content)['results']
+        self.assertEqual(set(records[0]), {'id', 'src_bytes', 'dst_bytes'})
+        response = await self.async_client.get('/api/async/traffic', {'count': 'true'})
+        self.assertEqual(json.loads(response.content), {'count': 300})
+
+    def test_unknown_fields_are_rejected(self):
+        """Test that misspelled field names are reported instead of silently ignored."""
+        response = self.client.get('/api/traffic', {'fields': 'service,bytes'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('bytes', response.json()['error'])
+        first = NetworkTraffic.objects.order_by('pk').first().pk
+        self.assertEqual(self.client.get(f'/api/traffic/{first}/', {'fields': 'nope'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+''' TEST TRAFFIC SKETCHES
+1. Test that the count-min and HyperLogLog estimates stay within their documented error bounds.
+2. Test that committed creates, updates and deletes reach the sketches and rolled-back ones do not.
+3. Verify the sketch endpoint and its constant query count, and that failed saves lose nothing. '''
+
+class TrafficSketchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        sketches._pending.take()  # Start every test without changes left over from another
+        self.payload = {
+            'duration': 0, 'protocol_type': 'tcp', 'service': 'http', 'flag': 'SF',
+            'src_bytes': 200, 'dst_bytes': 4000, 'land': False, 'wrong_fragment': 0, 'urgent': 0,
+            'hot': 0, 'logged_in': True, 'num_compromised': 0, 'count': 1, 'srv_count': 1,
+            'serror_rate': 0.0, 'rerror_rate': 0.0, 'same_srv_rate': 1.0, 'diff_srv_rate': 0.0,
+            'srv_diff_host_rate': 0.0, 'dst_host_count': 10, 'dst_host_srv_count': 10,
+            'dst_host_same_srv_rate': 1.0, 'dst_host_diff_srv_rate': 0.0, 'attack': 'yes',
+        }
+
+    def report(self, **params):
+        response = self.client.get('/api/traffic/sketches/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_estimates_match_exact_counts(self):
+        """Test the heavy hitters and distinct count of a CSV load against exact GROUP BY results."""
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_ingest(load_sample(500), chunk_size=64)
+        data = self.report(k=5)
+        attacks = NetworkTraffic.objects.filter(attack=True)
+        services = attacks.values('service').annotate(n=Count('id')).order_by('-n', 'service')
+        hitters = data['heavy_hitters']['attack_services']
+        self.assertEqual(hitters['total'], attacks.count())
+        exact = {row['service']: row['n'] for row in services}
+        for entry in hitters['top']:
+            # Never below the true count, and above it by no more than the stated bound
+            self.assertGreaterEqual(entry['estimate'], exact[entry['value']])
+            self.assertLessEqual(entry['estimate'], exact[entry['value']] + hitters['max_overestimate'])
+        self.assertEqual(hitters['top'][0]['value'], services[0]['service'])
+
+        distinct = NetworkTraffic.objects.values('protocol_type', 'service', 'flag').distinct().count()
+        low, high = data['cardinality']['protocol_service_flag']['interval_95']
+        self.assertTrue(low <= distinct <= high)
+
+    def test_writes_reach_sketches_after_commit(self):
+        """Test that updates and deletes move counts and uncommitted writes are not counted."""
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post('/api/traffic/create/', self.payload, format='json').data['id']
+            self.client.post('/api/traffic/create/', {**self.payload, 'flag': 'REJ'}, format='json')
+        self.assertEqual(self.report()['heavy_hitters']['attack_services']['top'], [{'value': 'http', 'estimate': 2}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/api/traffic/update/{first}/', {**self.payload, 'service': 'ftp'}, format='json')
+        top = self.report()['heavy_hitters']['attack_services']['top']
+        self.assertEqual(top, [{'value': 'ftp', 'estimate': 1}, {'value': 'http', 'estimate': 1}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/traffic/delete/{first}/')
+        self.assertEqual(self.report()['heavy_hitters']['attack_services']['top'], [{'value': 'http', 'estimate': 1}])
+
+        # Without a commit the on_commit hook never runs
+        self.client.post('/api/traffic/create/', self.payload, format='json')
+        self.assertEqual(self.report()['heavy_hitters']['attack_services']['total'], 1)
+
+    def test_flush_threshold_and_rebuild(self):
+        """Test that pending changes are stored once the flush threshold is reached and rebuild agrees."""
+        records = [NetworkTraffic(**{**self.payload, 'attack': True, 'service': f'svc{i % 7}'}) for i in range(70)]
+        with self.settings(IDS_SKETCH_FLUSH_RECORDS=10, IDS_SKETCH_FLUSH_SECONDS=3600):
+            with self.captureOnCommitCallbacks(execute=True):
+                NetworkTraffic.objects.bulk_create(records)
+                sketches.apply(records)
+            self.assertEqual(TrafficSketch.objects.get(name='attack_services').total, 70)
+        incremental = self.report(k=7)
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertEqual(self.report(k=7), incremental)
+        self.assertEqual(sorted(entry['estimate'] for entry in incremental['heavy_hitters']['attack_services']['top']), [10] * 7)
+
+    def test_failed_flush_keeps_changes(self):
+        """Test that reports write nothing and changes whose save fails are saved by the next flush."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/traffic/create/', self.payload, format='json')
+            self.client.post('/api/traffic/create/', self.payload, format='json')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.report()['heavy_hitters']['attack_services']['total'], 2)
+        self.assertFalse(TrafficSketch.objects.exists())
+
+        with mock.patch.object(sketches, '_save', side_effect=sqlite3.OperationalError('database is locked')):
+            with self.assertRaises(sqlite3.OperationalError):
+                sketches.flush()
+        self.assertEqual(self.report()['heavy_hitters']['attack_services']['total'], 2)
+        self.assertTrue(sketches.flush())
+        self.assertEqual(TrafficSketch.objects.get(name='attack_services').total, 2)
+        self.assertEqual(self.report()['heavy_hitters']['attack_services']['top'], [{'value': 'http', 'estimate': 2}])
+
+    @override_settings(IDS_SKETCH_FLUSH_RECORDS=1)
+    def test_failed_save_after_commit(self):
+        """Test that a save failing after a write committed is logged and the write still succeeds."""
+        with mock.patch.object(sketches, '_save', side_effect=sqlite3.OperationalError('database is locked')):
+            with self.assertLogs('network_traffic.sketches', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/traffic/create/', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.report()['heavy_hitters']['attack_services']['total'], 1)  # Still pending
+        self.assertTrue(sketches.flush())
+        self.assertEqual(TrafficSketch.objects.get(name='attack_services').total, 1)
+
+    @override_settings(IDS_SKETCH_BACKGROUND_FLUSH=True, IDS_SKETCH_FLUSH_SECONDS=0.05)
+    def test_background_flush(self):
+        """Test that the background thread saves changes of a process that stopped writing."""
+        saved = threading.Event()
+        with mock.patch.object(sketches, '_save', side_effect=lambda pending: saved.set()):
+            sketches._pending.add({'attack_services': {'http': 1}}, 1)
+            self.assertTrue(saved.wait(5))
+        self.assertIsNone(sketches._pending.take())
+
+    def test_hyperloglog_error(self):
+        """Test the distinct-count error on large sets and exact linear counting on small ones."""
+        for distinct in (100, 50000):
+            hll = sketches.HyperLogLog()
+            hll.update({f'key-{i}': 1 for i in range(distinct)})
+            hll.update({f'key-{i}': 1 for i in range(distinct // 2)})  # Repeats change nothing
+            self.assertAlmostEqual(hll.estimate(), distinct, delta=distinct * 3 * hll.relative_error)
+
+    def test_query_count_is_constant(self):
+        """Test that the endpoint reads the stored sketches in one query, however many records exist."""
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_ingest(NetworkTraffic(**{**self.payload, 'attack': True}) for _ in range(300))
+        sketches.flush()
+        with self.assertNumQueries(1):
+            self.client.get('/api/traffic/sketches/')
+
+    def test_invalid_k(self):
+        """Test that k must be a positive integer up to the number of tracked candidates."""
+        for k in ('0', 'ten', str(sketches.HEAVY_HITTER_CAPACITY + 1)):
+            self.assertEqual(self.client.get('/api/traffic/sketches/', {'k': k}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+''' TEST FEATURE EXTRACTION
+1. Test the window features of a hand-checked connection sequence.
+2. Test the streaming counters against a brute-force recomputation over a synthetic flow log.
+3. Test that extract_features loads a flow log through the bulk ingest path. '''
+
+class FeatureExtractionTest(TestCase):
+    def flow(self, timestamp, host, service, flag):
+        return {
+            'timestamp': timestamp, 'src_host': '10.0.0.1', 'src_port': '40000', 'dst_host': host, 'dst_port': '80',
+            'protocol': 'tcp', 'service': service, 'flag': flag, 'src_bytes': '100', 'dst_bytes': '0',
+            **features.OPTIONAL_COLUMNS,
+        }
+
+    def last_features(self, flows, **options):
+        chunks = list(features.extract(flows, **options))
+        return {name: values[-1] for name, values in chunks[-1][1].items()}
+
+    def test_hand_checked_windows(self):
+        """Test both windows on a short sequence, including expiry from the 2-second window."""
+        flows = [
+            self.flow(0.0, 'A', 'http', 'SF'), self.flow(0.5, 'A', 'http', 'S0'), self.flow(1.0, 'A', 'ftp', 'REJ'),
+            self.flow(1.5, 'B', 'http', 'SF'), self.flow(3.0, 'A', 'http', 'SF'),
+        ]
+        # The last connection's time window holds the ones at 1.0, 1.5 and 3.0 seconds
+        self.assertEqual(self.last_features(flows), {
+            'count': 2, 'srv_count': 2, 'serror_rate': 0.0, 'rerror_rate': 0.5, 'same_srv_rate': 0.5,
+            'diff_srv_rate': 0.5, 'srv_diff_host_rate': 0.5, 'dst_host_count': 4, 'dst_host_srv_count': 3,
+            'dst_host_same_srv_rate': 0.75, 'dst_host_diff_srv_rate': 0.25,
+        })
+        last_two = self.last_features(flows, host_window=2)
+        self.assertEqual((last_two['dst_host_count'], last_two['dst_host_srv_count'], last_two['dst_host_same_srv_rate']), (1, 1, 1.0))
+
+    def test_matches_brute_force(self):
+        """Test every feature of a synthetic flow log against a rescan of both windows."""
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        try:
+            synthetic.write_flow_log(path, 1500, rate=300)
+            with open(path) as file:
+                flows = list(features.read_flows(file))
+        finally:
+            os.remove(path)
+        def rate(part, whole):
+            return float((Decimal(part) / whole).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+        computed = {}
+        for chunk, values in features.extract(flows, chunk_size=400):
+            for name, column in values.items():
+                computed.setdefault(name, []).extend(column.tolist())
+
+        for index in range(0, len(flows), 37):
+            flow = flows[index]
+            recent = [other for other in flows[:index + 1] if other['timestamp'] >= flow['timestamp'] - 2]
+            same_host = [other for other in recent if other['dst_host'] == flow['dst_host']]
+            same_srv = [other for other in recent if other['service'] == flow['service']]
+            last = [other for other in flows[max(0, index - 99):index + 1] if other['dst_host'] == flow['dst_host']]
+            both = [other for other in last if other['service'] == flow['service']]
+            expected = {
+                'count': len(same_host),
+                'srv_count': len(same_srv),
+                'serror_rate': rate(sum(other['flag'] in features.SERROR_FLAGS for other in same_host), len(same_host)),
+                'same_srv_rate': rate(sum(other['service'] == flow['service'] for other in same_host), len(same_host)),
+                'srv_diff_host_rate': rate(sum(other['dst_host'] != flow['dst_host'] for other in same_srv), len(same_srv)),
+                'dst_host_count': len(last),
+                'dst_host_srv_count': len(both),
+            }
+            self.assertEqual({name: computed[name][index] for name in expected}, expected)
+
+    def test_command_loads_flow_log(self):
+        """Test the command's records, timestamps and derived fields, and its missing-column error."""
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        try:
+            synthetic.write_flow_log(path, 300)
+            call_command('extract_features', path, '--chunk-size', '64', stdout=StringIO())
+            with open(path) as file:
+                flows = list(features.read_flows(file))
+            with open(path, 'w') as file:
+                file.write('timestamp,dst_host\n1,a\n')
+            with self.assertRaisesMessage(CommandError, 'missing the column(s): src_host'):
+                call_command('extract_features', path, stdout=StringIO())
+        finally:
+            os.remove(path)
+        self.assertEqual(NetworkTraffic.objects.count(), 300)
+        first = NetworkTraffic.objects.order_by('pk').first()
+        self.assertEqual(first.observed_at.timestamp(), round(flows[0]['timestamp'], 6))
+        self.assertEqual((first.count, first.srv_count, first.dst_host_count), (1, 1, 1))
+        self.assertEqual(NetworkTraffic.objects.filter(attack=True).count(), sum(flow['attack'] == 'yes' for flow in flows))
+        self.assertEqual(TrafficSummary.objects.aggregate(total=Sum('records'))['total'], 300)  # Derived data kept in step
+
+
+''' TEST DETECTION RULES
+1. Test that rule expressions are validated and unsafe syntax is rejected.
+2. Test that the compiled rules match exactly what the equivalent ORM queries return, on every write path.
+3. Verify hit counts, the constant query count per batch and the matches endpoint. '''
+
+class DetectionRuleTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {
+            'duration': 0, 'protocol_type': 'tcp', 'service': 'http', 'flag': 'SF',
+            'src_bytes': 200, 'dst_bytes': 4000, 'land': False, 'wrong_fragment': 0, 'urgent': 0,
+            'hot': 0, 'logged_in': True, 'num_compromised': 0, 'count': 1, 'srv_count': 1,
+            'serror_rate': 0.0, 'rerror_rate': 0.0, 'same_srv_rate': 1.0, 'diff_srv_rate': 0.0,
+            'srv_diff_host_rate': 0.0, 'dst_host_count': 10, 'dst_host_srv_count': 10,
+            'dst_host_same_srv_rate': 1.0, 'dst_host_diff_srv_rate': 0.0, 'attack': 'no',
+        }
+
+    def create_rule(self, name, expression, **extra):
+        response = self.client.post('/api/rules/', {'name': name, 'expression': expression, **extra}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data['id']
+
+    def matched(self, rule):
+        return set(RuleMatch.objects.filter(rule_id=rule).values_list('traffic_id', flat=True))
+
+    def test_invalid_expressions_are_rejected(self):
+        """Test that calls, attributes, unknown fields and mismatched types never compile."""
+        for expression in (
+            "__import__('os').system('true')", 'service.upper() == "HTTP"', 'packets > 3', 'count + 1',
+            "service == 5", "service > 'a'", 'count > ', 'logged_in == 1', 'count in src_bytes', 'x' * 2000,
+            'src_bytes > ' + '9' * 400, 'count in (1, ' + '9' * 400 + ')', 'duration < 1e999',
+        ):
+            with self.assertRaises(RuleError, msg=expression):
+                compile_rule(expression)
+        for expression in ('lower(service) == "http"', 'src_bytes > ' + '9' * 400):
+            response = self.client.post('/api/rules/', {'name': 'bad', 'expression': expression}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('expression', response.data)
+        self.assertFalse(DetectionRule.objects.exists())
+
+    def test_matches_agree_with_orm_queries(self):
+        """Test three rules over a CSV load against the same conditions written as ORM filters."""
+        traffic = NetworkTraffic.objects.annotate(errors=F('serror_rate') + F('rerror_rate'))
+        rules = {
+            self.create_rule('syn flood', "flag == 'S0' and count > 100"): traffic.filter(flag='S0', count__gt=100),
+            self.create_rule('exfiltration', "service in ('http', 'ftp_data') and not logged_in or src_bytes >= 10000"):
+                traffic.filter(Q(service__in=('http', 'ftp_data'), logged_in=False) | Q(src_bytes__gte=10000)),
+            self.create_rule('error ratio', '0.5 < serror_rate + rerror_rate <= 1 and protocol_type != "udp"'):
+                traffic.filter(errors__gt=0.5, errors__lte=1).exclude(protocol_type='udp'),
+        }
+        self.create_rule('disabled', 'count >= 0', enabled=False)
+        bulk_ingest(load_sample(500), chunk_size=64)
+        for rule, queryset in rules.items():
+            expected = set(queryset.values_list('pk', flat=True))
+            self.assertEqual(self.matched(rule), expected)
+            stored = DetectionRule.objects.get(pk=rule)
+            self.assertEqual((stored.hits, stored.evaluated), (len(expected), 500))
+            self.assertGreater(stored.evaluation_seconds, 0)
+        self.assertTrue(all(self.matched(rule) for rule in rules))
+        self.assertFalse(DetectionRule.objects.get(name='disabled').matches.exists())
+
+    def test_write_paths_keep_matches_current(self):
+        """Test matches after creating, updating and deleting records, and after editing the rule."""
+        rule = self.create_rule('big upload', 'src_bytes > 1000')
+        small = self.client.post('/api/traffic/create/', self.payload, format='json').data['id']
+        big = self.client.post('/api/traffic/batch/', [{**self.payload, 'src_bytes': 5000}], format='json').data['ids'][0]
+        self.assertEqual(self.matched(rule), {big})
+
+        self.client.put(f'/api/traffic/update/{small}/', {**self.payload, 'src_bytes': 3000}, format='json')
+        self.client.put('/api/traffic/batch/', [{**self.payload, 'id': big, 'src_bytes': 10}], format='json')
+        self.assertEqual(self.matched(rule), {small})
+        self.client.delete(f'/api/traffic/delete/{small}/')
+        self.assertEqual(self.matched(rule), set())
+
+        self.client.patch(f'/api/rules/{rule}/', {'expression': 'src_bytes < 100'}, format='json')
+        newer = self.client.post('/api/traffic/create/', self.payload | {'src_bytes': 5}, format='json').data['id']
+        self.assertEqual(self.matched(rule), {newer})
+        self.assertEqual(self.client.get(f'/api/rules/{rule}/').data['hits'], 3)  # Every match ever recorded
+
+    def test_query_count_does_not_grow_with_rules(self):
+        """Test that a batch costs the same queries whether one rule runs or ten (with few matches)."""
+        bulk_ingest(NetworkTraffic(**{**self.payload, 'attack': False, 'count': value}) for value in range(200))
+        records = list(NetworkTraffic.objects.all())
+        self.create_rule('rule 0', 'count >= 195')
+        with CaptureQueriesContext(connection) as one_rule:
+            evaluate_rules(records)
+        for number in range(1, 10):
+            self.create_rule(f'rule {number}', f'count >= {190 + number} and service == "http"')
+        RuleMatch.objects.all().delete()  # Evaluate the same records again
+        with CaptureQueriesContext(connection) as ten_rules:
+            hits = evaluate_rules(records)
+        self.assertEqual(len(ten_rules), len(one_rule))
+        self.assertEqual(sorted(hits.values()), sorted([5, *(10 - number for number in range(1, 10))]))
+
+    def test_matches_endpoint(self):
+        """Test paging and counting a rule's matched records, and the 404 for a missing rule."""
+        rule = self.create_rule('telnet', "service == 'telnet'")
+        bulk_ingest(NetworkTraffic(**{**self.payload, 'attack': False, 'service': service}) for service in ['telnet', 'http'] * 30)
+        self.assertEqual(self.client.get(f'/api/rules/{rule}/matches/', {'count': 'true'}).data, {'count': 30})
+        page = self.client.get(f'/api/rules/{rule}/matches/', {'page_size': 20, 'fields': 'service'}).data
+        self.assertEqual({record['service'] for record in page['results']}, {'telnet'})
+        self.assertEqual(len(page['results']), 20)
+        self.assertEqual(self.client.get('/api/rules/999/matches/').status_code, status.HTTP_404_NOT_FOUND)
+        listed = self.client.get('/api/rules/').data[0]
+        self.assertEqual((listed['hits'], listed['evaluated']), (30, 60))
+        self.assertIsNotNone(listed['evaluation_us_per_record'])
+
+
+''' TEST JOB QUEUE
+1. Test that submitted ingest and export jobs run in a worker and report their progress through the API.
+2. Test that queued and running jobs can be cancelled, and that failures are recorded without stopping the worker.
+3. Verify that file paths outside the job directory and bad parameters are rejected, and that per-kind limits hold. '''
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.directory = tempfile.mkdtemp()
+        self.override = override_settings(IDS_JOB_DIR=self.directory, IDS_JOB_LIMITS={})
+        self.override.enable()
+        with open(SAMPLE_CSV) as source:
+            lines = [line for _, line in zip(range(1201), source)]  # The header and 1200 rows
+        with open(os.path.join(self.directory, 'traffic.csv'), 'w') as target:
+            target.writelines(lines)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.directory)
+
+    def register(self, name, handler):
+        jobs.job_kind(name, lambda parameters: {})(handler)
+        self.addCleanup(jobs.JOB_KINDS.pop, name)
+
+    def run_worker(self):
+        finished = []
+        jobs.Worker(poll=0.01).run(burst=True, on_finish=finished.append)
+        return finished
+
+    def test_ingest_and_export_jobs(self):
+        """Test that jobs submitted through the API run to completion with their progress recorded."""
+        response = self.client.post('/api/jobs/', {'kind': 'ingest', 'parameters': {'path': 'traffic.csv', 'chunk_size': 500}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED, response.data)
+        self.assertEqual(response.data['status'], Job.QUEUED)
+        self.assertEqual(response['Location'], f"/api/jobs/{response.data['id']}/")
+        self.client.post('/api/jobs/', {'kind': 'export', 'parameters': {'path': 'traffic.ntcol'}}, format='json')
+        self.assertEqual([job.status for job in self.run_worker()], [Job.SUCCEEDED, Job.SUCCEEDED])
+
+        job = self.client.get(f"/api/jobs/{response.data['id']}/").data
+        self.assertEqual((job['done'], job['total'], job['percent'], job['result']), (1200, 1200, 100.0, {'rows': 1200}))
+        self.assertEqual(NetworkTraffic.objects.count(), 1200)
+        self.assertEqual(ColumnFile(os.path.join(self.directory, 'traffic.ntcol')).rows, 1200)
+        self.assertEqual(len(self.client.get('/api/jobs/?status=succeeded').data), 2)
+        self.assertEqual(self.client.get('/api/jobs/?status=queued').data, [])
+
+    def test_cancel(self):
+        """Test that a queued job never starts and a running job stops at its next progress report."""
+        steps = []
+
+        def count_steps(context):
+            for step in range(10):
+                if step == 3:
+                    jobs.cancel(context.job)  # As if requested through the API meanwhile
+                context.progress(step, 10)
+                steps.append(step)
+        self.register('steps', count_steps)
+
+        queued = jobs.submit('rebuild')
+        response = self.client.post(f'/api/jobs/{queued.pk}/cancel/')
+        self.assertEqual((response.status_code, response.data['status']), (status.HTTP_202_ACCEPTED, Job.CANCELLED))
+        self.assertEqual(self.client.post(f'/api/jobs/{queued.pk}/cancel/').status_code, status.HTTP_409_CONFLICT)
+
+        running = jobs.submit('steps')
+        self.assertEqual([job.pk for job in self.run_worker()], [running.pk])
+        running.refresh_from_db()
+        self.assertEqual((running.status, running.done, steps), (Job.CANCELLED, 2, [0, 1, 2]))
+        queued.refresh_from_db()
+        self.assertIsNone(queued.started_at)
+
+    def test_failures_are_recorded(self):
+        """Test that a failing job stores its traceback and the worker goes on with the next job."""
+        def fail(context):
+            raise RuntimeError("disk full")
+        self.register('fail', fail)
+        failed, rebuilt = jobs.submit('fail'), jobs.submit('rebuild')
+        self.assertEqual([(job.pk, job.status) for job in self.run_worker()], [(failed.pk, Job.FAILED), (rebuilt.pk, Job.SUCCEEDED)])
+        failed.refresh_from_db()
+        self.assertIn('RuntimeError: disk full', failed.error)
+        self.assertIsNotNone(failed.finished_at)
+
+    def test_invalid_jobs_are_rejected(self):
+        """Test that paths outside the job directory, unknown kinds and bad parameters are refused."""
+        for kind, parameters in (
+            ('ingest', {'path': '../traffic.csv'}), ('ingest', {'path': '/etc/passwd'}), ('ingest', {'path': 'missing.csv'}),
+            ('ingest', {'path': 'traffic.csv', 'format': 'xml'}), ('ingest', {'path': 'traffic.csv', 'chunk_size': 0}),
+            ('export', {'path': os.path.join('..', 'escape.ntcol')}), ('purge', {'older_than': 'soon'}),
+            ('rebuild', {'everything': True}), ('shell', {}), (None, None),
+        ):
+            response = self.client.post('/api/jobs/', {'kind': kind, 'parameters': parameters}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, (kind, parameters))
+        self.assertFalse(Job.objects.exists())
+
+    def test_limits_and_stale_jobs(self):
+        """Test that kinds at their limit are skipped and jobs of dead workers are failed."""
+        ingest = jobs.submit('ingest', {'path': 'traffic.csv'})
+        rebuild = jobs.submit('rebuild')
+        self.assertEqual(jobs.claim('one').pk, ingest.pk)
+        with self.settings(IDS_JOB_LIMITS={'rebuild': 0}):
+            self.assertIsNone(jobs.claim('two'))
+        self.assertEqual(jobs.claim('two').pk, rebuild.pk)
+
+        Job.objects.filter(pk=ingest.pk).update(heartbeat_at=datetime.now(dt_timezone.utc) - timedelta(hours=2))
+        self.assertEqual(jobs.fail_stale(), 1)
+        self.assertEqual(list(Job.objects.order_by('pk').values_list('status', flat=True)), [Job.FAILED, Job.RUNNING])
+
+    @override_settings(IDS_JOB_STALE_SECONDS=0.2)
+    def test_heartbeats_and_stale_outcome(self):
+        """Test that a job reporting no progress keeps beating and a job failed as stale stays failed."""
+        def quiet(context):
+            time.sleep(0.3)
+
+        def failed_meanwhile(context):
+            Job.objects.filter(pk=context.job.pk).update(status=Job.FAILED, error="stale")  # As fail_stale would
+            return {'rows': 1}
+        self.register('quiet', quiet)
+        self.register('failed_meanwhile', failed_meanwhile)
+
+        jobs.submit('quiet')
+        with mock.patch.object(jobs, 'beat') as beat:
+            self.assertEqual(jobs.execute(jobs.claim('one')).status, Job.SUCCEEDED)
+        self.assertGreaterEqual(beat.call_count, 2)
+
+        jobs.submit('failed_meanwhile')
+        job = jobs.execute(jobs.claim('one'))
+        self.assertEqual((job.status, job.error, job.result), (Job.FAILED, "stale", None))
+
+
+''' TEST CONTENT NEGOTIATION
+1. Test that MessagePack and columnar JSON responses carry the same data as the JSON ones.
+2. Test that MessagePack and columnar bodies are accepted by the create and batch endpoints.
+3. Verify that responses above the size threshold are compressed with the best accepted encoding. '''
+
+@override_settings(IDS_RESPONSE_CACHE_ENABLED=False)
+class ContentNegotiationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        bulk_ingest(load_sample(300))
+        self.record = NetworkTrafficSerializer(NetworkTraffic.objects.first()).data
+        self.record = {name: value for name, value in self.record.items() if name not in ('id', 'observed_at', 'attack_score')}
+
+    def test_response_formats(self):
+        """Test that every format decodes to the records of the JSON response."""
+        for url in ('/api/traffic?page_size=50', '/api/traffic/filter/service/http/', '/traffic/complex-filters/?protocol_type=tcp'):
+            expected = self.client.get(url, HTTP_ACCEPT='application/json').json()
+            packed = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+            self.assertEqual(packed['Content-Type'], 'application/msgpack')
+            self.assertEqual(msgpack.unpackb(packed.content, raw=False), expected)
+
+            columns = json.loads(self.client.get(url, HTTP_ACCEPT='application/vnd.ids.columns+json').content)['results']
+            self.assertEqual(list(columns), list(expected['results'][0]))
+            self.assertEqual([dict(zip(columns, values)) for values in zip(*columns.values())], expected['results'])
+        self.assertEqual(msgpack.unpackb(self.client.get('/api/traffic/stats/?format=msgpack').content, raw=False),
+                         self.client.get('/api/traffic/stats/').json())
+        # Single records and errors keep their layout
+        response = self.client.get('/api/traffic/0/', HTTP_ACCEPT='application/vnd.ids.columns+json')
+        self.assertEqual(json.loads(response.content), {'error': 'Record not found'})
+
+    def test_request_bodies(self):
+        """Test that create takes a MessagePack record and batch takes MessagePack and columnar arrays."""
+        response = self.client.post('/api/traffic/create/', msgpack.packb(self.record), content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+        body = msgpack.packb([self.record, {**self.record, 'service': 'ftp'}])
+        response = self.client.post('/api/traffic/batch/', body, content_type='application/msgpack')
+        self.assertEqual((response.status_code, response.data['created']), (status.HTTP_201_CREATED, 2))
+
+        columns = json.dumps({name: [value] * 3 for name, value in self.record.items()})
+        response = self.client.post('/api/traffic/batch/', columns, content_type='application/vnd.ids.columns+json')
+        self.assertEqual((response.status_code, response.data['created']), (status.HTTP_201_CREATED, 3))
+        self.assertEqual(NetworkTraffic.objects.count(), 306)
+
+        for body, content_type in ((b'\xc1', 'application/msgpack'), ('{"service": ["http"], "flag": []}', 'application/vnd.ids.columns+json')):
+            response = self.client.post('/api/traffic/batch/', body, content_type=content_type)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IDS_COMPRESSION_MIN_BYTES=1024)
+    def test_compression(self):
+        """Test that large responses are compressed, small ones are not, and q=0 is honoured."""
+        url = '/api/traffic?page_size=100'
+        plain = self.client.get(url).content
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=1, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain)
+        self.assertLess(len(response.content), len(plain) / 4)
+
+        self.assertFalse(self.client.get('/api/traffic?count=true', HTTP_ACCEPT_ENCODING='gzip').has_header('Content-Encoding'))
+        self.assertFalse(self.client.get(url, HTTP_ACCEPT_ENCODING='identity, gzip;q=0').has_header('Content-Encoding'))
+        streamed = self.client.get('/api/traffic?stream=ndjson', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(streamed['Content-Encoding'], 'gzip')  # Streams are gzipped chunk by chunk
+        self.assertEqual(len(gzip.decompress(b''.join(streamed.streaming_content)).splitlines()), 300)
+
+    @skipUnless(compression.brotli is not None, "Brotli is not installed")
+    def test_brotli(self):
+        """Test that Brotli is preferred when accepted and decodes to the same body."""
+        plain = self.client.get('/api/traffic?page_size=100').content
+        response = self.client.get('/api/traffic?page_size=100', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), plain)
+
+
+''' TEST STARTUP AND INDEX
+1. Test that the index page is served from the metadata read at startup, without queries once warm.
+2. Test that a new superuser shows up on the index page.
+3. Verify that a cold worker loads without pkg_resources and drf_yasg, within the startup budget. '''
+
+# Most seconds a fresh interpreter may take to load the WSGI application and every URL pattern
+STARTUP_BUDGET_SECONDS = 3.0
+
+STARTUP_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = 'smarthome_network_ids.settings'
+from smarthome_network_ids.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}))
+"""
+
+class StartupTest(TestCase):
+    def setUp(self):
+        self.config = apps.get_app_config('network_traffic')
+        self.config.forget_admin_user()  # Earlier tests' users were rolled back without a signal
+
+    def test_index_from_memory(self):
+        """Test that the index shows the versions, requirements and endpoints without querying again."""
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['django_version'], django.get_version())
+        self.assertEqual(response.context['admin_username'], 'Not configured')
+        self.assertIn('/api/traffic/stats/', [endpoint['url'] for endpoint in response.context['api_endpoints']])
+        self.assertTrue(any(line.startswith('Django==') for line in response.context['requirements']))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_new_superuser_is_shown(self):
+        """Test that saving a superuser clears the cached admin name on the index and credentials pages."""
+        self.client.get('/')
+        User.objects.create_superuser('root', 'root@example.com', 'secret')
+        self.assertEqual(self.client.get('/').context['admin_username'], 'root')
+        self.assertEqual(self.client.get('/admin-credentials/').context['admin_username'], 'root')
+
+    def test_cold_start_budget(self):
+        """Test that a fresh worker skips pkg_resources and drf_yasg and starts within the budget."""
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+        startup = json.loads(output.strip().splitlines()[-1])
+        self.assertNotIn('pkg_resources', startup['modules'])
+        self.assertNotIn('drf_yasg', startup['modules'])
+        self.assertLess(startup['seconds'], STARTUP_BUDGET_SECONDS)
+
+
+''' TEST SQLITE PROFILES
+1. Test that the production profile's pragmas are set on new connections, and file pragmas skipped on read-only ones.
+2. Test that the production backend takes the write lock when a transaction begins.
+3. Verify that reads outside transactions go to the read-only alias and everything else to the default one. '''
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite profiles only apply to SQLite databases")
+class SQLiteProfileTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tuned.sqlite3')
+        self.wrappers = []
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        shutil.rmtree(self.directory)
+
+    def open(self, wrapper_class, name):
+        wrapper = wrapper_class({**connection.settings_dict, 'NAME': name}, alias=f'tuned{len(self.wrappers)}')
+        wrapper.ensure_connection()
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        return wrapper.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    @override_settings(IDS_SQLITE_PROFILE='production', IDS_SQLITE_PRAGMAS={'cache_size': -1024})
+    def test_production_pragmas(self):
+        """Test that new connections get the profile's pragmas, with IDS_SQLITE_PRAGMAS overriding single values."""
+        writer = self.open(ImmediateWrapper, self.path)
+        self.assertEqual(self.pragma(writer, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(writer, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(writer, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(writer, 'cache_size'), -1024)
+        writer.connection.execute('CREATE TABLE sample (value INTEGER)')
+
+        reader = self.open(SQLiteWrapper, f'file:{self.path}?mode=ro')
+        self.assertEqual(self.pragma(reader, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(reader, 'busy_timeout'), 5000)
+        with self.assertRaises(sqlite3.OperationalError):
+            reader.connection.execute('INSERT INTO sample VALUES (1)')
+
+        with override_settings(IDS_SQLITE_PRAGMAS={'journal_mode': 'WAL; DROP TABLE sample'}):
+            with self.assertRaises(ValueError):
+                sqlite.apply_pragmas(writer.connection, sqlite.profile_pragmas())
+
+    @override_settings(IDS_SQLITE_PROFILE='default')
+    def test_immediate_transactions(self):
+        """Test that a transaction of the production backend locks out other writers until it ends."""
+        writer = self.open(ImmediateWrapper, self.path)
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        try:
+            writer._start_transaction_under_autocommit()
+            with self.assertRaisesRegex(sqlite3.OperationalError, 'locked'):
+                other.execute('BEGIN IMMEDIATE')
+            writer.connection.rollback()
+            other.execute('BEGIN IMMEDIATE')
+            other.execute('ROLLBACK')
+        finally:
+            other.close()
+
+    @override_settings(IDS_SQLITE_READ_ALIAS='replica')
+    def test_read_replica_router(self):
+        """Test that reads go to the replica unless the default connection is inside a transaction."""
+        router = sqlite.ReadReplicaRouter()
+        self.assertEqual(router.db_for_read(NetworkTraffic), DEFAULT_DB_ALIAS)  # Each test runs in a transaction
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(router.db_for_read(NetworkTraffic), 'replica')
+            self.assertEqual(router.db_for_write(NetworkTraffic), DEFAULT_DB_ALIAS)
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'network_traffic'))
+        self.assertFalse(router.allow_migrate('replica', 'network_traffic'))
+
+
+''' TEST TIME RANGES AND RETENTION
+1. Test that records are stamped on ingest and filtered by since/until/last on every engine.
+2. Verify that purge_traffic deletes, archives and keeps derived data in step, batch by batch. '''
+
+@override_settings(IDS_RESPONSE_CACHE_ENABLED=False)
+class TimeRangeRetentionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        columnar._snapshot.__init__()
+        self.now = datetime.now(dt_timezone.utc)
+        records = load_sample(240)
+        # One record per hour, the newest observed now
+        for age, record in enumerate(reversed(records)):
+            record.observed_at = self.now - timedelta(hours=age)
+        bulk_ingest(records)
+
+    def ids(self, url, params):
+        response = self.client.get(url, {**params, 'page_size': 1000}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return [record['id'] for record in response.json()['results']]
+
+    def expected(self, **lookups):
+        return list(NetworkTraffic.objects.filter(**lookups).order_by('pk').values_list('pk', flat=True))
+
+    def test_time_filters(self):
+        """Test since, until and last against the ORM, on the SQL and columnar engines."""
+        since, until = (self.now - timedelta(hours=48)), (self.now - timedelta(hours=24))
+        window = {'since': since.isoformat(), 'until': until.isoformat()}
+        expected = self.expected(observed_at__gte=since, observed_at__lte=until)
+        self.assertEqual(len(expected), 25)
+        self.assertEqual(self.ids('/api/traffic', window), expected)
+        self.assertEqual(self.ids('/traffic/complex-filters/', {**window, 'engine': 'columnar'}), expected)
+        self.assertEqual(self.ids('/traffic/complex-filters/', {**window, 'protocol_type': 'tcp'}), self.ids('/traffic/complex-filters/', {**window, 'protocol_type': 'tcp', 'engine': 'columnar'}))
+        self.assertEqual(len(self.ids('/api/traffic', {'last': '90m'})), 2)
+        self.assertEqual(self.ids('/api/traffic/anomalous/', {'last': '1d', 'threshold': 0}), self.expected(observed_at__gt=self.now - timedelta(days=1)))
+        self.assertEqual(len(self.ids('/api/traffic/anomalous/', {'method': 'zscore', 'min_score': 0, 'until': until.isoformat()})), 240 - 24)
+        stream = self.client.get('/api/traffic', {'last': '10h', 'stream': 'ndjson'})
+        self.assertEqual(b''.join(stream.streaming_content).count(b'\n'), 10)
+
+    async def test_async_time_filters(self):
+        """Test that the async endpoints apply the same time window."""
+        response = await self.async_client.get('/api/async/traffic/filter/service/http/', {'last': '3d', 'page_size': 1000})
+        expected = [pk async for pk in NetworkTraffic.objects.filter(service='http', observed_at__gt=self.now - timedelta(days=3)).order_by('pk').values_list('pk', flat=True)]
+        self.assertEqual([record['id'] for record in json.loads(response.content)['results']], expected)
+        response = await self.async_client.get('/api/async/traffic', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_windows(self):
+        """Test that malformed or contradictory time parameters are rejected."""
+        for params in ({'since': 'soon'}, {'last': '5 parsecs'}, {'last': '5m', 'since': self.now.isoformat()},
+                       {'since': self.now.isoformat(), 'until': (self.now - timedelta(hours=1)).isoformat()}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/traffic', params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(parse_duration('2h'), timedelta(hours=2))
+        self.assertEqual(parse_duration('45'), timedelta(seconds=45))
+
+    def test_writes_are_stamped(self):
+        """Test that created records are stamped with the ingest time unless they carry one."""
+        payload = self.client.get('/api/traffic', {'page_size': 1}).json()['results'][0]
+        del payload['id'], payload['observed_at']
+        created = self.client.post('/api/traffic/create/', payload, format='json').json()
+        stamped = NetworkTraffic.objects.get(pk=created['id']).observed_at
+        self.assertLess(abs((stamped - datetime.now(dt_timezone.utc)).total_seconds()), 60)
+        given = self.client.post('/api/traffic/create/', {**payload, 'observed_at': '2024-06-01T12:00:00Z'}, format='json').json()
+        self.assertEqual(NetworkTraffic.objects.get(pk=given['id']).observed_at, datetime(2024, 6, 1, 12, tzinfo=dt_timezone.utc))
+
+    def test_purge_in_batches(self):
+        """Test that purging deletes only old records, batch by batch, and updates the summary."""
+        out = StringIO()
+        call_command('purge_traffic', '--older-than', '100h', '--dry-run', stdout=out)
+        self.assertIn('140 records', out.getvalue())
+        self.assertEqual(NetworkTraffic.objects.count(), 240)
+
+        call_command('purge_traffic', '--older-than', '100h', '--batch-size', '30', stdout=out)
+        self.assertEqual(out.getvalue().count('Purged '), 6)  # Five batches of 30 or fewer, then the summary
+        self.assertEqual(NetworkTraffic.objects.count(), 100)
+        self.assertFalse(NetworkTraffic.objects.filter(observed_at__lt=self.now - timedelta(hours=100)).exists())
+        self.assertEqual(sum(TrafficSummary.objects.values_list('records', flat=True)), 100)
+        self.assertEqual(len(self.ids('/traffic/complex-filters/', {'engine': 'columnar'})), 100)
+
+    def test_purge_archives_first(self):
+        """Test that --archive writes the purged records to a column file that imports them back."""
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'archive.ntcol')
+        try:
+            cutoff = self.now - timedelta(hours=200)
+            expected = list(NetworkTraffic.objects.filter(observed_at__lt=cutoff).order_by('pk').values_list(*COLUMN_FILE_FIELDS))
+            call_command('purge_traffic', '--before', cutoff.isoformat(), '--archive', path, stdout=StringIO())
+            self.assertEqual(NetworkTraffic.objects.count(), 201)
+            call_command('import_traffic', path, stdout=StringIO())
+            restored = list(NetworkTraffic.objects.filter(observed_at__lt=cutoff).order_by('pk').values_list(*COLUMN_FILE_FIELDS))
+            self.assertEqual(restored, expected)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(purge(NetworkTraffic.objects.none()), 0)
+        with self.assertRaises(CommandError):
+            call_command('purge_traffic', '--before', 'last week', stdout=StringIO())
+
+
+''' TEST MANAGEMENT COMMANDS
+1. Test load_csv ingests every row of a CSV file through the chunked bulk path.
+2. Verify that the chunk boundaries do not drop or duplicate rows. '''
+
+class LoadCsvCommandTest(TestCase):
+    def setUp(self):
+        # Take the header and the first 25 rows of the bundled dataset
+        with open(SAMPLE_CSV) as source:
+            self.lines = [next(source) for _ in range(26)]
+        handle, self.csv_path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as file:
+            file.writelines(self.lines)
+
+    def tearDown(self):
+        os.remove(self.csv_path)
+
+    def test_load_csv_in_chunks(self):
+        """Test loading rows with a chunk size that does not divide the row count."""
+        out = StringIO()
+        call_command('load_csv', self.csv_path, chunk_size=10, stdout=out)
+        self.assertEqual(NetworkTraffic.objects.count(), 25)
+        self.assertIn('Successfully loaded 25 rows', out.getvalue())
+        self.assertIn('rows/sec', out.getvalue())
+
+    def test_load_csv_maps_fields(self):
+        """Test that the parsed values match the source row."""
+        call_command('load_csv', self.csv_path, stdout=StringIO())
+        first = NetworkTraffic.objects.order_by('pk').first()
+        self.assertEqual(first.protocol_type, 'tcp')
+        self.assertEqual(first.service, 'ftp_data')
+        self.assertEqual(first.src_bytes, 491)
+        self.assertFalse(first.attack)
@@ -1,18 +1,40 @@
 from django.urls import path
-from . import views
+from . import async_views, views
+from .metrics import metrics_view
 from .views import *
 
 urlpatterns = [
     path("", views.index, name="index"),
     path('admin-credentials/', views.admin_credentials, name='admin-credentials'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/traffic', NetworkTrafficListView.as_view(), name='traffic-list'),
     path('api/traffic/<int:pk>/', NetworkTrafficDetailView.as_view(), name='traffic-detail'),
     path('api/traffic/create/', NetworkTrafficCreateView.as_view(), name='traffic-create'),
+    path('api/traffic/batch/', NetworkTrafficBatchView.as_view(), name='traffic-batch'),
     path('api/traffic/update/<int:pk>/', NetworkTrafficUpdateView.as_view(), name='traffic-update'),
     path('api/traffic/delete/<int:pk>/', NetworkTrafficDeleteView.as_view(), name='traffic-delete'),
+    path('api/traffic/live/', LiveIngestStatsView.as_view(), name='traffic-live-stats'),
+    path('api/traffic/predict/', TrafficPredictView.as_view(), name='traffic-predict'),
+    path('api/traffic/stats/', TrafficStatsView.as_view(), name='traffic-stats'),
+    path('api/traffic/sketches/', TrafficSketchView.as_view(), name='traffic-sketches'),
+    path('api/traffic/cache/', ResponseCacheStatsView.as_view(), name='traffic-cache-stats'),
+    path('api/rules/', DetectionRuleListView.as_view(), name='rule-list'),
+    path('api/rules/<int:pk>/', DetectionRuleDetailView.as_view(), name='rule-detail'),
+    path('api/rules/<int:pk>/matches/', DetectionRuleMatchesView.as_view(), name='rule-matches'),
+    path('api/jobs/', JobListView.as_view(), name='job-list'),
+    path('api/jobs/<int:pk>/', JobDetailView.as_view(), name='job-detail'),
+    path('api/jobs/<int:pk>/cancel/', JobCancelView.as_view(), name='job-cancel'),
     path('api/traffic/anomalous/', AnomalousTrafficView.as_view(), name='anomalous-traffic'),
     path('api/traffic/filter/service/<str:service>/', NetworkTrafficFilterByServiceView.as_view(), name='traffic-filter-service'),
     path('api/traffic/filter/attack/', NetworkTrafficFilterByAttackView.as_view(), name='traffic-filter-attack'),
     path('traffic/complex-filters/', NetworkTrafficComplexFiltersView.as_view(), name='traffic-complex-filters'),
 
+    # Async versions of the read endpoints (same responses, served without holding a thread under ASGI)
+    path('api/async/traffic', async_views.AsyncNetworkTrafficListView.as_view(), name='async-traffic-list'),
+    path('api/async/traffic/<int:pk>/', async_views.AsyncNetworkTrafficDetailView.as_view(), name='async-traffic-detail'),
+    path('api/async/traffic/anomalous/', async_views.AsyncAnomalousTrafficView.as_view(), name='async-anomalous-traffic'),
+    path('api/async/traffic/filter/service/<str:service>/', async_views.AsyncNetworkTrafficFilterByServiceView.as_view(), name='async-traffic-filter-service'),
+    path('api/async/traffic/filter/attack/', async_views.AsyncNetworkTrafficFilterByAttackView.as_view(), name='async-traffic-filter-attack'),
+    path('api/async/traffic/complex-filters/', async_views.AsyncNetworkTrafficComplexFiltersView.as_view(), name='async-traffic-complex-filters'),
+
 ]
\ No newline at end of file
@@ -1,96 +1,211 @@
-import os
-import platform
-import pkg_resources
-from django.conf import settings
-from django.contrib.auth.models import User
+from copy import copy
+import math
+import sys
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.apps import apps
 from django.shortcuts import render
 from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.generics import ListAPIView
-from rest_framework import __version__ as drf_version
+from rest_framework.settings import api_settings
+from django.db import transaction
 from django.db.models import Q
-from .models import NetworkTraffic
-from .serializers import NetworkTrafficSerializer
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
+from django.utils import timezone
+from .anomaly import DEFAULT_MIN_SCORE, SCORING_COLUMNS, AnomalyScorer
+from .batch import create_batch, delete_batch, max_batch_size, update_batch
+from .cache import cache_response, cache_stats
+from .classifier import DECISION_THRESHOLD, get_classifier, validate_features
+from .columnar import get_snapshot
+from .ingest import chunked, parse_timestamp, records_created, records_deleted, records_updated
+from .live import counters as live_counters
+from .jobs import cancel as cancel_job, submit as submit_job
+from .models import DetectionRule, Job, NetworkTraffic
+from .parsers import NDJSONParser
+from .retention import parse_duration
+from .serializers import DetectionRuleSerializer, JobSerializer, NetworkTrafficFastSerializer, NetworkTrafficSerializer
+from .sketches import HEAVY_HITTER_CAPACITY, report as sketch_report
+from .stats import GROUP_FIELDS, summarize
+from .streaming import STREAM_FORMATS, stream_response
 
 # View admin credentials
 def admin_credentials(request):
-    admin_user = User.objects.filter(is_superuser=True).first()
+    admin_username = apps.get_app_config('network_traffic').admin_username()
     context = {
-        "admin_username": admin_user.username if admin_user else "Not configured",
+        "admin_username": admin_username or "Not configured",
         "admin_password": "password",
     }
     return render(request, "../templates/credentials.html", context)
 
 # Index view to display general information and API endpoints
 def index(request):
-    # Fetch the Python version being used
-    python_version = platform.python_version()
-    
-    # Fetch the Django and DRF versions being used
-    django_version = pkg_resources.get_distribution("Django").version
-    drf_version == drf_version
-
-    # Read the `requirements.txt` file to list installed dependencies
-    requirements_path = os.path.join(settings.BASE_DIR, 'requirements.txt')
-    with open(requirements_path, 'r') as file:
-        requirements = file.readlines()
-    
-    #Filter relevant packages
-    relevant_packages = ['Django', 'drf', 'psycopg2']
-    filtered_requirements = [
-        req.strip() for req in requirements if any(pkg in req for pkg in relevant_packages)
-        ]
-
-    # Fetch the first superuser account (admin details)
-    admin_user = User.objects.filter(is_superuser=True).first()
-    admin_username = admin_user.username if admin_user else "Not configured"
-    admin_password = "Admin password is confidential"
-
-    # Define a list of API endpoints available in the application
-    api_endpoints = [
-        {"name": "Traffic List", "url": reverse('traffic-list'), "description": "List all network traffic data."},
-        {"name": "Traffic Detail", "url": reverse('traffic-detail', kwargs={"pk": 1}), "description": "View detailed information of a single traffic record."},
-        {"name": "Traffic Create", "url": reverse('traffic-create'), "description": "Create a new traffic record."},
-        {"name": "Anomalous Traffic", "url": reverse('anomalous-traffic'), "description": "Identify anomalous traffic patterns."},
-        {"name": "Traffic Filter by Service", "url": reverse('traffic-filter-service', kwargs={"service": "http"}), "description": "Filter traffic by service type e.g. http."},
-        {"name": "Traffic Filter by Attack", "url": reverse('traffic-filter-attack'), "description": "Filter traffic by attack type."},
-
-        # These are commented from the main view but was tested via cURL on the CLI
-        # {"name": "Traffic Update", "url": reverse('traffic-update', kwargs={"pk": 1}), "description": "Endpoint to update an existing traffic record."},
-        # {"name": "Traffic Delete", "url": reverse('traffic-delete', kwargs={"pk": 1}), "description": "Endpoint to delete a traffic record."},
-    ]
+    # Python, Django and DRF versions, requirements and the endpoint list are read once per
+    # process by NetworkTrafficConfig (see apps.py)
+    config = apps.get_app_config('network_traffic')
 
     # Context data to be passed to the template for rendering
     context = {
-        "python_version": python_version,
-        "django_version": django_version,
-        "drf_version": drf_version,
-        "requirements": requirements,
-        "admin_username": admin_username,
-        "admin_password": admin_password,
-        "api_endpoints": api_endpoints,
+        **config.environment,
+        "admin_username": config.admin_username() or "Not configured",  # First superuser account
+        "admin_password": "Admin password is confidential",
+        "api_endpoints": config.api_endpoints(),
     }
     return render(request, "../templates/index.html", context)  # Render the HTML template with context data
 
+# Smallest and largest values a range filter can be bounded by, per column type
+INTEGER_BOUNDS = (0, sys.maxsize)
+FLOAT_BOUNDS = (-sys.float_info.max, sys.float_info.max)
+DATETIME_BOUNDS = (datetime.min.replace(tzinfo=dt_timezone.utc), datetime.max.replace(tzinfo=dt_timezone.utc))
+RANGE_BOUNDS = {'serror_rate': FLOAT_BOUNDS, 'observed_at': DATETIME_BOUNDS}
+
+# Build a closed range filter, filling a missing bound with the column's extreme value.
+# SQLite plans a one-sided range under ORDER BY id as a full table scan, but an explicit
+# two-sided range as an index search, so every range filter is sent with both bounds.
+def bounded_range(field, low, high):
+    floor, ceiling = RANGE_BOUNDS.get(field, INTEGER_BOUNDS)
+    return Q(**{f'{field}__range': (floor if low is None else low, ceiling if high is None else high)})
+
+
+# Parse the time-range parameters accepted by every list endpoint into `(since, until)` bounds of
+# `observed_at` (either may be None), or None when no time filter was given. `?since=` and
+# `?until=` take ISO 8601 timestamps (both inclusive); `?last=5m` means "since 5 minutes ago".
+# Raises ValueError with a message for the client on invalid input.
+def parse_bound(name, value, kind):
+    # A range bound from the query string: None when absent, ValueError when not a `kind` number
+    if not value:
+        return None
+    try:
+        number = kind(value)
+    except ValueError:
+        raise ValueError(f"{name} must be {'an integer' if kind is int else 'a number'}.")
+    if kind is float and not math.isfinite(number):
+        raise ValueError(f"{name} must be a number.")
+    return number
+
+
+def time_window(params):
+    since, until, last = params.get('since'), params.get('until'), params.get('last')
+    if last is not None and since is not None:
+        raise ValueError("Use either since or last, not both.")
+    if last is not None:
+        since = timezone.now() - parse_duration(last)
+    elif since is not None:
+        since = parse_timestamp(since)
+    if until is not None:
+        until = parse_timestamp(until)
+    if since is None and until is None:
+        return None
+    if since is not None and until is not None and since > until:
+        raise ValueError("since must not be later than until.")
+    return since, until
+
+
+# Read a boolean query flag such as `?count=true`
+def query_flag(params, name):
+    return params.get(name, '').strip().lower() in ('1', 'true', 'yes')
+
+
+# Build the serializer for `?fields=service,src_bytes,attack`: only those columns (and `id`) are
+# selected from the database and encoded. Raises ValueError for unknown field names.
+def fast_serializer(params):
+    fields = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+    return NetworkTrafficFastSerializer(fields or None)
+
+
+# Values of `?engine=`: filter in SQL (the default) or over the in-memory columnar snapshot
+ENGINES = ('orm', 'columnar')
+
+
 # Direct API Views to handle NetworkTraffic-related operations
 
+# Base class for list-style endpoints: returns a queryset one keyset page at a time,
+# or as a single streamed dump when `?stream=ndjson` / `?stream=json` is given.
+# `?fields=` narrows the columns of every record and `?count=true` returns only the number of matches.
+class TrafficListAPIView(APIView):
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+
+    # Read `?since=` / `?until=` / `?last=`; returns `(window, error_response)`
+    def get_window(self, request):
+        try:
+            return time_window(request.query_params), None
+        except ValueError as exc:
+            return None, Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Read `?fields=`; returns `(serializer, error_response)`
+    def get_serializer(self, request):
+        try:
+            return fast_serializer(request.query_params), None
+        except ValueError as exc:
+            return None, Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def list(self, request, queryset):
+        window, error = self.get_window(request)
+        if error:
+            return error
+        if window is not None:
+            queryset = queryset.filter(bounded_range('observed_at', *window))  # Served by the observed_at index
+        if query_flag(request.query_params, 'count'):
+            return Response({"count": queryset.count()}, status=status.HTTP_200_OK)  # COUNT(*) only, no rows read
+        serializer, error = self.get_serializer(request)
+        if error:
+            return error
+
+        stream = request.query_params.get('stream')
+        if stream is not None:
+            if stream not in STREAM_FORMATS:
+                return Response({"error": f"Invalid stream format. Use one of: {', '.join(STREAM_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+            return stream_response(queryset, stream, serializer=serializer)  # Encode and write records as they are read
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(serializer.rows(queryset), request, view=self)  # Fetch one page of tuples ordered by primary key
+        return paginator.get_paginated_response(serializer.encode_many(page))  # Return the page with next/previous cursors
+
+    # `?engine=columnar`: `select(snapshot)` returns the row mask of the matching records, and only
+    # the rows of the requested page are read from the database
+    def list_columnar(self, request, select):
+        if 'stream' in request.query_params:
+            return Response({"error": "Streaming is not supported with engine=columnar"}, status=status.HTTP_400_BAD_REQUEST)
+        window, error = self.get_window(request)
+        if error:
+            return error
+        snapshot = get_snapshot()
+        mask = select(snapshot)  # Vectorized filter over the snapshot
+        if window is not None:
+            mask &= snapshot.range_mask('observed_at', *window)
+        if query_flag(request.query_params, 'count'):
+            return Response({"count": int(mask.sum())}, status=status.HTTP_200_OK)  # Counted without the database
+        serializer, error = self.get_serializer(request)
+        if error:
+            return error
+        ids = snapshot.select(mask)
+        paginator = self.pagination_class()
+        page = paginator.paginate_ids(ids, serializer.rows(NetworkTraffic.objects.all()), request, view=self)
+        return paginator.get_paginated_response(serializer.encode_many(page))
+
+
 # 1. Retrieve the list of all network traffic records
-class NetworkTrafficListView(APIView):
+class NetworkTrafficListView(TrafficListAPIView):
+    @cache_response
     def get(self, request):
-        traffic_data = NetworkTraffic.objects.all()  # Fetch all records from the database
-        serializer = NetworkTrafficSerializer(traffic_data, many=True)  # Serialize multiple records
-        return Response(serializer.data, status=status.HTTP_200_OK)  # Return serialized data as a JSON response
+        traffic_data = NetworkTraffic.objects.all()  # Page through all records in the database
+        return self.list(request, traffic_data)
 
 
-# 2. Retrieve details of a single record by its primary key (ID)
+# 2. Retrieve details of a single record by its primary key (ID), optionally only some `?fields=`
 class NetworkTrafficDetailView(APIView):
+    @cache_response
     def get(self, request, pk):
         try:
-            traffic_data = NetworkTraffic.objects.get(pk=pk)  # Fetch the record by ID
-            serializer = NetworkTrafficSerializer(traffic_data)  # Serialize the single record
-            return Response(serializer.data, status=status.HTTP_200_OK)  # Return serialized data
+            serializer = fast_serializer(request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            traffic_data = serializer.rows(NetworkTraffic.objects.all()).get(pk=pk)  # Fetch the record by ID as a tuple
+            return Response(serializer.encode(traffic_data), status=status.HTTP_200_OK)  # Return serialized data
         except NetworkTraffic.DoesNotExist:
             return Response({"error": "Record not found"}, status=status.HTTP_404_NOT_FOUND)  # Handle record not found
 
@@ -100,7 +215,9 @@ class NetworkTrafficCreateView(APIView):
     def post(self, request):
         serializer = NetworkTrafficSerializer(data=request.data)  # Deserialize incoming data
         if serializer.is_valid():
-            serializer.save()  # Save the valid data to the database
+            with transaction.atomic():
+                instance = serializer.save()  # Save the valid data to the database
+                records_created([instance])  # Update the traffic summary in the same transaction
             return Response(serializer.data, status=status.HTTP_201_CREATED)  # Return the created record
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)  # Return validation errors
 
@@ -110,9 +227,12 @@ class NetworkTrafficUpdateView(APIView):
     def put(self, request, pk):
         try:
             traffic_data = NetworkTraffic.objects.get(pk=pk)  # Fetch the existing record
+            previous = copy(traffic_data)  # Keep the old values for the traffic summary
             serializer = NetworkTrafficSerializer(traffic_data, data=request.data)  # Update with new data
             if serializer.is_valid():
-                serializer.save()  # Save the updated record
+                with transaction.atomic():
+                    instance = serializer.save()  # Save the updated record
+                    records_updated([previous], [instance])  # Move the record between summary groups
                 return Response(serializer.data, status=status.HTTP_200_OK)  # Return updated data
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)  # Return validation errors
         except NetworkTraffic.DoesNotExist:
@@ -124,99 +244,418 @@ class NetworkTrafficDeleteView(APIView):
     def delete(self, request, pk):
         try:
             traffic_data = NetworkTraffic.objects.get(pk=pk)  # Fetch the record to delete
-            traffic_data.delete()  # Delete the record
+            with transaction.atomic():
+                records_deleted([traffic_data])  # Remove the record from the traffic summary
+                traffic_data.delete()  # Delete the record
             return Response({"message": "Record deleted successfully"}, status=status.HTTP_204_NO_CONTENT)  # Success message
         except NetworkTraffic.DoesNotExist:
             return Response({"error": "Record not found"}, status=status.HTTP_404_NOT_FOUND)  # Handle record not found
 
 
 # 6. Identify anomalous traffic records based on byte thresholds
-class AnomalousTrafficView(APIView):
+# `?method=zscore` instead scores every record against the baseline of its service and protocol
+class AnomalousTrafficView(TrafficListAPIView):
+    methods = ('threshold', 'zscore')
+
+    @cache_response
     def get(self, request):
-        threshold = int(request.query_params.get('threshold', 1000))  # Retrieve threshold or use default
-        traffic_data = NetworkTraffic.objects.filter(
-            Q(src_bytes__gte=threshold) | Q(dst_bytes__gte=threshold)  # Filter based on source/destination bytes
+        method = request.query_params.get('method', 'threshold')
+        if method not in self.methods:
+            return Response({"error": f"Invalid method. Use one of: {', '.join(self.methods)}."}, status=status.HTTP_400_BAD_REQUEST)
+        if method == 'zscore':
+            return self.list_scored(request)
+
+        engine = request.query_params.get('engine', 'orm')
+        if engine not in ENGINES:
+            return Response({"error": f"Invalid engine. Use one of: {', '.join(ENGINES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        threshold = self.get_threshold(request.query_params)
+        if threshold is None:
+            return Response({"error": "threshold must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if engine == 'columnar':
+            return self.list_columnar(request, lambda snapshot: (
+                snapshot.range_mask('src_bytes', threshold) | snapshot.range_mask('dst_bytes', threshold)
+            ))
+        return self.list(request, self.threshold_queryset(threshold))  # Return one page of filtered data
+
+    # Shared with the async view: `?threshold=` or its default, None if it is not an integer
+    @staticmethod
+    def get_threshold(params):
+        try:
+            return int(params.get('threshold', 1000))
+        except ValueError:
+            return None
+
+    # Shared with the async view: records with either byte count at or above `threshold`
+    @staticmethod
+    def threshold_queryset(threshold):
+        return NetworkTraffic.objects.filter(
+            bounded_range('src_bytes', threshold, None) | bounded_range('dst_bytes', threshold, None)  # Filter based on source/destination bytes
         )
-        serializer = NetworkTrafficSerializer(traffic_data, many=True)  # Serialize filtered records
-        return Response(serializer.data, status=status.HTTP_200_OK)  # Return filtered data
+
+    def list_scored(self, request):
+        try:
+            min_score = float(request.query_params.get('min_score', DEFAULT_MIN_SCORE))  # Minimum z-score to report
+        except ValueError:
+            return Response({"error": "min_score must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        if 'stream' in request.query_params:
+            return Response({"error": "Streaming is not supported with method=zscore"}, status=status.HTTP_400_BAD_REQUEST)
+        window, error = self.get_window(request)
+        if error:
+            return error
+        serializer, error = self.get_serializer(request)
+        if error:
+            return error
+
+        scorer = AnomalyScorer()  # Loads the per-group baselines once per request
+        paginator = self.pagination_class()
+        rows = NetworkTraffic.objects.all()
+        if window is not None:
+            rows = rows.filter(bounded_range('observed_at', *window))
+        rows = rows.values_list(*SCORING_COLUMNS)
+        if query_flag(request.query_params, 'count'):
+            # Every record has to be scored, but only the scoring columns are read and nothing is encoded
+            keep = scorer.keep_anomalies(min_score)
+            chunks = chunked(rows.order_by('pk').iterator(chunk_size=paginator.scan_chunk_size), paginator.scan_chunk_size)
+            return Response({"count": sum(len(keep(chunk)) for chunk in chunks)}, status=status.HTTP_200_OK)
+        scores = dict(paginator.paginate_filtered(rows, request, scorer.keep_anomalies(min_score), view=self))  # Score chunks until a page is found
+
+        records = serializer.encode_many(serializer.rows(NetworkTraffic.objects.filter(pk__in=scores)).order_by('pk'))  # Fetch the flagged records
+        for record in records:
+            record['anomaly_score'] = scores[record['id']]
+        return paginator.get_paginated_response(records)
 
 
 # 7. Filter traffic records based on the service type
-class NetworkTrafficFilterByServiceView(APIView):
+class NetworkTrafficFilterByServiceView(TrafficListAPIView):
+    @cache_response
     def get(self, request, service):  # The 'service' argument comes directly from the URL
         if service:
             traffic_data = NetworkTraffic.objects.filter(service=service)  # Filter by service type
-            serializer = NetworkTrafficSerializer(traffic_data, many=True)  # Serialize filtered records
-            return Response(serializer.data, status=status.HTTP_200_OK)  # Return filtered data
+            return self.list(request, traffic_data)  # Return one page of filtered data
         return Response({"error": "Service is required"}, status=status.HTTP_400_BAD_REQUEST)  # Handle missing parameter
 
 # 8. Filter traffic records based on attack type
-class NetworkTrafficFilterByAttackView(APIView):
+class NetworkTrafficFilterByAttackView(TrafficListAPIView):
+    @cache_response
     def get(self, request):
-        # Convert attack type query parameter to boolean
-        attack_value = request.query_params.get('attack', 'yes').strip().lower()
-        if attack_value == 'yes':
-            attack_value = True
-        elif attack_value == 'no':
-            attack_value = False
-        else:
+        attack_value = self.attack_value(request.query_params)
+        if attack_value is None:
             return Response({"error": "Invalid attack type. Use 'yes' or 'no'."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Filter records based on attack value
         traffic_data = NetworkTraffic.objects.filter(attack=attack_value)
         if traffic_data.exists():
-            serializer = NetworkTrafficSerializer(traffic_data, many=True)  # Serialize filtered records
-            return Response(serializer.data, status=status.HTTP_200_OK)  # Return filtered data
+            return self.list(request, traffic_data)  # Return one page of filtered data
 
         return Response({"error": "No records match the provided attack type."}, status=status.HTTP_404_NOT_FOUND)  # Handle no matches
 
+    # Convert attack type query parameter to boolean; None if it is neither yes nor no
+    @staticmethod
+    def attack_value(params):
+        return {'yes': True, 'no': False}.get(params.get('attack', 'yes').strip().lower())
 
-class NetworkTrafficComplexFiltersView(APIView):
+
+class NetworkTrafficComplexFiltersView(TrafficListAPIView):
     """
     Advanced filtering for network traffic data based on fields in the dataset.
     """
+    @cache_response
     def get(self, request):
-        # Parse query parameters
-        protocol_type = request.query_params.get('protocol_type', None)
-        service = request.query_params.get('service', None)
-        flag = request.query_params.get('flag', None)
-        src_bytes_min = request.query_params.get('src_bytes_min', None)
-        src_bytes_max = request.query_params.get('src_bytes_max', None)
-        dst_bytes_min = request.query_params.get('dst_bytes_min', None)
-        dst_bytes_max = request.query_params.get('dst_bytes_max', None)
-        land = request.query_params.get('land', None)
-        attack = request.query_params.get('attack', None)
-        serror_rate_min = request.query_params.get('serror_rate_min', None)
-        serror_rate_max = request.query_params.get('serror_rate_max', None)
+        engine = request.query_params.get('engine', 'orm')
+        if engine not in ENGINES:
+            return Response({"error": f"Invalid engine. Use one of: {', '.join(ENGINES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            conditions = self.filter_conditions(request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if engine == 'columnar':
+            return self.list_columnar(request, lambda snapshot: snapshot.mask(conditions))
+
+        # Fetch and serialize one page of filtered data
+        traffic_data = NetworkTraffic.objects.filter(self.filter_query(conditions))
+        return self.list(request, traffic_data)
 
+    # Shared with the async view: build the filter from the parsed conditions
+    @staticmethod
+    def filter_query(conditions):
         # Build filter query
         query = Q()
+        for lookup, field, value in conditions:
+            if lookup == 'iexact':
+                # Case-insensitive matches compare LOWER(column) so the functional indexes can be used
+                query &= Exact(Lower(field), value)
+            elif lookup == 'range':
+                query &= bounded_range(field, *value)
+            else:
+                query &= Q(**{field: value})
+        return query
+
+    # Parse the query parameters into `(lookup, field, value)` conditions, shared by the ORM
+    # query above and the columnar engine. Raises ValueError for a bound that is not a number.
+    @staticmethod
+    def filter_conditions(params):
+        # Parse query parameters
+        protocol_type = params.get('protocol_type', None)
+        service = params.get('service', None)
+        flag = params.get('flag', None)
+        src_bytes_min = params.get('src_bytes_min', None)
+        src_bytes_max = params.get('src_bytes_max', None)
+        dst_bytes_min = params.get('dst_bytes_min', None)
+        dst_bytes_max = params.get('dst_bytes_max', None)
+        land = params.get('land', None)
+        attack = params.get('attack', None)
+        serror_rate_min = params.get('serror_rate_min', None)
+        serror_rate_max = params.get('serror_rate_max', None)
+
+        conditions = []
         if protocol_type:
-            query &= Q(protocol_type__iexact=protocol_type)
+            conditions.append(('iexact', 'protocol_type', protocol_type.lower()))
         if service:
-            query &= Q(service__iexact=service)
+            conditions.append(('iexact', 'service', service.lower()))
         if flag:
-            query &= Q(flag__iexact=flag)
-        if src_bytes_min:
-            query &= Q(src_bytes__gte=int(src_bytes_min))
-        if src_bytes_max:
-            query &= Q(src_bytes__lte=int(src_bytes_max))
-        if dst_bytes_min:
-            query &= Q(dst_bytes__gte=int(dst_bytes_min))
-        if dst_bytes_max:
-            query &= Q(dst_bytes__lte=int(dst_bytes_max))
+            conditions.append(('iexact', 'flag', flag.lower()))
+        if src_bytes_min or src_bytes_max:
+            conditions.append(('range', 'src_bytes', (parse_bound('src_bytes_min', src_bytes_min, int), parse_bound('src_bytes_max', src_bytes_max, int))))
+        if dst_bytes_min or dst_bytes_max:
+            conditions.append(('range', 'dst_bytes', (parse_bound('dst_bytes_min', dst_bytes_min, int), parse_bound('dst_bytes_max', dst_bytes_max, int))))
         if land:
-            land_bool = land.lower() == 'yes'
-            query &= Q(land=land_bool)
+            conditions.append(('exact', 'land', land.lower() == 'yes'))
         if attack:
-            attack_bool = attack.lower() == 'yes'
-            query &= Q(attack=attack_bool)
-        if serror_rate_min:
-            query &= Q(serror_rate__gte=float(serror_rate_min))
-        if serror_rate_max:
-            query &= Q(serror_rate__lte=float(serror_rate_max))
-
-        # Fetch and serialize filtered data
-        traffic_data = NetworkTraffic.objects.filter(query)
-        serializer = NetworkTrafficSerializer(traffic_data, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            conditions.append(('exact', 'attack', attack.lower() == 'yes'))
+        if serror_rate_min or serror_rate_max:
+            conditions.append(('range', 'serror_rate', (parse_bound('serror_rate_min', serror_rate_min, float), parse_bound('serror_rate_max', serror_rate_max, float))))
+        return conditions
+
+
+# 9. Grouped traffic statistics served from the incrementally maintained summary table
+class TrafficStatsView(APIView):
+    """
+    Record counts, attack ratios and byte sums/means/percentiles grouped by any combination of
+    service, protocol_type and flag (e.g. `?group_by=service,flag`).
+
+    `?engine=columnar` computes them from the in-memory snapshot instead, with exact percentiles.
+    """
+    @cache_response
+    def get(self, request):
+        group_by = [field.strip() for field in request.query_params.get('group_by', 'service').split(',') if field.strip()]
+        if not group_by or any(field not in GROUP_FIELDS for field in group_by):
+            return Response({"error": f"Invalid group_by. Use one or more of: {', '.join(GROUP_FIELDS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        engine = request.query_params.get('engine', 'orm')
+        if engine not in ENGINES:
+            return Response({"error": f"Invalid engine. Use one of: {', '.join(ENGINES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        if engine == 'columnar':
+            return Response({"group_by": group_by, "results": get_snapshot().summarize(group_by)}, status=status.HTTP_200_OK)
+        return Response({"group_by": group_by, "results": summarize(group_by)}, status=status.HTTP_200_OK)
+
+
+# 10. Hit/miss counters of the response cache in this worker process
+class ResponseCacheStatsView(APIView):
+    def get(self, request):
+        return Response(cache_stats(), status=status.HTTP_200_OK)
+
+
+# 11. Create, update or delete many records in one request and one transaction
+class NetworkTrafficBatchView(APIView):
+    """
+    POST a JSON array (or an NDJSON body) of records to create them, PUT/PATCH an array of
+    records carrying their `id` to update them, and DELETE `{"ids": [...]}` to remove them.
+    Invalid items are reported by index without failing the rest of the batch.
+    """
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, NDJSONParser]
+
+    def get_items(self, request, key):
+        # Accept a bare array or an object wrapping it, e.g. {"records": [...]}
+        items = request.data.get(key) if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list):
+            return None, Response({"error": f"Expected a list of {key}."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > max_batch_size():
+            return None, Response({"error": f"Batch too large. Send at most {max_batch_size()} {key} per request."}, status=status.HTTP_400_BAD_REQUEST)
+        return items, None
+
+    def post(self, request):
+        items, error = self.get_items(request, 'records')
+        if error:
+            return error
+        classifier = None
+        if request.query_params.get('score', '').lower() in ('1', 'true', 'yes'):
+            classifier = get_classifier()  # Attach the classifier's attack_score to every new record
+            if classifier is None:
+                return Response({"error": "No trained classifier. Run `python manage.py train_classifier` first."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        result = create_batch(items, classifier=classifier)  # Validate every item, then insert the valid ones in bulk
+        failed = result['errors'] and not result['created']
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if failed else status.HTTP_201_CREATED)
+
+    def put(self, request, partial=False):
+        items, error = self.get_items(request, 'records')
+        if error:
+            return error
+        result = update_batch(items, partial=partial)  # Validate every item, then update the valid ones in bulk
+        failed = result['errors'] and not result['updated']
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if failed else status.HTTP_200_OK)
+
+    def patch(self, request):
+        return self.put(request, partial=True)
+
+    def delete(self, request):
+        ids, error = self.get_items(request, 'ids')
+        if error:
+            return error
+        if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            return Response({"error": "Every id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(delete_batch(ids), status=status.HTTP_200_OK)
+
+
+# 12. Predict attack probabilities for unlabeled records with the trained classifier
+class TrafficPredictView(NetworkTrafficBatchView):
+    """
+    POST a JSON array (or an NDJSON body) of unlabeled records; each valid one gets an
+    `attack_score` (probability of an attack) and an `attack` prediction. Nothing is stored.
+    """
+    http_method_names = ['post', 'options']  # Reuses the batch parsers, not its write methods
+    def post(self, request):
+        items, error = self.get_items(request, 'records')
+        if error:
+            return error
+        classifier = get_classifier()  # Loaded once per worker and reused until a new version is trained
+        if classifier is None:
+            return Response({"error": "No trained classifier. Run `python manage.py train_classifier` first."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        valid, errors = validate_features(items)
+        started = time.perf_counter()
+        scores = classifier.predict_rows([row for _, row in valid]).tolist()  # Score the whole batch at once
+        inference_ms = round((time.perf_counter() - started) * 1000, 3)
+        predictions = [
+            {"index": index, "attack_score": round(score, 6), "attack": "yes" if score >= DECISION_THRESHOLD else "no"}
+            for (index, _), score in zip(valid, scores)
+        ]
+        result = {"model_version": classifier.version, "predictions": predictions, "errors": errors, "inference_ms": inference_ms}
+        failed = errors and not predictions
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if failed else status.HTTP_200_OK)
+
+
+# 13. Counters of the live WebSocket ingest channel (/ws/ingest/) in this worker process
+class LiveIngestStatsView(APIView):
+    def get(self, request):
+        return Response(live_counters.snapshot(), status=status.HTTP_200_OK)
+
+
+# 14. Approximate top attacked services/flags and distinct tuple counts from the streaming sketches
+class TrafficSketchView(APIView):
+    """
+    Heavy hitters (count-min sketch) and distinct counts (HyperLogLog) of everything ingested,
+    read from two small stored sketches instead of scanning the table. Every estimate comes with
+    its error bound. `?k=` sets how many heavy hitters to list (default 10).
+    """
+    def get(self, request):
+        try:
+            k = int(request.query_params.get('k', 10))
+        except ValueError:
+            k = 0
+        if not 1 <= k <= HEAVY_HITTER_CAPACITY:
+            return Response({"error": f"k must be an integer between 1 and {HEAVY_HITTER_CAPACITY}."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sketch_report(k), status=status.HTTP_200_OK)
+
+
+# 15. List the detection rules with their hit counts and evaluation times, or create one
+class DetectionRuleListView(APIView):
+    """
+    Rules are expressions over NetworkTraffic fields, e.g. `flag == 'S0' and count > 100`
+    (see rules.py). Every enabled rule runs against each batch of records as it is written.
+    """
+    def get(self, request):
+        rules = DetectionRule.objects.order_by('pk')
+        return Response(DetectionRuleSerializer(rules, many=True).data, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        serializer = DetectionRuleSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# 16. Retrieve, edit or delete one detection rule; edits apply to records written afterwards
+class DetectionRuleDetailView(APIView):
+    def get_rule(self, pk):
+        return DetectionRule.objects.filter(pk=pk).first()
+
+    def get(self, request, pk):
+        rule = self.get_rule(pk)
+        if rule is None:
+            return Response({"error": "Rule not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(DetectionRuleSerializer(rule).data, status=status.HTTP_200_OK)
+
+    def put(self, request, pk, partial=False):
+        rule = self.get_rule(pk)
+        if rule is None:
+            return Response({"error": "Rule not found"}, status=status.HTTP_404_NOT_FOUND)
+        serializer = DetectionRuleSerializer(rule, data=request.data, partial=partial)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def patch(self, request, pk):
+        return self.put(request, pk, partial=True)
+
+    def delete(self, request, pk):
+        deleted, _ = DetectionRule.objects.filter(pk=pk).delete()  # Its matches go with it
+        if not deleted:
+            return Response({"error": "Rule not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# 17. Records matched by a detection rule, with the usual pagination, `?fields=`, `?count=`, windows and streaming
+class DetectionRuleMatchesView(TrafficListAPIView):
+    def get(self, request, pk):
+        if not DetectionRule.objects.filter(pk=pk).exists():
+            return Response({"error": "Rule not found"}, status=status.HTTP_404_NOT_FOUND)
+        return self.list(request, NetworkTraffic.objects.filter(rule_matches__rule_id=pk))
+
+
+# 18. List the recent background jobs (optionally `?status=`), or submit one to the `run_jobs` workers
+class JobListView(APIView):
+    """
+    POST `{"kind": "ingest", "parameters": {"path": "flows.csv", "format": "flows"}}` queues a job
+    and answers 202 at once; poll the job's URL for its progress. See jobs.py for the kinds.
+    """
+    max_jobs = 100
+
+    def get(self, request):
+        jobs = Job.objects.order_by('-pk')
+        if request.query_params.get('status'):
+            if request.query_params['status'] not in dict(Job.STATUSES):
+                return Response({"error": f"Invalid status. Use one of: {', '.join(dict(Job.STATUSES))}."}, status=status.HTTP_400_BAD_REQUEST)
+            jobs = jobs.filter(status=request.query_params['status'])
+        return Response(JobSerializer(jobs[:self.max_jobs], many=True).data, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        try:
+            job = submit_job(request.data.get('kind'), request.data.get('parameters'))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        response = Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response['Location'] = reverse('job-detail', args=[job.pk])
+        return response
+
+
+# 19. Status, progress and outcome of one background job
+class JobDetailView(APIView):
+    def get(self, request, pk):
+        job = Job.objects.filter(pk=pk).first()
+        if job is None:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(JobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+# 20. Cancel a job: a queued job never starts, a running one stops after its current chunk
+class JobCancelView(APIView):
+    def post(self, request, pk):
+        job = Job.objects.filter(pk=pk).first()
+        if job is None:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        cancelled = cancel_job(job)
+        job.refresh_from_db()
+        if not cancelled:
+            return Response({"error": f"Job already {job.status}"}, status=status.HTTP_409_CONFLICT)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware (see /metrics)
+    'network_traffic.metrics.MetricsMiddleware',
+    # Brotli / gzip for responses above IDS_COMPRESSION_MIN_BYTES (see network_traffic/compression.py)
+    'network_traffic.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,13 +85,142 @@ WSGI_APPLICATION = 'smarthome_network_ids.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# IDS_SQLITE_PROFILE=production tunes SQLite for concurrent ingest and reads (network_traffic/sqlite.py):
+# WAL and faster pragmas on every connection (IDS_SQLITE_PRAGMAS overrides single values), write
+# transactions that lock up front, connections kept open for IDS_DB_CONN_MAX_AGE seconds, and
+# reads outside transactions sent to a read-only connection to the same file (the 'replica' alias).
+IDS_SQLITE_PROFILE = os.environ.get('IDS_SQLITE_PROFILE', 'default')
+IDS_SQLITE_PRAGMAS = {}
+IDS_SQLITE_PATH = os.environ.get('IDS_SQLITE_PATH', str(BASE_DIR / 'db.sqlite3'))
+IDS_SQLITE_READ_ALIAS = 'replica'
+if IDS_SQLITE_PROFILE not in ('default', 'production'):
+    raise ImproperlyConfigured(f"IDS_SQLITE_PROFILE must be 'default' or 'production', not '{IDS_SQLITE_PROFILE}'.")
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': IDS_SQLITE_PATH,
+    }
+}
+
+if IDS_SQLITE_PROFILE == 'production':
+    DATABASES['default'].update(
+        CONN_MAX_AGE=int(os.environ.get('IDS_DB_CONN_MAX_AGE', 600)),
+        CONN_HEALTH_CHECKS=True,
+    )
+    DATABASES[IDS_SQLITE_READ_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': f'file:{IDS_SQLITE_PATH}?mode=ro',  # Django opens SQLite databases as URIs
+        'TEST': {'MIRROR': 'default'},
     }
+    # Write transactions take the write lock up front (BEGIN IMMEDIATE) and queue on busy_timeout
+    DATABASES['default']['ENGINE'] = 'network_traffic.sqlite_backend'
+    DATABASE_ROUTERS = ['network_traffic.sqlite.ReadReplicaRouter']
+
+
+# Django REST Framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    # List endpoints page by primary key with opaque cursors (see network_traffic/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'network_traffic.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+    # JSON by default; `Accept: application/msgpack` or `application/vnd.ids.columns+json` (or
+    # `?format=msgpack` / `?format=columns`) picks a more compact body (see network_traffic/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'network_traffic.renderers.MessagePackRenderer',
+        'network_traffic.renderers.ColumnarJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'network_traffic.parsers.MessagePackParser',
+        'network_traffic.parsers.ColumnarJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Smallest response body, in bytes, that CompressionMiddleware compresses
+IDS_COMPRESSION_MIN_BYTES = int(os.environ.get('IDS_COMPRESSION_MIN_BYTES', 1024))
+
+# Largest number of records accepted by one request to /api/traffic/batch/
+IDS_BATCH_MAX_RECORDS = 10000
+
+# Live ingest over WebSocket (ws://<host>/ws/ingest/, served by the ASGI application)
+# Records from all connections are written together once a batch holds IDS_LIVE_BATCH_SIZE records
+# or IDS_LIVE_FLUSH_INTERVAL seconds after its first message. At most IDS_LIVE_QUEUE_FRAMES
+# messages wait while a batch is written; beyond that, 'block' stops reading from the sockets
+# and 'drop' discards messages (see /api/traffic/live/ for the counters).
+IDS_LIVE_BATCH_SIZE = 2000
+IDS_LIVE_FLUSH_INTERVAL = 0.25
+IDS_LIVE_QUEUE_FRAMES = 1000
+IDS_LIVE_OVERFLOW = os.environ.get('IDS_LIVE_OVERFLOW', 'block')
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Read endpoints cache their responses in the 'traffic' cache, keyed on the dataset version
+# (see network_traffic/cache.py). Local memory is used by default: CULL_FREQUENCY equal to
+# MAX_ENTRIES makes it evict one least-recently-used entry at a time. Set IDS_CACHE_URL
+# (e.g. redis://localhost:6379/1) to share the cache between worker processes; configure the
+# Redis server with `maxmemory-policy allkeys-lru` to bound its size.
+IDS_CACHE_URL = os.environ.get('IDS_CACHE_URL')
+IDS_RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('IDS_RESPONSE_CACHE_MAX_ENTRIES', 512))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'traffic': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': IDS_CACHE_URL,
+    } if IDS_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'traffic-responses',
+        'OPTIONS': {
+            'MAX_ENTRIES': IDS_RESPONSE_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': IDS_RESPONSE_CACHE_MAX_ENTRIES,
+        },
+    },
 }
 
+IDS_RESPONSE_CACHE_ENABLED = True
+IDS_RESPONSE_CACHE_ALIAS = 'traffic'
+IDS_RESPONSE_CACHE_TIMEOUT = 300  # Seconds; entries of old dataset versions expire on their own
+
+
+# Attack classifier
+# Versioned artifacts written by `python manage.py train_classifier` and loaded by /api/traffic/predict/.
+# The newest version is used unless IDS_MODEL_VERSION pins one; a pinned version that was never saved means no model.
+IDS_MODEL_DIR = os.environ.get('IDS_MODEL_DIR', str(BASE_DIR / 'ml_models'))
+IDS_MODEL_VERSION = os.environ.get('IDS_MODEL_VERSION')
+
+
+# Request metrics (network_traffic/metrics.py), served in Prometheus format at /metrics.
+# Set IDS_SLOW_REQUEST_SECONDS to log every request slower than that, with its SQL statements,
+# to the 'network_traffic.slow_requests' logger. Off by default.
+IDS_SLOW_REQUEST_SECONDS = float(os.environ['IDS_SLOW_REQUEST_SECONDS']) if os.environ.get('IDS_SLOW_REQUEST_SECONDS') else None
+
+
+# Traffic sketches (network_traffic/sketches.py). Each process merges its committed writes into
+# the stored sketches once this many records or seconds have accumulated, whichever comes first.
+IDS_SKETCH_FLUSH_RECORDS = int(os.environ.get('IDS_SKETCH_FLUSH_RECORDS', 10000))
+IDS_SKETCH_FLUSH_SECONDS = float(os.environ.get('IDS_SKETCH_FLUSH_SECONDS', 5))
+# Also save them from a background thread when the process goes idle, and when it exits.
+IDS_SKETCH_BACKGROUND_FLUSH = True
+
+
+# Background jobs (network_traffic/jobs.py), run by `python manage.py run_jobs`. Jobs only read
+# and write files inside IDS_JOB_DIR. IDS_JOB_LIMITS caps how many jobs of a kind run at once
+# across all workers (jobs.DEFAULT_JOB_LIMITS otherwise), and a running job that has not reported
+# progress or a heartbeat for IDS_JOB_STALE_SECONDS is marked failed, as its worker has died.
+IDS_JOB_DIR = os.environ.get('IDS_JOB_DIR', str(BASE_DIR / 'jobs'))
+IDS_JOB_LIMITS = {}
+IDS_JOB_STALE_SECONDS = float(os.environ.get('IDS_JOB_STALE_SECONDS', 3600))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
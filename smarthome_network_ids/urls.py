@@ -14,23 +14,39 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from functools import lru_cache
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-# Swagger schema view
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Smart Home Network API",
-        default_version="v1",
-        description="API Documentation for Smart Home Network Intrusion Detection System",
-        contact=openapi.Contact(email="your_email@example.com"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+
+
+# Swagger schema view, built on first use: drf_yasg is slow to import and only the
+# documentation pages need it, so worker processes start without it
+@lru_cache(maxsize=None)
+def schema_view(renderer):
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+    from rest_framework import permissions
+
+    view = get_schema_view(
+        openapi.Info(
+            title="Smart Home Network API",
+            default_version="v1",
+            description="API Documentation for Smart Home Network Intrusion Detection System",
+            contact=openapi.Contact(email="your_email@example.com"),
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+    return view.with_ui(renderer, cache_timeout=0)
+
+
+def swagger_ui(request, *args, **kwargs):
+    return schema_view('swagger')(request, *args, **kwargs)
+
+
+def redoc_ui(request, *args, **kwargs):
+    return schema_view('redoc')(request, *args, **kwargs)
+
 
 urlpatterns = [
     # Include app URLs
@@ -38,6 +54,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     
     # Swagger and ReDoc documentation
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('swagger/', swagger_ui, name='schema-swagger-ui'),
+    path('redoc/', redoc_ui, name='schema-redoc'),
 ]